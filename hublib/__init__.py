@@ -1,6 +1,67 @@
-from pint import UnitRegistry
-ureg = UnitRegistry()
-ureg.autoconvert_offset_to_baseunit = True
-Q_ = ureg.Quantity
-
 __version__ = "0.9.96"
+
+# The pint UnitRegistry is slow to create, and many programs
+# (hublib.cmd for example) never use units.  ureg and Q_ stand in
+# for the registry and its Quantity class and create it on first use.
+
+_ureg = None
+
+
+def get_ureg():
+    """
+    Returns the UnitRegistry shared by all of hublib, creating it
+    the first time.  Parsed definitions are kept in pint's cache
+    folder, so later processes start faster.
+    """
+    global _ureg
+    if _ureg is None:
+        from pint import UnitRegistry
+        try:
+            ureg = UnitRegistry(cache_folder=':auto:')
+        except Exception:
+            # old pint, or the cache folder is not writable
+            ureg = UnitRegistry()
+        ureg.autoconvert_offset_to_baseunit = True
+        _ureg = ureg
+    return _ureg
+
+
+class _LazyRegistry(object):
+
+    def __getattr__(self, name):
+        return getattr(get_ureg(), name)
+
+    def __setattr__(self, name, value):
+        # settings like default_format belong on the real registry
+        setattr(get_ureg(), name, value)
+
+    def __dir__(self):
+        return dir(get_ureg())
+
+    def __getitem__(self, name):
+        return get_ureg()[name]
+
+    def __call__(self, *args, **kwargs):
+        return get_ureg()(*args, **kwargs)
+
+    def __repr__(self):
+        return repr(get_ureg())
+
+
+class _LazyQuantity(object):
+
+    def __getattr__(self, name):
+        return getattr(get_ureg().Quantity, name)
+
+    def __dir__(self):
+        return dir(get_ureg().Quantity)
+
+    def __call__(self, *args, **kwargs):
+        return get_ureg().Quantity(*args, **kwargs)
+
+    def __instancecheck__(self, obj):
+        return isinstance(obj, get_ureg().Quantity)
+
+
+ureg = _LazyRegistry()
+Q_ = _LazyQuantity()
@@ -0,0 +1,2 @@
+from .store import ResultCache, Entry, make_key, file_digest
+from .evict import Policy
@@ -0,0 +1,184 @@
+"""
+Command line tool for result caches.
+
+usage: hublib-cache [-h] {info,list,show,evict,policy,gc} ... [root]
+
+root is a cache directory, or a directory of them like the Submit
+widget's ~/data/results/.submit_cache (the default).  The same tool
+is run by python -m hublib.cache.
+"""
+from __future__ import print_function
+import argparse
+import json
+import os
+import sys
+import time
+from hublib.cmd.usage import pretty_bytes
+from .store import ResultCache, INDEX
+from .evict import Policy
+
+DEFAULT_ROOT = '~/data/results/.submit_cache'
+
+
+def find_caches(root):
+    """
+    Returns the cache directories at root: root itself if it is a
+    cache, else the caches in it.
+    """
+    root = os.path.expanduser(root)
+    if os.path.isdir(os.path.join(root, INDEX)):
+        return [root]
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, d) for d in sorted(os.listdir(root))
+            if os.path.isdir(os.path.join(root, d, INDEX))]
+
+
+def pretty_seconds(seconds):
+    if seconds is None:
+        return '-'
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if days > 0:
+        return '%dd%dh' % (days, hours)
+    if hours > 0:
+        return '%dh%dm' % (hours, minutes)
+    if minutes > 0:
+        return '%dm%ds' % (minutes, seconds)
+    return '%ds' % seconds
+
+
+def pretty_date(t):
+    return time.strftime('%Y-%m-%d %H:%M', time.localtime(t))
+
+
+def _info(cache, args):
+    s = cache.stats()
+    if args.json:
+        print(json.dumps(s, sort_keys=True))
+        return
+    ratio = '-' if s['hit_ratio'] is None else '%.1f%%' % (100 * s['hit_ratio'])
+    print(s['root'])
+    print('  entries        %d' % s['entries'])
+    print('  size           %s (%s in entries, %s shared)' % (
+        pretty_bytes(s['bytes']), pretty_bytes(s['logical_bytes']), pretty_bytes(s['bytes_saved'])))
+    print('  hits           %d of %d (%s)' % (s['hits'], s['hits'] + s['misses'], ratio))
+    print('  run time saved %s' % pretty_seconds(s['seconds_saved']))
+    print('  policy         %s' % _policy_str(cache.policy))
+
+
+def _list(cache, args):
+    cache.stats()  # adds up the lookup log
+    entries = sorted(cache, key=lambda e: e.last_used, reverse=True)
+    if args.json:
+        for e in entries:
+            d = e.as_dict()
+            d.pop('files')
+            d.update(nbytes=e.nbytes, last_used=e.last_used, nfiles=len(e.files))
+            print(json.dumps(d, sort_keys=True))
+        return
+    print(cache.root)
+    print('%-16s %10s %6s %10s %5s %10s %16s' % (
+        'name', 'size', 'files', 'run time', 'hits', 'saved', 'last used'))
+    for e in entries:
+        saved = None if e.etime is None else e.hits * e.etime
+        print('%-16s %10s %6d %10s %5d %10s %16s' % (
+            e.name[:16], pretty_bytes(e.nbytes), len(e.files), pretty_seconds(e.etime),
+            e.hits, pretty_seconds(saved), pretty_date(e.last_used)))
+
+
+def _show(cache, args):
+    e = cache.get(args.name)
+    if e is None:
+        return False
+    d = e.as_dict()
+    d.update(root=cache.root, nbytes=e.nbytes, last_used=e.last_used)
+    print(json.dumps(d, sort_keys=True, indent=2))
+
+
+def _policy_args(args):
+    if args.max_bytes is None and args.max_age is None and args.max_entries is None:
+        return None
+    return Policy(args.max_bytes, args.max_age, args.max_entries)
+
+
+def _policy_str(policy):
+    limits = []
+    if policy.max_bytes is not None:
+        limits.append('max %s' % pretty_bytes(policy.max_bytes))
+    if policy.max_entries is not None:
+        limits.append('max %d entries' % policy.max_entries)
+    if policy.max_age is not None:
+        limits.append('unused for at most %s' % pretty_seconds(policy.max_age))
+    return ', '.join(limits) or 'no limits'
+
+
+def _evict(cache, args):
+    removed = cache.evict(_policy_args(args))
+    print('%s: removed %d entries' % (cache.root, len(removed)))
+    for name in removed:
+        print('  ' + name)
+
+
+def _policy(cache, args):
+    if args.clear:
+        cache.policy = Policy()
+    else:
+        policy = _policy_args(args)
+        if policy is None:
+            print('%s: %s' % (cache.root, _policy_str(cache.policy)))
+            return
+        cache.policy = policy
+    cache.policy.save(cache.root)
+    print('%s: %s' % (cache.root, _policy_str(cache.policy)))
+
+
+def _gc(cache, args):
+    print('%s: freed %s' % (cache.root, pretty_bytes(cache.gc())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='hublib-cache',
+                                     description='Inspect and clean up result caches.')
+    sub = parser.add_subparsers(dest='command')
+
+    def add(name, func, help, *positional):
+        p = sub.add_parser(name, help=help)
+        for arg in positional:
+            p.add_argument(arg)
+        p.add_argument('root', nargs='?', default=DEFAULT_ROOT,
+                       help='cache directory, or a directory of caches (default %s)' % DEFAULT_ROOT)
+        p.set_defaults(func=func)
+        return p
+
+    for p in (add('info', _info, 'show size, hit ratio and time saved'),
+              add('list', _list, 'list the entries')):
+        p.add_argument('--json', action='store_true', help='print JSON')
+    add('show', _show, 'show the metadata of an entry', 'name')
+    for p in (add('evict', _evict, 'remove entries to meet the limits'),
+              add('policy', _policy, 'show or save the limits')):
+        p.add_argument('--max-bytes', help="most bytes stored, like '2G'")
+        p.add_argument('--max-age', help="most time since last use, like '30d'")
+        p.add_argument('--max-entries', type=int, help='most entries')
+    sub.choices['policy'].add_argument('--clear', action='store_true', help='remove the limits')
+    add('gc', _gc, 'adopt old results and remove contents no entry uses')
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+    caches = find_caches(args.root)
+    if not caches:
+        print('No caches in %s' % args.root, file=sys.stderr)
+        return 1
+    try:
+        found = [args.func(ResultCache(root), args) for root in caches]
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if all(f is False for f in found):
+        print('Not found', file=sys.stderr)
+        return 1
+    return 0
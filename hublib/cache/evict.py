@@ -0,0 +1,278 @@
+"""
+Eviction and statistics for result caches.
+
+A Policy limits a cache's total size, the number of entries and how
+long an entry may go unused.  evict removes the least recently used
+entries until the cache is within the limits.  It holds the cache's
+lock, so kernels sharing a cache take turns, and
+evict_in_background skips the work when someone else is doing it.
+
+Lookups are appended to a log (.stats) by ResultCache.lookup, which
+is cheap enough for every cache hit.  evict and stats add the log up
+into the entries' hit counts and the totals in .stats.json.
+"""
+from __future__ import print_function
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from filelock import Timeout
+
+LOG = '.stats'
+TOTALS = '.stats.json'
+POLICY = '.policy.json'
+
+SIZE_UNITS = {'': 1, 'k': 1 << 10, 'm': 1 << 20, 'g': 1 << 30, 't': 1 << 40}
+AGE_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+_busy = set()
+_busy_lock = threading.Lock()
+
+
+def parse_size(size):
+    """
+    Returns bytes for a size like 500000, '500M' or '2G'.
+    """
+    if size is None or isinstance(size, int):
+        return size
+    m = re.match(r'^\s*(\d+(?:\.\d*)?)\s*([kmgt]?)i?b?\s*$', str(size), re.I)
+    if m is None:
+        raise ValueError('Bad size "%s".' % size)
+    return int(float(m.group(1)) * SIZE_UNITS[m.group(2).lower()])
+
+
+def parse_age(age):
+    """
+    Returns seconds for an age like 3600, '12h' or '30d'.
+    """
+    if age is None or isinstance(age, (int, float)):
+        return age
+    m = re.match(r'^\s*(\d+(?:\.\d*)?)\s*([smhdw]?)\s*$', str(age), re.I)
+    if m is None:
+        raise ValueError('Bad age "%s".' % age)
+    return float(m.group(1)) * AGE_UNITS[m.group(2).lower()]
+
+
+class Policy(object):
+    """
+    Limits for a result cache.  None means no limit.
+
+    :param max_bytes: Most bytes stored, as a number or a string
+        like '2G'.  Contents shared by entries are counted once.
+    :param max_age: Most seconds since an entry was last used, as a
+        number or a string like '30d'.
+    :param max_entries: Most entries.
+    """
+
+    def __init__(self, max_bytes=None, max_age=None, max_entries=None):
+        self.max_bytes = parse_size(max_bytes)
+        self.max_age = parse_age(max_age)
+        self.max_entries = max_entries
+        for val in (self.max_bytes, self.max_age, self.max_entries):
+            if val is not None and val < 0:
+                raise ValueError('Cache limits cannot be negative.')
+
+    @property
+    def limited(self):
+        return not (self.max_bytes is None and self.max_age is None
+                    and self.max_entries is None)
+
+    def as_dict(self):
+        return {'max_bytes': self.max_bytes, 'max_age': self.max_age,
+                'max_entries': self.max_entries}
+
+    @classmethod
+    def load(cls, root):
+        """
+        Returns the policy saved in cache directory root, or no limits.
+        """
+        try:
+            with open(os.path.join(root, POLICY)) as f:
+                return cls(**json.load(f))
+        except (IOError, OSError, ValueError, TypeError):
+            return cls()
+
+    def save(self, root):
+        """
+        Saves the policy in cache directory root, for every
+        ResultCache created without a policy.
+        """
+        _write_json(os.path.join(root, POLICY), self.as_dict())
+
+    def __repr__(self):
+        return 'Policy(max_bytes=%r, max_age=%r, max_entries=%r)' % (
+            self.max_bytes, self.max_age, self.max_entries)
+
+
+def _write_json(fname, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(fname), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, sort_keys=True)
+        os.rename(tmp, fname)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+def _totals(root):
+    try:
+        with open(os.path.join(root, TOTALS)) as f:
+            totals = json.load(f)
+    except (IOError, OSError, ValueError):
+        totals = {}
+    for key in ('hits', 'misses', 'seconds_saved'):
+        totals.setdefault(key, 0)
+    return totals
+
+
+def _compact(cache):
+    # Add the lookup log to the entries and the totals.  The caller
+    # holds the cache's lock.
+    log = os.path.join(cache.root, LOG)
+    tmp = '%s.%d.tmp' % (log, os.getpid())
+    try:
+        os.rename(log, tmp)
+    except OSError:
+        return
+    hits = {}
+    misses = 0
+    with open(tmp) as f:
+        for line in f:
+            parts = line.split(None, 2)
+            if len(parts) != 3:
+                continue
+            if parts[1] == 'hit':
+                name = parts[2].rstrip('\n')
+                hits[name] = hits.get(name, 0) + 1
+            else:
+                misses += 1
+    totals = _totals(cache.root)
+    totals['misses'] += misses
+    for name, n in hits.items():
+        totals['hits'] += n
+        try:
+            entry = cache.get(name)
+        except ValueError:
+            continue
+        if entry is None:
+            continue
+        entry.hits += n
+        if entry.etime:
+            totals['seconds_saved'] += n * entry.etime
+        cache._write_manifest(entry, mtime=entry.last_used)
+    _write_json(os.path.join(cache.root, TOTALS), totals)
+    os.remove(tmp)
+
+
+def evict(cache, policy):
+    """
+    Removes the least recently used entries of cache until it is
+    within the limits of policy.  Returns the names removed.
+    """
+    with cache.lock:
+        _compact(cache)
+        if not policy.limited:
+            return []
+        # entries from before the store are counted too
+        cache._adopt_all()
+        entries = sorted(cache, key=lambda e: e.last_used)
+        refs = {}
+        sizes = {}
+        for e in entries:
+            for digest, size in e.files.values():
+                refs[digest] = refs.get(digest, 0) + 1
+                sizes[digest] = size
+        total = sum(sizes.values())
+        now = time.time()
+        removed = []
+        for e in entries:
+            old = policy.max_age is not None and now - e.last_used > policy.max_age
+            many = policy.max_entries is not None and \
+                len(entries) - len(removed) > policy.max_entries
+            big = policy.max_bytes is not None and total > policy.max_bytes
+            if not (old or many or big):
+                # the rest were used more recently
+                break
+            cache._remove(e.name)
+            removed.append(e.name)
+            for digest in set(d for d, _ in e.files.values()):
+                refs[digest] -= 1
+                if refs[digest] == 0:
+                    total -= sizes[digest]
+        if removed:
+            cache._gc()
+        return removed
+
+
+def evict_in_background(cache, policy):
+    """
+    Runs evict in a thread, unless this process is already evicting
+    from cache or another process holds its lock.
+    """
+    with _busy_lock:
+        if cache.root in _busy:
+            return
+        _busy.add(cache.root)
+
+    def run():
+        try:
+            try:
+                cache.lock.acquire(timeout=0)
+            except Timeout:
+                return
+            try:
+                evict(cache, policy)
+            finally:
+                cache.lock.release()
+        except Exception:
+            print(traceback.format_exc(), file=sys.stderr)
+        finally:
+            with _busy_lock:
+                _busy.discard(cache.root)
+
+    t = threading.Thread(target=run, name='CacheEvict')
+    t.daemon = True
+    t.start()
+
+
+def stats(cache):
+    """
+    Returns a dict describing cache:
+
+    entries: Number of entries.
+    bytes: Bytes stored, counting shared contents once.
+    logical_bytes: Bytes in all the entries' directories.
+    bytes_saved: logical_bytes - bytes.
+    hits, misses: Lookups that found results or did not.
+    hit_ratio: hits / (hits + misses), or None.
+    seconds_saved: Run time of the results used instead of running.
+    policy: The cache's limits.
+    """
+    with cache.lock:
+        _compact(cache)
+        entries = list(cache)
+        totals = _totals(cache.root)
+    sizes = {}
+    for e in entries:
+        for digest, size in e.files.values():
+            sizes[digest] = size
+    logical = sum(e.nbytes for e in entries)
+    stored = sum(sizes.values())
+    lookups = totals['hits'] + totals['misses']
+    return {
+        'root': cache.root,
+        'entries': len(entries),
+        'bytes': stored,
+        'logical_bytes': logical,
+        'bytes_saved': logical - stored,
+        'hits': totals['hits'],
+        'misses': totals['misses'],
+        'hit_ratio': float(totals['hits']) / lookups if lookups else None,
+        'seconds_saved': totals['seconds_saved'],
+        'policy': cache.policy.as_dict(),
+    }
@@ -0,0 +1,641 @@
+"""
+A content-addressed store for run results.
+
+Each result file is stored once, as a read-only blob named by the
+SHA-256 of its contents.  An entry is a small JSON manifest mapping
+the entry's file names to blobs, and the entry's directory holds hard
+links to the blobs (or reflinks, or as a last resort copies, when the
+filesystem cannot link).  Results that are identical between runs
+take no extra space, and a cache hit only reads a manifest.
+
+Layout of a store's root directory::
+
+    <name>/          results of entry <name>, linked to blobs
+    .blobs/ab/cd...  file contents, by digest
+    .index/<name>.json  manifests; the mtime is the entry's last use
+    .lock            taken while the store is changed
+    .stats           log of lookups, added up by evict
+    .stats.json      totals of lookups
+    .policy.json     eviction limits, see hublib.cache.evict
+
+Manifests are written to a temporary file and renamed into place,
+and changes take the lock, so kernels sharing a cache cannot corrupt
+it.
+"""
+from __future__ import print_function
+import errno
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from filelock import FileLock
+from .evict import Policy, evict, evict_in_background, stats, LOG, TOTALS, POLICY
+
+# change this when the manifests change
+FORMAT = 1
+BUFSIZ = 1 << 20
+BLOBS = '.blobs'
+INDEX = '.index'
+LOCK = '.lock'
+# files clear leaves
+KEEP = (LOCK, LOG, TOTALS, POLICY)
+# the file legacy caches marked finished entries with
+LEGACY_MARK = '.submit_time'
+# seconds before gc removes temporary files
+STALE = 3600
+
+# Linux ioctl that shares a file's extents (btrfs, xfs)
+FICLONE = 0x40049409
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def _canon(h, obj):
+    # feed a canonical form of obj to hash h
+    if obj is None or isinstance(obj, (bool, int, float)):
+        h.update(('%s:%r;' % (type(obj).__name__, obj)).encode('utf-8'))
+    elif isinstance(obj, bytes):
+        h.update(b'b%d:' % len(obj))
+        h.update(obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8', 'surrogatepass')
+        h.update(b's%d:' % len(data))
+        h.update(data)
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'l%d:' % len(obj))
+        for item in obj:
+            _canon(h, item)
+    elif isinstance(obj, dict):
+        items = sorted((_key_digest(k), k, v) for k, v in obj.items())
+        h.update(b'd%d:' % len(items))
+        for _, k, v in items:
+            _canon(h, k)
+            _canon(h, v)
+    elif isinstance(obj, (set, frozenset)):
+        h.update(b'S%d:' % len(obj))
+        for d in sorted(_key_digest(k) for k in obj):
+            h.update(d)
+    elif hasattr(obj, 'tobytes') and hasattr(obj, 'dtype') and not obj.dtype.hasobject:
+        # numpy arrays and scalars
+        h.update(('a%s%r:' % (obj.dtype.str, getattr(obj, 'shape', ()))).encode('utf-8'))
+        h.update(obj.tobytes())
+    else:
+        # a repr is not the value (pandas shortens it, and the default
+        # one has the address), so hash the pickle
+        try:
+            data = pickle.dumps(obj, protocol=4)
+        except Exception as e:
+            raise TypeError('Cannot make a cache key from %s: %s' % (type(obj).__name__, e))
+        h.update(('p%s:%d:' % (type(obj).__name__, len(data))).encode('utf-8'))
+        h.update(data)
+
+
+def _key_digest(obj):
+    h = hashlib.sha256()
+    _canon(h, obj)
+    return h.digest()
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 of a file's contents, or for a directory, of
+    the names and contents of everything in it.  Digests are
+    remembered until the file's size or mtime changes.
+    """
+    st = os.stat(path)
+    if stat.S_ISDIR(st.st_mode):
+        h = hashlib.sha256()
+        for rel, full in _walk(path):
+            _canon(h, rel)
+            h.update(file_digest(full).encode('ascii'))
+        return h.hexdigest()
+    sig = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    fpath = os.path.abspath(path)
+    with _digests_lock:
+        found = _digests.get(fpath)
+    if found is not None and found[0] == sig:
+        return found[1]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BUFSIZ), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _digests_lock:
+        _digests[fpath] = (sig, digest)
+    return digest
+
+
+def make_key(*args, **kwargs):
+    """
+    Returns a cache key for a run: the SHA-256 of the arguments, the
+    contents of the input files and the tool version.
+
+    :param args: Values the results depend on, like the command or
+        its parameters.  Lists, dicts, strings, numbers and numpy
+        arrays are hashed by value; anything else by its pickle.
+        Raises TypeError for values that cannot be pickled.
+    :param files: Optional list of input files or directories,
+        hashed by content, so editing an input changes the key but
+        touching it does not.
+    :param version: Optional tool version.
+    """
+    files = kwargs.pop('files', None) or ()
+    version = kwargs.pop('version', None)
+    if kwargs:
+        raise ValueError('Unknown arguments: %s' % ', '.join(sorted(kwargs)))
+    if isinstance(files, str):
+        files = [files]
+    h = hashlib.sha256()
+    h.update(b'hublib-cache-key-%d;' % FORMAT)
+    _canon(h, list(args))
+    _canon(h, [file_digest(f) for f in files])
+    _canon(h, version)
+    return h.hexdigest()
+
+
+def _walk(top):
+    # (relative name, full path) of the files and links under top, sorted
+    for root, dirs, files in os.walk(top):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            yield os.path.relpath(full, top), full
+        for name in dirs:
+            full = os.path.join(root, name)
+            if os.path.islink(full):
+                yield os.path.relpath(full, top), full
+
+
+def _reflink(src, dst):
+    # share src's extents with a new file dst, if the filesystem can
+    import fcntl
+    with open(src, 'rb') as fin:
+        fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            fcntl.ioctl(fd, FICLONE, fin.fileno())
+        except Exception:
+            os.close(fd)
+            os.remove(dst)
+            raise
+        os.close(fd)
+
+
+def _clone(src, dst):
+    # make dst have src's contents without copying them if possible
+    try:
+        _reflink(src, dst)
+    except (IOError, OSError, ImportError):
+        shutil.copyfile(src, dst)
+
+
+def _link(src, dst):
+    # link dst to the blob src, or clone it
+    try:
+        os.link(src, dst)
+    except OSError:
+        _clone(src, dst)
+
+
+class Entry(object):
+    """
+    The manifest of one cache entry.
+
+    :ivar name: The entry name.
+    :ivar files: Dict of relative file name to [digest, size].
+    :ivar links: Dict of relative name to symbolic link target.
+    :ivar nbytes: Total size of the files.
+    :ivar created: When the entry was stored (seconds since the epoch).
+    :ivar etime: Seconds the run took, or None if not known.
+    :ivar hits: Times the entry was used instead of running again,
+        as of the last evict.
+    :ivar last_used: When the entry was last stored or used.
+    """
+
+    def __init__(self, name, files=None, links=None, created=None, etime=None,
+                 hits=0, **extra):
+        self.name = name
+        self.files = files or {}
+        self.links = links or {}
+        self.created = time.time() if created is None else created
+        self.etime = etime
+        self.hits = hits
+        self.extra = extra
+        self.nbytes = sum(size for _, size in self.files.values())
+        self.last_used = self.created
+
+    def as_dict(self):
+        d = dict(self.extra)
+        d.update(format=FORMAT, name=self.name, files=self.files, links=self.links,
+                 created=self.created, etime=self.etime, hits=self.hits)
+        return d
+
+    def __repr__(self):
+        return 'Entry(%r, %d files, %d bytes)' % (self.name, len(self.files), self.nbytes)
+
+
+class ResultCache(object):
+    """
+    A content-addressed cache of run results in directory root.
+
+    :param root: The cache directory.  It is created if needed.
+    :param policy: Optional eviction limits, a Policy or a dict of
+        its arguments.  Default is the policy saved in the cache.
+
+    Files in an entry's directory are read-only links to the stored
+    contents; copy them before changing them.
+    """
+
+    def __init__(self, root, policy=None):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.blobdir = os.path.join(self.root, BLOBS)
+        self.indexdir = os.path.join(self.root, INDEX)
+        for d in (self.blobdir, self.indexdir):
+            if not os.path.isdir(d):
+                os.makedirs(d)
+        self.lock = FileLock(os.path.join(self.root, LOCK))
+        if policy is None:
+            policy = Policy.load(self.root)
+        elif isinstance(policy, dict):
+            policy = Policy(**policy)
+        self.policy = policy
+
+    def _check_name(self, name):
+        if not name or os.sep in name or name.startswith('.') or \
+                (os.altsep and os.altsep in name):
+            raise ValueError('Bad cache entry name "%s".' % name)
+
+    def _manifest(self, name):
+        return os.path.join(self.indexdir, name + '.json')
+
+    def _blob(self, digest):
+        return os.path.join(self.blobdir, digest[:2], digest[2:])
+
+    def key(self, *args, **kwargs):
+        """
+        Returns make_key(*args, **kwargs).
+        """
+        return make_key(*args, **kwargs)
+
+    def get(self, name):
+        """
+        Returns the Entry for name, or None if it is not cached.
+        """
+        self._check_name(name)
+        try:
+            with open(self._manifest(name), 'r') as f:
+                d = json.load(f)
+                mtime = os.fstat(f.fileno()).st_mtime
+        except (IOError, OSError, ValueError):
+            return self._adopt(name)
+        if not isinstance(d, dict) or d.pop('format', None) != FORMAT:
+            return None
+        entry = Entry(**d)
+        entry.last_used = mtime
+        return entry
+
+    def lookup(self, name):
+        """
+        Like get, but counts a hit or a miss and marks the entry
+        as used.  Call this when results will be used instead of
+        running again.
+        """
+        entry = self.get(name)
+        now = time.time()
+        if entry is not None:
+            try:
+                os.utime(self._manifest(name), (now, now))
+            except OSError:
+                pass
+            entry.last_used = now
+        self._log('%.3f %s %s\n' % (now, 'miss' if entry is None else 'hit', name))
+        return entry
+
+    def _log(self, line):
+        # one write to a file opened for appending is not interleaved
+        # with other writers
+        try:
+            fd = os.open(os.path.join(self.root, LOG),
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+        except OSError:
+            pass
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def path(self, name):
+        """
+        Returns the directory with the results for name, linking it
+        again from the blobs if it was removed.  Returns None if
+        name is not cached.
+        """
+        entry = self.get(name)
+        if entry is None:
+            return None
+        rdir = os.path.join(self.root, name)
+        if not os.path.isdir(rdir):
+            with self.lock:
+                if not os.path.isdir(rdir):
+                    self._materialize(entry, rdir)
+        return rdir
+
+    def materialize(self, name, dest):
+        """
+        Links the results for name into directory dest, which must
+        not exist.  Returns the Entry.
+        """
+        entry = self.get(name)
+        if entry is None:
+            raise ValueError('"%s" is not in the cache.' % name)
+        self._materialize(entry, dest)
+        return entry
+
+    def _materialize(self, entry, dest):
+        tmp = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        try:
+            for rel, (digest, _) in entry.files.items():
+                fname = os.path.join(tmp, rel)
+                d = os.path.dirname(fname)
+                if not os.path.isdir(d):
+                    os.makedirs(d)
+                _link(self._blob(digest), fname)
+            for rel, target in entry.links.items():
+                fname = os.path.join(tmp, rel)
+                d = os.path.dirname(fname)
+                if not os.path.isdir(d):
+                    os.makedirs(d)
+                os.symlink(target, fname)
+            os.chmod(tmp, 0o755)
+            os.rename(tmp, dest)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def _ingest(self, src, how):
+        # Store the contents of file src and return (digest, size).
+        # how is 'move', 'link' (leaving src as it is) or 'copy'.
+        fd, tmp = tempfile.mkstemp(dir=self.blobdir, prefix='.tmp-')
+        os.close(fd)
+        try:
+            moved = False
+            if how != 'copy':
+                try:
+                    if how == 'move':
+                        os.rename(src, tmp)
+                    else:
+                        os.remove(tmp)
+                        os.link(src, tmp)
+                    moved = True
+                except OSError:
+                    pass
+            if not moved:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                _clone(src, tmp)
+            h = hashlib.sha256()
+            size = 0
+            with open(tmp, 'rb') as f:
+                for chunk in iter(lambda: f.read(BUFSIZ), b''):
+                    h.update(chunk)
+                    size += len(chunk)
+            digest = h.hexdigest()
+            blob = self._blob(digest)
+            if os.path.exists(blob):
+                os.remove(tmp)
+            else:
+                d = os.path.dirname(blob)
+                if not os.path.isdir(d):
+                    os.makedirs(d)
+                os.chmod(tmp, 0o444)
+                os.rename(tmp, blob)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return digest, size
+
+    def put(self, name, files, etime=None, move=False, **extra):
+        """
+        Stores results as entry name, replacing any entry with
+        that name.  Returns the new Entry.
+
+        :param name: The entry name.
+        :param files: Dict of relative name in the entry to the path
+            of a file or directory holding it.  Directories are added
+            with everything in them.
+        :param etime: Optional seconds the run took.
+        :param move: True to move the files into the cache instead
+            of copying them, or a collection of the names in files
+            that may be moved.
+        :param extra: Other values to keep in the manifest.
+        """
+        def how(top):
+            return 'move' if move is True or (move and top in move) else 'copy'
+        return self._put(name, files, etime, how, extra)
+
+    def _put(self, name, files, etime, how, extra):
+        # put, with how(name in files) choosing how each is stored
+        self._check_name(name)
+        sources = []
+        for rel, src in sorted(files.items()):
+            if os.path.isdir(src) and not os.path.islink(src):
+                sources.extend((os.path.join(rel, r), full, rel) for r, full in _walk(src))
+            else:
+                sources.append((rel, src, rel))
+
+        with self.lock:
+            entry = Entry(name, etime=etime, **extra)
+            for rel, src, top in sources:
+                rel = os.path.normpath(rel)
+                if rel.startswith('..') or os.path.isabs(rel):
+                    raise ValueError('Bad file name "%s".' % rel)
+                if os.path.islink(src):
+                    entry.links[rel] = os.readlink(src)
+                    continue
+                digest, size = self._ingest(src, how(top))
+                entry.files[rel] = [digest, size]
+            entry.nbytes = sum(size for _, size in entry.files.values())
+            rdir = os.path.join(self.root, name)
+            self._remove(name)
+            self._materialize(entry, rdir)
+            self._write_manifest(entry)
+        return entry
+
+    def _write_manifest(self, entry, mtime=None):
+        # mtime keeps the entry's last use when rewriting it
+        fd, tmp = tempfile.mkstemp(dir=self.indexdir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry.as_dict(), f, sort_keys=True)
+            if mtime is not None:
+                os.utime(tmp, (mtime, mtime))
+            os.rename(tmp, self._manifest(entry.name))
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    def _adopt(self, name):
+        # Entries from caches written before the store existed are
+        # plain directories with a .submit_time file.  Link their
+        # files into the store, and remove the directory only once the
+        # entry is saved.
+        rdir = os.path.join(self.root, name)
+        if not os.path.exists(os.path.join(rdir, LEGACY_MARK)):
+            return None
+        with self.lock:
+            if os.path.exists(self._manifest(name)):
+                return self.get(name)
+            tmp = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+            old = os.path.join(tmp, name)
+            try:
+                # out of the way of the entry's new directory
+                os.rename(rdir, old)
+            except OSError:
+                os.rmdir(tmp)
+                return None
+            try:
+                entry = self._put(name, {'.': old}, None, lambda top: 'link', {})
+            except Exception as e:
+                # put the old results back
+                try:
+                    self._remove(name)
+                    os.rename(old, rdir)
+                    os.rmdir(tmp)
+                except OSError:
+                    pass
+                if isinstance(e, (IOError, OSError)):
+                    return None
+                raise
+            shutil.rmtree(tmp, ignore_errors=True)
+            return entry
+
+    def _adopt_all(self):
+        # adopt every legacy entry; the caller holds the lock
+        indexed = set(self.names())
+        for name in os.listdir(self.root):
+            if not name.startswith('.') and name not in indexed and \
+                    os.path.isdir(os.path.join(self.root, name)):
+                self._adopt(name)
+
+    def _remove(self, name):
+        # remove an entry's manifest and directory; blobs are left to gc
+        try:
+            os.remove(self._manifest(name))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        rdir = os.path.join(self.root, name)
+        if os.path.lexists(rdir):
+            # rename first so readers never see a half-removed entry
+            tmp = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+            os.rename(rdir, os.path.join(tmp, name))
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def remove(self, name):
+        """
+        Removes entry name and any contents no other entry uses.
+        """
+        self._check_name(name)
+        with self.lock:
+            self._remove(name)
+            self._gc()
+
+    def clear(self):
+        """
+        Removes every entry.  The policy and the statistics are kept.
+        """
+        with self.lock:
+            for name in os.listdir(self.root):
+                if name in KEEP:
+                    continue
+                path = os.path.join(self.root, name)
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+            for d in (self.blobdir, self.indexdir):
+                os.makedirs(d)
+
+    def names(self):
+        """
+        Returns the names of the cached entries.
+        """
+        return sorted(f[:-5] for f in os.listdir(self.indexdir)
+                      if f.endswith('.json') and not f.startswith('.'))
+
+    def __iter__(self):
+        for name in self.names():
+            entry = self.get(name)
+            if entry is not None:
+                yield entry
+
+    def __len__(self):
+        return len(self.names())
+
+    def evict(self, policy=None, background=False):
+        """
+        Removes the least recently used entries until the cache is
+        within the limits of policy (default self.policy).  Returns
+        the names removed.
+
+        :param background: True to evict in a thread, skipping it if
+            another thread or process is evicting.  Returns None.
+        """
+        policy = self.policy if policy is None else policy
+        if background:
+            evict_in_background(self, policy)
+            return None
+        return evict(self, policy)
+
+    def stats(self):
+        """
+        Returns a dict of the cache's size, hits and misses.
+        See hublib.cache.evict.stats.
+        """
+        return stats(self)
+
+    def gc(self):
+        """
+        Moves entries written by older versions into the store, then
+        removes contents no entry uses and leftovers of interrupted
+        changes.  Returns the number of bytes freed.
+        """
+        with self.lock:
+            self._adopt_all()
+            return self._gc()
+
+    def _gc(self):
+        used = set()
+        for entry in self:
+            used.update(digest for digest, _ in entry.files.values())
+        freed = 0
+        # temporary files older than this were left by a crash
+        stale = time.time() - STALE
+        for sub in os.listdir(self.blobdir):
+            d = os.path.join(self.blobdir, sub)
+            if sub.startswith('.tmp-'):
+                if os.path.getmtime(d) < stale:
+                    freed += os.path.getsize(d)
+                    os.remove(d)
+                continue
+            for rest in os.listdir(d):
+                if sub + rest not in used:
+                    blob = os.path.join(d, rest)
+                    freed += os.path.getsize(blob)
+                    os.remove(blob)
+            if not os.listdir(d):
+                os.rmdir(d)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith('.tmp-') and os.path.getmtime(path) < stale:
+                shutil.rmtree(path, ignore_errors=True)
+        return freed
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Time of a cache hit and disk used by a second run with the same
+# results, for the ResultCache and for the plain directory copies
+# older versions of the widgets made.
+#
+# usage: python bench_cache.py [files] [kilobytes per file]
+
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import time
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cache import ResultCache
+
+N = 1000
+
+
+def du(top):
+    # bytes used, counting hard linked files once
+    seen = set()
+    total = 0
+    for root, dirs, files in os.walk(top):
+        for name in files:
+            st = os.lstat(os.path.join(root, name))
+            if st.st_ino not in seen:
+                seen.add(st.st_ino)
+                total += st.st_blocks * 512
+    return total
+
+
+def main():
+    nfiles = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    kb = int(sys.argv[2]) if len(sys.argv) > 2 else 512
+    tmp = tempfile.mkdtemp()
+    try:
+        src = os.path.join(tmp, 'src')
+        os.makedirs(src)
+        for i in range(nfiles):
+            with open(os.path.join(src, 'out%d.dat' % i), 'wb') as f:
+                f.write(os.urandom(kb * 1024))
+        with open(os.path.join(src, '.submit_time'), 'w') as f:
+            f.write('1m5s')
+
+        # copies, as before
+        old = os.path.join(tmp, 'old')
+        t = time.time()
+        for run in ('run1', 'run2'):
+            shutil.copytree(src, os.path.join(old, run))
+        tput_old = (time.time() - t) / 2
+        t = time.time()
+        for i in range(N):
+            os.path.exists(os.path.join(old, 'run1', '.submit_time'))
+        thit_old = (time.time() - t) / N
+
+        cache = ResultCache(os.path.join(tmp, 'new'))
+        t = time.time()
+        for run in ('run1', 'run2'):
+            cache.put(run, {'.': src})
+        tput = (time.time() - t) / 2
+        t = time.time()
+        for i in range(N):
+            cache.get('run1')
+            cache.path('run1')
+        thit = (time.time() - t) / N
+
+        print('%d files of %d KiB, stored twice' % (nfiles, kb))
+        print('%-14s %12s %12s %10s' % ('', 'store ms', 'hit us', 'disk MiB'))
+        print('%-14s %12.2f %12.1f %10.1f' % ('copies', tput_old * 1e3, thit_old * 1e6,
+                                              du(old) / 1048576.))
+        print('%-14s %12.2f %12.1f %10.1f' % ('ResultCache', tput * 1e3, thit * 1e6,
+                                              du(cache.root) / 1048576.))
+    finally:
+        for root, dirs, files in os.walk(tmp):
+            for d in dirs:
+                os.chmod(os.path.join(root, d), 0o755)
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+from __future__ import print_function
+import pytest
+import sys
+import os
+import json
+import time
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cache import ResultCache, Policy
+from hublib.cache import evict as ev
+from hublib.cache.cli import main
+
+
+class TestPolicy:
+
+    def test_parse(self):
+        p = Policy(max_bytes='2G', max_age='30d', max_entries=10)
+        assert p.max_bytes == 2 << 30
+        assert p.max_age == 30 * 86400
+        assert Policy(max_bytes='1.5k').max_bytes == 1536
+        assert Policy(max_bytes=100, max_age='90m').max_age == 5400
+        assert p.limited
+        assert not Policy().limited
+
+    def test_bad(self):
+        with pytest.raises(ValueError):
+            Policy(max_bytes='lots')
+        with pytest.raises(ValueError):
+            Policy(max_age='2y')
+        with pytest.raises(ValueError):
+            Policy(max_entries=-1)
+
+    def test_save(self, tmpdir):
+        root = str(tmpdir)
+        Policy(max_entries=3).save(root)
+        assert Policy.load(root).max_entries == 3
+        assert ResultCache(root).policy.max_entries == 3
+        # an explicit policy wins
+        assert ResultCache(root, {'max_bytes': '1M'}).policy.max_entries is None
+
+
+class TestEvict:
+
+    def setup_method(self, method):
+        import tempfile
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.tmp, 'cache'))
+
+    def teardown_method(self, method):
+        import shutil
+        shutil.rmtree(self.tmp)
+
+    def add(self, name, data, used, etime=None):
+        src = os.path.join(self.tmp, name + '.dat')
+        with open(src, 'w') as f:
+            f.write(data)
+        self.cache.put(name, {'out.dat': src}, etime=etime)
+        os.utime(self.cache._manifest(name), (used, used))
+
+    def test_lru_entries(self):
+        now = time.time()
+        for i, name in enumerate(['a', 'b', 'c', 'd']):
+            self.add(name, name * 10, now - 100 + i)
+        # a hit makes b the most recently used
+        assert self.cache.lookup('b') is not None
+        removed = self.cache.evict(Policy(max_entries=2))
+        assert removed == ['a', 'c']
+        assert self.cache.names() == ['b', 'd']
+        assert not os.path.exists(os.path.join(self.cache.root, 'a'))
+
+    def test_bytes(self):
+        now = time.time()
+        self.add('a', 'x' * 1000, now - 30)
+        self.add('b', 'y' * 1000, now - 20)
+        # same contents as b, stored once
+        self.add('c', 'y' * 1000, now - 10)
+        assert self.cache.evict(Policy(max_bytes=2000)) == []
+        # removing a frees 1000 bytes
+        assert self.cache.evict(Policy(max_bytes=1500)) == ['a']
+        # removing b frees nothing while c uses the contents
+        assert self.cache.evict(Policy(max_bytes=500)) == ['b', 'c']
+        assert os.listdir(self.cache.blobdir) == []
+
+    def test_age(self):
+        now = time.time()
+        self.add('old', 'x', now - 7200)
+        self.add('new', 'y', now - 60)
+        assert self.cache.evict(Policy(max_age='1h')) == ['old']
+        assert self.cache.names() == ['new']
+
+    def test_unlimited(self):
+        self.add('a', 'x', time.time())
+        assert self.cache.evict() == []
+        assert self.cache.names() == ['a']
+
+    def test_background(self):
+        now = time.time()
+        for i, name in enumerate('abc'):
+            self.add(name, name, now - 10 + i)
+        # someone else holds the lock
+        other = ResultCache(self.cache.root)
+        with other.lock:
+            ev.evict_in_background(self.cache, Policy(max_entries=1))
+            for i in range(50):
+                if self.cache.root not in ev._busy:
+                    break
+                time.sleep(0.01)
+        assert len(self.cache) == 3
+        self.cache.evict(Policy(max_entries=1), background=True)
+        for i in range(100):
+            if len(self.cache) == 1:
+                break
+            time.sleep(0.01)
+        assert self.cache.names() == ['c']
+
+    def test_stats(self):
+        now = time.time()
+        self.add('a', 'x' * 100, now, etime=30)
+        self.add('b', 'x' * 100, now, etime=10)
+        self.cache.lookup('a')
+        self.cache.lookup('a')
+        self.cache.lookup('b')
+        self.cache.lookup('zzz')
+        s = self.cache.stats()
+        assert s['entries'] == 2
+        assert s['bytes'] == 100
+        assert s['logical_bytes'] == 200
+        assert s['bytes_saved'] == 100
+        assert s['hits'] == 3
+        assert s['misses'] == 1
+        assert s['hit_ratio'] == 0.75
+        assert s['seconds_saved'] == 70
+        assert self.cache.get('a').hits == 2
+        # the log was added up once
+        assert self.cache.stats()['hits'] == 3
+        # totals outlive entries
+        self.cache.clear()
+        assert self.cache.stats()['hits'] == 3
+
+    def test_hits_keep_last_used(self):
+        self.add('a', 'x', 1000.0)
+        self.cache._log('%.3f hit a\n' % time.time())
+        self.cache.stats()
+        e = self.cache.get('a')
+        assert e.hits == 1
+        assert e.last_used == 1000.0
+
+    def legacy(self, name):
+        old = os.path.join(self.cache.root, name)
+        os.makedirs(old)
+        for f in ('out.txt', '.submit_time'):
+            with open(os.path.join(old, f), 'w') as fp:
+                fp.write(f)
+        return old
+
+    def test_legacy(self):
+        old = self.legacy('oldrun')
+        # without limits old entries are left alone
+        assert self.cache.evict() == []
+        assert self.cache.names() == []
+        assert self.cache.evict(Policy(max_entries=0)) == ['oldrun']
+        assert not os.path.exists(old)
+
+    def test_legacy_gc(self, capsys):
+        self.legacy('oldrun')
+        assert main(['gc', self.cache.root]) == 0
+        assert self.cache.names() == ['oldrun']
+
+
+class TestCLI:
+
+    def setup_method(self, method):
+        import tempfile
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'tools')
+        cache = ResultCache(os.path.join(self.root, 'mytool'))
+        src = os.path.join(self.tmp, 'out.dat')
+        with open(src, 'w') as f:
+            f.write('x' * 2048)
+        cache.put('run1', {'out.dat': src}, etime=90)
+        cache.put('run2', {'out.dat': src}, etime=90)
+        cache.lookup('run1')
+        self.cache = cache
+
+    def teardown_method(self, method):
+        import shutil
+        shutil.rmtree(self.tmp)
+
+    def test_info(self, capsys):
+        assert main(['info', self.root]) == 0
+        out = capsys.readouterr()[0]
+        assert 'entries        2' in out
+        assert '1 of 1 (100.0%)' in out
+        assert 'run time saved 1m30s' in out
+        assert main(['info', '--json', self.cache.root]) == 0
+        s = json.loads(capsys.readouterr()[0])
+        assert s['bytes'] == 2048
+        assert s['bytes_saved'] == 2048
+
+    def test_list_show(self, capsys):
+        assert main(['list', self.root]) == 0
+        out = capsys.readouterr()[0]
+        assert 'run1' in out and 'run2' in out
+        assert main(['show', 'run1', self.root]) == 0
+        d = json.loads(capsys.readouterr()[0])
+        assert d['hits'] == 1
+        assert d['etime'] == 90
+        assert main(['show', 'nope', self.root]) == 1
+
+    def test_policy_evict(self, capsys):
+        assert main(['policy', '--max-entries', '1', self.root]) == 0
+        assert 'max 1 entries' in capsys.readouterr()[0]
+        assert ResultCache(self.cache.root).policy.max_entries == 1
+        assert main(['evict', self.root]) == 0
+        assert 'removed 1 entries' in capsys.readouterr()[0]
+        assert self.cache.names() == ['run1']
+        assert main(['policy', '--clear', self.root]) == 0
+        assert not ResultCache(self.cache.root).policy.limited
+
+    def test_no_cache(self, capsys):
+        assert main(['info', self.tmp + '/none']) == 1
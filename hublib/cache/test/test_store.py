@@ -0,0 +1,222 @@
+from __future__ import print_function
+import pytest
+import sys
+import os
+import json
+import numpy as np
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cache import ResultCache, make_key, file_digest
+
+
+def write(fname, data):
+    d = os.path.dirname(fname)
+    if d and not os.path.isdir(d):
+        os.makedirs(d)
+    with open(fname, 'w') as f:
+        f.write(data)
+
+
+def read(fname):
+    with open(fname) as f:
+        return f.read()
+
+
+class Point(object):
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class TestKey:
+
+    def test_args(self):
+        assert make_key('run', 1, 2.5) == make_key('run', 1, 2.5)
+        assert make_key('run', 1) != make_key('run', 1.0)
+        assert make_key('run', 1) != make_key('run', '1')
+        assert make_key({'a': 1, 'b': 2}) == make_key({'b': 2, 'a': 1})
+        assert make_key([1, 2]) != make_key([[1, 2]])
+
+    def test_numpy(self):
+        a = np.arange(10000, dtype=float)
+        b = a.copy()
+        assert make_key(a) == make_key(b)
+        b[5000] = -1
+        # repr would hide the change
+        assert make_key(a) != make_key(b)
+
+    def test_repr_hides_change(self):
+        # numpy and pandas shorten the repr of big values
+        a = np.arange(10000, dtype=object)
+        b = a.copy()
+        b[5000] = -1
+        assert repr(a) == repr(b)
+        assert make_key(a) != make_key(b)
+        pd = pytest.importorskip('pandas')
+        df1 = pd.DataFrame({'x': np.arange(1000), 'y': np.zeros(1000)})
+        df2 = df1.copy()
+        df2.loc[500, 'y'] = 1.0
+        assert repr(df1) == repr(df2)
+        assert make_key(df1) != make_key(df2)
+        assert make_key(df1) == make_key(df1.copy())
+
+    def test_objects(self):
+        # keys do not depend on the object's address
+        assert make_key(Point(1, 2)) == make_key(Point(1, 2))
+        assert make_key(Point(1, 2)) != make_key(Point(1, 3))
+        with pytest.raises(TypeError):
+            make_key(lambda x: x)
+
+    def test_version(self):
+        assert make_key('x', version='1.0') != make_key('x', version='1.1')
+        with pytest.raises(ValueError):
+            make_key('x', bogus=1)
+
+    def test_files(self, tmpdir):
+        fname = str(tmpdir.join('input.dat'))
+        write(fname, 'abc')
+        k1 = make_key('x', files=[fname])
+        # touching does not change the key
+        os.utime(fname, (0, 0))
+        assert make_key('x', files=[fname]) == k1
+        write(fname, 'abd')
+        assert make_key('x', files=[fname]) != k1
+        assert file_digest(str(tmpdir)) == file_digest(str(tmpdir))
+
+
+class TestResultCache:
+
+    def setup_method(self, method):
+        import tempfile
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.tmp, 'cache'))
+        self.src = os.path.join(self.tmp, 'src')
+        write(os.path.join(self.src, 'out.txt'), 'results\n')
+        write(os.path.join(self.src, 'sub', 'data.csv'), '1,2\n')
+
+    def teardown_method(self, method):
+        import shutil
+        for root, dirs, files in os.walk(self.tmp):
+            for d in dirs:
+                os.chmod(os.path.join(root, d), 0o755)
+        shutil.rmtree(self.tmp)
+
+    def test_put_get(self):
+        assert self.cache.get('run1') is None
+        assert self.cache.path('run1') is None
+        e = self.cache.put('run1', {'.': self.src}, etime=12.5)
+        assert sorted(e.files) == ['out.txt', os.path.join('sub', 'data.csv')]
+        assert e.nbytes == 12
+        # sources are copied
+        assert os.path.exists(os.path.join(self.src, 'out.txt'))
+
+        e = self.cache.get('run1')
+        assert e.etime == 12.5
+        rdir = self.cache.path('run1')
+        assert rdir == os.path.join(self.cache.root, 'run1')
+        assert read(os.path.join(rdir, 'out.txt')) == 'results\n'
+        assert read(os.path.join(rdir, 'sub', 'data.csv')) == '1,2\n'
+        assert 'run1' in self.cache
+        assert self.cache.names() == ['run1']
+
+    def test_dedup(self):
+        self.cache.put('run1', {'.': self.src})
+        self.cache.put('run2', {'.': self.src, 'extra.txt': os.path.join(self.src, 'out.txt')})
+        f1 = os.path.join(self.cache.path('run1'), 'out.txt')
+        f2 = os.path.join(self.cache.path('run2'), 'out.txt')
+        f3 = os.path.join(self.cache.path('run2'), 'extra.txt')
+        assert os.stat(f1).st_ino == os.stat(f2).st_ino == os.stat(f3).st_ino
+        blobs = [f for _, _, files in os.walk(self.cache.blobdir) for f in files]
+        assert len(blobs) == 2
+
+    def test_read_only(self):
+        self.cache.put('run1', {'.': self.src})
+        fname = os.path.join(self.cache.path('run1'), 'out.txt')
+        assert not os.stat(fname).st_mode & 0o222
+
+    def test_move(self):
+        self.cache.put('run1', {'.': self.src}, move=True)
+        assert not os.path.exists(os.path.join(self.src, 'out.txt'))
+        assert read(os.path.join(self.cache.path('run1'), 'out.txt')) == 'results\n'
+
+    def test_move_some(self):
+        out = os.path.join(self.src, 'out.txt')
+        csv = os.path.join(self.src, 'sub', 'data.csv')
+        self.cache.put('run1', {'out.txt': out, 'data.csv': csv}, move=['data.csv'])
+        assert os.path.exists(out)
+        assert not os.path.exists(csv)
+
+    def test_rematerialize(self):
+        import shutil
+        self.cache.put('run1', {'.': self.src})
+        rdir = self.cache.path('run1')
+        for root, dirs, files in os.walk(rdir):
+            for d in dirs:
+                os.chmod(os.path.join(root, d), 0o755)
+        shutil.rmtree(rdir)
+        assert self.cache.path('run1') == rdir
+        assert read(os.path.join(rdir, 'out.txt')) == 'results\n'
+
+    def test_replace(self):
+        self.cache.put('run1', {'.': self.src})
+        write(os.path.join(self.tmp, 'new.txt'), 'new')
+        self.cache.put('run1', {'new.txt': os.path.join(self.tmp, 'new.txt')})
+        rdir = self.cache.path('run1')
+        assert os.listdir(rdir) == ['new.txt']
+
+    def test_remove_gc(self):
+        self.cache.put('run1', {'.': self.src})
+        self.cache.put('run2', {'out.txt': os.path.join(self.src, 'out.txt')})
+        self.cache.remove('run1')
+        assert self.cache.get('run1') is None
+        assert not os.path.exists(os.path.join(self.cache.root, 'run1'))
+        # out.txt is still used by run2
+        blobs = [f for _, _, files in os.walk(self.cache.blobdir) for f in files]
+        assert len(blobs) == 1
+        assert read(os.path.join(self.cache.path('run2'), 'out.txt')) == 'results\n'
+        self.cache.clear()
+        assert len(self.cache) == 0
+        assert os.listdir(self.cache.blobdir) == []
+
+    def test_manifest(self):
+        self.cache.put('run1', {'.': self.src}, cmd='sim -x')
+        with open(os.path.join(self.cache.indexdir, 'run1.json')) as f:
+            d = json.load(f)
+        assert d['cmd'] == 'sim -x'
+        assert self.cache.get('run1').extra['cmd'] == 'sim -x'
+        # no temporary files left behind
+        assert os.listdir(self.cache.indexdir) == ['run1.json']
+
+    def test_bad_name(self):
+        with pytest.raises(ValueError):
+            self.cache.get('../x')
+        with pytest.raises(ValueError):
+            self.cache.put('.blobs', {})
+
+    def test_legacy(self):
+        # entries written by older versions are adopted
+        old = os.path.join(self.cache.root, 'oldrun')
+        write(os.path.join(old, 'out.txt'), 'old\n')
+        write(os.path.join(old, '.submit_time'), '5s')
+        e = self.cache.get('oldrun')
+        assert e is not None
+        assert sorted(e.files) == ['.submit_time', 'out.txt']
+        assert read(os.path.join(self.cache.path('oldrun'), 'out.txt')) == 'old\n'
+        assert self.cache.get('missing') is None
+
+    def test_legacy_failed(self, monkeypatch):
+        # a failed adoption leaves the old results where they were
+        old = os.path.join(self.cache.root, 'oldrun')
+        write(os.path.join(old, 'out.txt'), 'old\n')
+        write(os.path.join(old, '.submit_time'), '5s')
+
+        def fail(*args, **kwargs):
+            raise OSError('disk full')
+        monkeypatch.setattr(self.cache, '_write_manifest', fail)
+        assert self.cache.get('oldrun') is None
+        assert read(os.path.join(old, 'out.txt')) == 'old\n'
+        assert read(os.path.join(old, '.submit_time')) == '5s'
+        assert [f for f in os.listdir(self.cache.root) if f.startswith('.tmp-')] == []
+        monkeypatch.undo()
+        assert self.cache.get('oldrun') is not None
+        assert read(os.path.join(old, 'out.txt')) == 'old\n'
@@ -1 +1,5 @@
 from .command import runCommand, executeCommand
+from .supervisor import Supervisor, get_supervisor
+from .lines import iterCommand, CommandLines
+from .aio import execute_command_async, gather_commands
+from .pool import CommandPool
@@ -0,0 +1,280 @@
+# ----------------------------------------------------------------------
+# asyncio versions of executeCommand, for running many commands
+# concurrently from one event loop.
+# ======================================================================
+#  Copyright (c) 2004-2017  HUBzero Foundation, LLC
+#  See LICENSE file for details.
+# ======================================================================
+
+import asyncio
+import inspect
+import os
+import shlex
+import signal
+import sys
+import time
+import locale
+from .command import get_stdin, SIGNALS_TO_NAMES_DICT
+from .supervisor import (BUFSIZ, KILL_GRACE, TIMEOUT, IDLE_TIMEOUT, OUTPUT_LIMIT,
+                         LIMIT_NAMES)
+
+
+async def _kill_group(proc, grace=KILL_GRACE):
+    # SIGTERM the process group, then SIGKILL it if the command
+    # is still running after grace seconds.
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        pass
+    try:
+        await asyncio.wait_for(asyncio.shield(proc.wait()), grace)
+    except asyncio.TimeoutError:
+        pass
+    # kill anything left in the group, even if the leader exited
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    await proc.wait()
+
+
+class _Limits(object):
+    # output seen so far, for the idle and output limits
+
+    def __init__(self, idleTimeout, maxOutput):
+        self.idleTimeout = idleTimeout
+        self.maxOutput = maxOutput
+        self.last = time.time()
+        self.nbytes = 0
+        self.stopped = 0
+        self.changed = asyncio.Event()
+
+    def output(self, n):
+        # Returns False once output is past maxOutput, like the
+        # supervisor keeping the chunk that crosses the limit.
+        self.last = time.time()
+        self.nbytes += n
+        if self.maxOutput is None or self.nbytes <= self.maxOutput:
+            return True
+        if not self.stopped:
+            self.stopped = OUTPUT_LIMIT
+            self.changed.set()
+        return self.nbytes - n < self.maxOutput
+
+    async def watch(self, deadline):
+        # returns the limit the command broke
+        while not self.stopped:
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                return TIMEOUT
+            wake = deadline
+            if self.idleTimeout is not None:
+                idle = self.last + self.idleTimeout
+                if now >= idle:
+                    return IDLE_TIMEOUT
+                wake = idle if wake is None else min(wake, idle)
+            try:
+                await asyncio.wait_for(self.changed.wait(),
+                                       None if wake is None else wake - now)
+            except asyncio.TimeoutError:
+                pass
+        return self.stopped
+
+
+async def _drain(stream, data, callback, echo, enc, limits):
+    while True:
+        chunk = await stream.read(BUFSIZ)
+        if not chunk:
+            return
+        if not limits.output(len(chunk)):
+            # keep reading, so the command is not blocked, but drop it
+            continue
+        data += chunk
+        if echo is not None:
+            echo.write(chunk.decode(enc, 'replace'))
+            echo.flush()
+        if callback is not None:
+            res = callback(chunk)
+            if inspect.isawaitable(res):
+                await res
+
+
+async def execute_command_async(command,
+                                stdin=None,
+                                streamOutput=False,
+                                shell=False,
+                                on_stdout=None,
+                                on_stderr=None,
+                                timeout=None,
+                                env=None,
+                                cwd=None,
+                                quiet=False,
+                                idleTimeout=None,
+                                maxOutput=None):
+    """Execute a command without blocking the event loop.
+
+    Arguments:
+        command -- A list or string containing the command to run.
+                   Strings will be converted to a list internally with shlex.
+
+    Keyword arguments:
+    stdin -- A file, fileno, or filename that will be piped as input,
+             or bytes to send to the command.
+    streamOutput -- Boolean. Default False. True means the output is streamed.
+    shell -- Boolean. Default False. Run the command with the shell.
+    on_stdout -- Called with each chunk (bytes) of standard output.
+                 May be a coroutine function.
+    on_stderr -- Called with each chunk (bytes) of standard error.
+    timeout -- Seconds the command may run.
+    env -- Environment for the command.  Default is this process's.
+    cwd -- Directory to run the command in.
+    quiet -- Boolean. Default False. True means failures are not
+             reported on stderr.
+    idleTimeout -- Seconds the command may run without output.
+    maxOutput -- Bytes of output the command may write.
+
+    As with executeCommand, a command that breaks a limit and
+    everything it started are sent SIGTERM, then SIGKILL after
+    KILL_GRACE seconds, and the code returned is TIMEOUT,
+    IDLE_TIMEOUT or OUTPUT_LIMIT.  The command runs in its own
+    process group.  If the task is cancelled, the whole group is
+    killed.
+
+    Returns:
+    A tuple containing three values, as for executeCommand:
+        code -- Exit code. 0 is normal.
+        stdout -- Bytestring containing the standard output.
+        stderr -- Bytestring containing the standard error output.
+    """
+    # output is appended to one bytearray per pipe
+    outData = bytearray()
+    errData = bytearray()
+
+    if sys.stdout.encoding is None:
+        outenc = locale.getpreferredencoding()
+    else:
+        outenc = sys.stdout.encoding
+
+    input = None
+    if isinstance(stdin, bytes):
+        input, stdin = stdin, asyncio.subprocess.PIPE
+    commandStdin, fpClose, errStr = get_stdin(stdin)
+    if errStr:
+        if streamOutput:
+            sys.stderr.write(errStr)
+            sys.stderr.flush()
+        return 1, b"", errStr.encode(outenc)
+
+    try:
+        kwargs = dict(stdin=commandStdin,
+                      stdout=asyncio.subprocess.PIPE,
+                      stderr=asyncio.subprocess.PIPE,
+                      start_new_session=True,
+                      env=env,
+                      cwd=cwd)
+        try:
+            if shell is True:
+                proc = await asyncio.create_subprocess_shell(command, **kwargs)
+            else:
+                if not isinstance(command, list):
+                    command = shlex.split(command)
+                proc = await asyncio.create_subprocess_exec(*command, **kwargs)
+        except OSError as e:
+            sys.stderr.write(e.strerror)
+            return 1, b"", e.strerror.encode(outenc)
+        limits = _Limits(idleTimeout, maxOutput)
+        deadline = None if timeout is None else time.time() + timeout
+
+        async def feed():
+            try:
+                proc.stdin.write(input)
+                await proc.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            proc.stdin.close()
+
+        async def communicate():
+            tasks = [_drain(proc.stdout, outData, on_stdout,
+                            sys.stdout if streamOutput else None, outenc, limits),
+                     _drain(proc.stderr, errData, on_stderr,
+                            sys.stderr if streamOutput else None, outenc, limits)]
+            if input is not None:
+                tasks.append(feed())
+            await asyncio.gather(*tasks)
+            return await proc.wait()
+
+        comm = asyncio.ensure_future(communicate())
+        watch = asyncio.ensure_future(limits.watch(deadline))
+        stopped = 0
+        try:
+            await asyncio.wait([comm, watch], return_when=asyncio.FIRST_COMPLETED)
+            if not comm.done():
+                stopped = watch.result()
+                await asyncio.shield(_kill_group(proc))
+                # the pipes close when the group is gone, unless
+                # something outside it holds them
+                await asyncio.wait([comm], timeout=KILL_GRACE)
+                if not comm.done():
+                    comm.cancel()
+            else:
+                returncode = comm.result()
+        except BaseException:
+            # cancel or an error in a callback
+            comm.cancel()
+            await asyncio.shield(_kill_group(proc))
+            raise
+        finally:
+            watch.cancel()
+    finally:
+        if fpClose:
+            try:
+                commandStdin.close()
+            except Exception:
+                pass
+
+    if stopped:
+        exitStatus = stopped
+        if not quiet:
+            sys.stderr.write("%s %s\n" % (command, LIMIT_NAMES[stopped]))
+    elif returncode < 0:
+        # killed by a signal.  executeCommand returns the raw wait
+        # status, which is the signal number.
+        exitStatus = -returncode
+        if not quiet:
+            signame = SIGNALS_TO_NAMES_DICT.get(exitStatus, str(exitStatus))
+            sys.stderr.write("%s failed w/ signal %s\n" % (command, signame))
+    else:
+        exitStatus = returncode
+        if exitStatus and not quiet:
+            sys.stderr.write("%s failed w/ exit code %d\n" % (command, exitStatus))
+    if exitStatus and not streamOutput and not quiet:
+        sys.stderr.write("%s\n" % errData.decode(outenc, 'replace'))
+
+    return exitStatus, bytes(outData), bytes(errData)
+
+
+async def gather_commands(commands, limit=None, return_exceptions=False, **kwargs):
+    """Run many commands with execute_command_async, at most limit at a time.
+
+    Arguments:
+        commands -- List of commands.
+
+    Keyword arguments:
+    limit -- Maximum number running at once.  Default is the number of CPUs.
+    return_exceptions -- As for asyncio.gather.
+    Other keyword arguments are passed to execute_command_async.
+
+    Returns:
+    A list of (code, stdout, stderr) tuples in the order of commands.
+    Cancelling kills all running commands.
+    """
+    if limit is None:
+        limit = os.cpu_count() or 1
+    sem = asyncio.Semaphore(limit)
+
+    async def run(command):
+        async with sem:
+            return await execute_command_async(command, **kwargs)
+
+    return await asyncio.gather(*[run(c) for c in commands],
+                                return_exceptions=return_exceptions)
@@ -1,7 +1,6 @@
 # ----------------------------------------------------------------------
 # Convenience functions to run a command, optionally streaming
 # stdin and stderr.  Return code, stdout, and stderr are returned.
-# Works for Python 2 and 3.
 # ======================================================================
 #  AUTHOR: Martin Hunt, Purdue University
 #   based on previous versions by
@@ -14,47 +13,24 @@
 from __future__ import print_function
 import sys
 import os
-import subprocess
 import shlex
-import select
 import signal
-import traceback
 import io
 import locale
+import codecs
+from .supervisor import (get_supervisor, BUFSIZ,
+                         TIMEOUT, IDLE_TIMEOUT, OUTPUT_LIMIT, LIMIT_NAMES)
 
-# Python 2 <-> 3 compatibility
-if (sys.version_info > (3, 0)):
-    # python 3 does not have a 'file' type
-    file_type = io.IOBase
-    usplit = shlex.split
-else:
-    file_type = file
-
-    # Python2 shlex cannot handle unicode
-    def usplit(cmd):
-        enc = locale.getpreferredencoding()
-        if isinstance(cmd, str):
-            cmd = cmd.decode(enc)
-        return map(lambda s: s.decode(enc), shlex.split(cmd.encode(enc)))
-
-
-commandPid = 0
 SIGNALS_TO_NAMES_DICT = dict((getattr(signal, n), n)
     for n in dir(signal) if n.startswith('SIG') and '_' not in n)
 
 
-def sig_handler(signalType, frame):
-    global commandPid
-    if commandPid:
-        os.kill(commandPid, signal.SIGTERM)
-
-
 def get_stdin(stdin):
     # returns filehandle, needs_closed, error_string
     if stdin is None:
         return None, 0, ''
 
-    if isinstance(stdin, file_type):
+    if isinstance(stdin, io.IOBase):
         return stdin, False, ''
 
     if isinstance(stdin, int):
@@ -82,10 +58,97 @@ def swrite(stream, data, enc):
     stream.flush()
 
 
+class Capture(object):
+    """Output of one pipe of a command.
+
+    The supervisor reads each chunk with readv into the same buffer,
+    and feed appends it to one growable bytearray, so no bytes object
+    is made per read and nothing is copied at the end unless asked.
+    If dest is given, data is written there as it arrives and not kept
+    in memory.  If tail is given, only the last tail bytes are kept.
+    """
+
+    def __init__(self, dest=None, tail=None, echo=None, enc=None):
+        self.keep = tail
+        if dest is not None and tail is None:
+            self.keep = 0
+        self.size = 0
+        self.data = bytearray()
+        self.fp = None
+        self.fd = None
+        self.close = False
+        if isinstance(dest, int):
+            self.fd = dest
+        elif dest is not None and hasattr(dest, 'write'):
+            self.fp = dest
+        elif dest is not None:
+            self.fp = open(dest, 'wb')
+            self.close = True
+        self.echo = echo
+        if echo is not None:
+            self.decoder = codecs.getincrementaldecoder(enc)('replace')
+
+    def feed(self, part):
+        """
+        Adds a chunk of output.
+        """
+        n = len(part)
+        self.size += n
+        if self.echo is not None:
+            self.echo.write(self.decoder.decode(part))
+            self.echo.flush()
+        if self.fp is not None:
+            self.fp.write(part)
+        elif self.fd is not None:
+            _write_all(self.fd, part)
+        keep = self.keep
+        if keep != 0:
+            data = self.data
+            data += part
+            if keep is not None and len(data) >= 2 * keep + n:
+                # deleting from the front of a bytearray does not move the data
+                del data[:-keep]
+
+    def finish(self, copy=True):
+        """
+        Closes any file and returns the data kept, as bytes or,
+        if copy is False, as the bytearray itself.
+        """
+        if self.echo is not None:
+            self.echo.write(self.decoder.decode(b'', True))
+            self.echo.flush()
+        if self.fp is not None:
+            if self.close:
+                self.fp.close()
+            else:
+                self.fp.flush()
+        data = self.data
+        if self.keep:
+            del data[:-self.keep]
+        if copy:
+            return bytes(data)
+        return data
+
+
+def _write_all(fd, view):
+    while len(view):
+        view = view[os.write(fd, view):]
+
+
 def executeCommand(command,
                    stdin=None,
                    streamOutput=False,
-                   shell=False):
+                   shell=False,
+                   outFile=None,
+                   errFile=None,
+                   bufsize=BUFSIZ,
+                   tail=None,
+                   copy=True,
+                   usage=None,
+                   timeout=None,
+                   idleTimeout=None,
+                   maxOutput=None,
+                   session=False):
     """Execute a command.
 
     Arguments:
@@ -95,20 +158,42 @@ def executeCommand(command,
     Keyword arguments:
     stdin -- A file, fileno, or filename that will be piped as input.
     streamOuput -- Boolean. Default False. True means the output is streamed.
+    outFile -- A filename, binary file or fileno.  Standard output is
+               written there instead of being kept in memory.
+    errFile -- The same for standard error.
+    bufsize -- Size of each read, up to 1 MiB.  Default 4096.  On Linux
+               the pipes are made this big too, if allowed.
+    tail -- Keep only the last tail bytes of each output.
+    copy -- Boolean. Default True.  False means the outputs are returned
+            as the bytearrays they were read into, which saves a copy
+            of large outputs.
+    usage -- A function (or sink, like usage.JSONLSink) called with the
+             usage.Usage of the command: CPU time, max RSS, I/O and
+             wall time.  Sinks added with usage.add_sink get it too.
+    timeout -- Seconds the command may run.
+    idleTimeout -- Seconds the command may run without any output.
+    maxOutput -- Bytes of stdout and stderr (together) the command may
+                 write.  Output after that is thrown away.
+    session -- Boolean. Default False.  Run the command in its own
+               session and process group.
+
+    With any of the limits, the command runs in its own session.
+    When a limit is reached the group gets SIGTERM, then SIGKILL after
+    KILL_GRACE seconds, and the code returned is TIMEOUT, IDLE_TIMEOUT
+    or OUTPUT_LIMIT.
+
+    The command is run by the shared Supervisor, so many threads may
+    call executeCommand at once.  If waiting is interrupted (for
+    example by KeyboardInterrupt) the command is stopped.
 
     Returns:
     A tuple containing three values:
-        code -- Exit code. 0 is normal.
+        code -- Exit code. 0 is normal.  Negative if stopped for a limit.
         stdout -- String containing the standard output.
         stderr -- String containing the standard error output.
     """
-    global commandPid
-
-    exitStatus = 0
-    fpClose = 0
-    outData = []
-    errData = []
-    BUFSIZ = 4096
+    if tail is not None and tail < 0:
+        raise ValueError("tail must not be negative.")
 
     # set the output encoding
     if sys.stdout.encoding is None:
@@ -116,16 +201,6 @@ def executeCommand(command,
     else:
         outenc = sys.stdout.encoding
 
-    try:
-        sig_INT_handler = signal.signal(signal.SIGINT, sig_handler)
-        sig_HUP_handler = signal.signal(signal.SIGHUP, sig_handler)
-        sig_TERM_handler = signal.signal(signal.SIGTERM, sig_handler)
-    except ValueError:
-        # happens when used in a thread
-        pass
-    except:
-        print(traceback.format_exc())
-
     commandStdin, fpClose, errStr = get_stdin(stdin)
     if errStr:
         if streamOutput:
@@ -136,66 +211,50 @@ def executeCommand(command,
     if shell is True or isinstance(command, list):
         commandArgs = command
     else:
-        commandArgs = usplit(command)
+        commandArgs = shlex.split(command)
+
+    captures = {}
+
+    def output(proc, name, data):
+        captures[name].feed(data)
 
+    proc = None
     try:
-        child = subprocess.Popen(commandArgs, bufsize=BUFSIZ,
-                             stdin=commandStdin,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             shell=shell,
-                             close_fds=True)
-    except Exception as e:
-        # swrite(sys.stderr, e.strerror, outenc)
+        captures['stdout'] = Capture(outFile, tail, sys.stdout if streamOutput else None, outenc)
+        captures['stderr'] = Capture(errFile, tail, sys.stderr if streamOutput else None, outenc)
+        proc = get_supervisor().start(commandArgs, stdin=commandStdin, shell=shell,
+                                      session=session, on_output=output,
+                                      timeout=timeout, idleTimeout=idleTimeout,
+                                      maxOutput=maxOutput, bufsize=bufsize, usage=usage)
+    except OSError as e:
         sys.stderr.write(e.strerror)
         return 1, b"", e.strerror.encode(outenc)
-
-    poller = select.poll()
-    poller.register(child.stdout, select.POLLIN)
-    poller.register(child.stderr, select.POLLIN)
-
-    numfds = 2
-    while numfds > 0:
-        try:
-            r = poller.poll()
-        except select.error as err:
-            print(err[1], file=sys.stderr)
-            break
-        for fd, flags in r:
-            if flags & (select.POLLIN | select.POLLPRI):
-                c = os.read(fd, BUFSIZ)
-                if fd == child.stderr.fileno():
-                    errData.append(c)
-                    if streamOutput:
-                        swrite(sys.stderr, c, outenc)
-                else:
-                    outData.append(c)
-                    if streamOutput:
-                        swrite(sys.stdout, c, outenc)
-            if flags & (select.POLLHUP | select.POLLERR):
-                poller.unregister(fd)
-                numfds -= 1
-
-    pid, exitStatus = os.waitpid(child.pid, 0)
-    commandPid = 0
-    if fpClose:
-        try:
-            commandStdin.close()
-        except:
-            pass
+    finally:
+        if fpClose:
+            try:
+                commandStdin.close()
+            except:
+                pass
+        if proc is None:
+            # close the output files opened by name
+            for c in captures.values():
+                c.finish()
 
     try:
-        # restore original signal handlers
-        signal.signal(signal.SIGINT, sig_INT_handler)
-        signal.signal(signal.SIGHUP, sig_HUP_handler)
-        signal.signal(signal.SIGTERM, sig_TERM_handler)
-    except UnboundLocalError:
-        # happens when used in a thread
-        pass
-    except:
-        print(traceback.format_exc())
-
-    if exitStatus != 0:
+        proc.wait()
+    except BaseException:
+        proc.stop()
+        proc.wait()
+        raise
+
+    out = captures['stdout'].finish(copy)
+    err = captures['stderr'].finish(copy)
+
+    exitStatus = proc.status
+    if proc.stopped:
+        sys.stderr.write("%s %s\n" % (command, LIMIT_NAMES[proc.stopped]))
+        exitStatus = proc.stopped
+    elif exitStatus != 0:
         if os.WIFSIGNALED(exitStatus):
             signame = SIGNALS_TO_NAMES_DICT[os.WTERMSIG(exitStatus)]
             sys.stderr.write("%s failed w/ signal %s\n" % (command, signame))
@@ -204,9 +263,9 @@ def executeCommand(command,
                 exitStatus = os.WEXITSTATUS(exitStatus)
             sys.stderr.write("%s failed w/ exit code %d\n" % (command, exitStatus))
         if not streamOutput:
-            sys.stderr.write("%s\n" % ("".join(errData)))
+            sys.stderr.write("%s\n" % err.decode(outenc, 'replace'))
 
-    return exitStatus, b"".join(outData), b"".join(errData)
+    return exitStatus, out, err
 
 
 def runCommand(command, stream=True):
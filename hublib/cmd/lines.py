@@ -0,0 +1,223 @@
+# ----------------------------------------------------------------------
+# Iterate over the lines a command writes while it runs.
+# ======================================================================
+#  Copyright (c) 2004-2017  HUBzero Foundation, LLC
+#  See LICENSE file for details.
+# ======================================================================
+
+from __future__ import print_function
+import codecs
+import collections
+import locale
+import shlex
+import signal
+import threading
+from .command import get_stdin
+from .supervisor import get_supervisor, BUFSIZ, MAX_BUFSIZ
+
+# bytes read ahead of the iteration before the command is paused
+QUEUE_BYTES = 1 << 16
+
+
+class _Output(object):
+    # Chunks the supervisor read, waiting for the iteration.  It is
+    # separate from CommandLines so the supervisor's callbacks do not
+    # keep an abandoned CommandLines alive.
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.chunks = collections.deque()
+        self.size = 0
+        self.exited = False
+        self.discard = False
+        self.cond = threading.Condition()
+
+    def on_output(self, proc, name, data):
+        # in the reactor thread: only buffer
+        with self.cond:
+            if self.discard:
+                return
+            self.chunks.append((name, bytes(data)))
+            self.size += len(data)
+            if self.size >= self.limit:
+                proc.pause()
+            self.cond.notify()
+
+    def on_exit(self, proc):
+        with self.cond:
+            self.exited = True
+            self.cond.notify()
+
+    def get(self, proc):
+        # Waits for output and returns all of it, or an empty deque
+        # once the command has exited.  Pausing and resuming happen
+        # under cond, so a pause cannot follow the resume for data
+        # already taken.
+        with self.cond:
+            while not self.chunks and not self.exited:
+                self.cond.wait()
+            chunks, self.chunks = self.chunks, collections.deque()
+            self.size = 0
+            proc.resume()
+        return chunks
+
+    def kill(self, proc):
+        # drop the output and let the supervisor read to the end
+        with self.cond:
+            self.discard = True
+            self.chunks.clear()
+            proc.resume()
+        proc.signal(signal.SIGKILL)
+
+
+class CommandLines(object):
+    """Runs a command and iterates over its output lines as they arrive.
+
+    for name, line in iterCommand('mysim -v'):
+        if name == 'stderr':
+            ...
+
+    Each item is ('stdout' or 'stderr', line), with line decoded and
+    ending in sep, except possibly the last.  The command is run by
+    the shared Supervisor, which stops reading its output while more
+    than QUEUE_BYTES are waiting to be iterated over, so a slow
+    consumer makes the command wait instead of letting output pile
+    up in memory.  Lines longer than maxline characters are returned
+    in pieces.
+
+    After the iteration ends, returncode is the exit code, the
+    signal number if the command was killed, or TIMEOUT or
+    IDLE_TIMEOUT if it was stopped for a limit, and usage is its
+    usage.Usage.  Stopping early (break, close() or leaving a with
+    block) kills the command.
+    """
+
+    def __init__(self, command, stdin=None, shell=False, stderr=True,
+                 encoding=None, errors='replace', sep='\n',
+                 maxline=MAX_BUFSIZ, bufsize=BUFSIZ, usage=None,
+                 timeout=None, idleTimeout=None):
+        if not sep:
+            raise ValueError("sep must not be empty.")
+        if not 0 < bufsize <= MAX_BUFSIZ:
+            raise ValueError("bufsize must be between 1 and %d." % MAX_BUFSIZ)
+        if encoding is None:
+            encoding = locale.getpreferredencoding(False)
+        self.command = command
+        self.encoding = encoding
+        self.errors = errors
+        self.sep = sep
+        self.maxline = maxline
+        self.returncode = None
+        self.usage = None
+
+        commandStdin, fpClose, errStr = get_stdin(stdin)
+        if errStr:
+            raise ValueError(errStr.strip())
+        if shell is True or isinstance(command, list):
+            commandArgs = command
+        else:
+            commandArgs = shlex.split(command)
+        self._out = _Output(max(bufsize, QUEUE_BYTES))
+        try:
+            self.proc = get_supervisor().start(commandArgs, stdin=commandStdin, shell=shell,
+                                               stderr=stderr, on_output=self._out.on_output,
+                                               on_exit=self._out.on_exit, timeout=timeout,
+                                               idleTimeout=idleTimeout, bufsize=bufsize,
+                                               usage=usage)
+        finally:
+            if fpClose:
+                commandStdin.close()
+        self.child = self.proc.child
+        self.start = self.proc.start
+        self._lines = self._run()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._lines)
+
+    next = __next__
+
+    def _run(self):
+        names = ('stdout', 'stderr')
+        decoders = dict((name, codecs.getincrementaldecoder(self.encoding)(self.errors))
+                        for name in names)
+        partial = dict((name, u'') for name in names)
+        sep, maxline = self.sep, self.maxline
+
+        while True:
+            chunks = self._out.get(self.proc)
+            if not chunks:
+                break
+            for name, data in chunks:
+                text = partial[name] + decoders[name].decode(data)
+                lines = text.split(sep)
+                rest = lines.pop()
+                for line in lines:
+                    yield name, line + sep
+                while len(rest) >= maxline:
+                    yield name, rest[:maxline]
+                    rest = rest[maxline:]
+                partial[name] = rest
+        for name in names:
+            text = partial[name] + decoders[name].decode(b'', True)
+            if text:
+                yield name, text
+        self._wait()
+
+    def _wait(self):
+        self.proc.wait()
+        self.usage = self.proc.usage
+        # like executeCommand, a signal number if killed
+        self.returncode = self.proc.returncode
+
+    def close(self):
+        """
+        Stops reading and kills the command if it is still running.
+        """
+        self._lines.close()
+        if self.returncode is None:
+            self._out.kill(self.proc)
+            self._wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        proc = getattr(self, 'proc', None)
+        if proc is not None and not proc.done():
+            self._out.kill(proc)
+
+
+def iterCommand(command, stdin=None, shell=False, stderr=True, **kwargs):
+    """Run a command and iterate over its output lines as they arrive.
+
+    Arguments:
+        command -- A list or string containing the command to run.
+                   Strings will be converted to a list internally with shlex.
+
+    Keyword arguments:
+    stdin -- A file, fileno, or filename that will be piped as input.
+    shell -- Boolean. Default False. Run the command with the shell.
+    stderr -- Boolean. Default True. False means standard error is
+              not captured and goes to this process's standard error.
+    encoding -- Encoding of the output.  Default is the locale's.
+    errors -- How to handle bad bytes.  Default 'replace'.
+    sep -- Line or record separator.  Default newline.
+    maxline -- Lines longer than this are split.  Default 1 MiB.
+    bufsize -- Size of each read.  Default 4096.
+    usage -- A function called with the usage.Usage of the command.
+    timeout -- Seconds the command may run before it is killed.
+    idleTimeout -- Seconds it may run without output.  Time spent
+                   waiting for the consumer does not count.
+
+    Returns:
+    A CommandLines object, iterating over (name, line) tuples where
+    name is 'stdout' or 'stderr'.  Its returncode is set when the
+    iteration ends.
+    """
+    return CommandLines(command, stdin=stdin, shell=shell, stderr=stderr, **kwargs)
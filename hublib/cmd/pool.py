@@ -0,0 +1,273 @@
+# ----------------------------------------------------------------------
+# CommandPool runs many commands, a fixed number at a time, from
+# ordinary (non-async) code.
+# ======================================================================
+#  Copyright (c) 2004-2017  HUBzero Foundation, LLC
+#  See LICENSE file for details.
+# ======================================================================
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from .aio import execute_command_async
+from .supervisor import TIMEOUT
+
+
+class Job(object):
+    """A command submitted to a CommandPool.
+
+    command, stdin, env, cwd, timeout, shell -- as submitted
+    status -- 'pending', 'running', 'done', 'timeout', 'cancelled' or 'error'
+    code, stdout, stderr -- the result, once status is 'done' or 'timeout'
+    submitted, started, finished -- times from time.time()
+    """
+
+    def __init__(self, command, stdin=None, env=None, cwd=None, timeout=None, shell=False):
+        self.command = command
+        self.stdin = stdin
+        self.env = env
+        self.cwd = cwd
+        self.timeout = timeout
+        self.shell = shell
+        self.status = 'pending'
+        self.code = None
+        self.stdout = None
+        self.stderr = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+
+    @property
+    def latency(self):
+        # seconds from start to finish
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    @property
+    def wait(self):
+        # seconds waiting for a free slot
+        if self.started is None:
+            return None
+        return self.started - self.submitted
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """
+        Waits for the job and returns (code, stdout, stderr), as
+        executeCommand does, with code TIMEOUT if the job timed out.
+        Raises CancelledError if it was cancelled.
+        """
+        return self.future.result(timeout)
+
+    def cancel(self):
+        """
+        Cancels the job, killing its process group if it is running.
+        """
+        self.future.cancel()
+
+    def __repr__(self):
+        return '<Job %r %s>' % (self.command, self.status)
+
+
+class CommandPool(object):
+    """Runs commands with at most workers running at once.
+
+    with CommandPool(workers=16, timeout=600) as pool:
+        for job in pool.map(commands):
+            code, out, err = job.result()
+        print(pool.stats())
+
+    Commands run in their own process groups.  Cancelled or timed out
+    jobs have the whole group killed.  All jobs are run by one event
+    loop thread, not one thread per job.
+
+    :param workers: Maximum number of commands running at once.
+        Default is the number of CPUs.
+    :param timeout: Default timeout in seconds for each job.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.timeout = timeout
+        self.jobs = []
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        name='CommandPool', daemon=True)
+        self._thread.start()
+        self._sem = self._call(self._make_sem())
+        self._closed = False
+
+    async def _make_sem(self):
+        return asyncio.Semaphore(self.workers)
+
+    async def _finish(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _run(self, job):
+        async with self._sem:
+            job.started = time.time()
+            job.status = 'running'
+            try:
+                job.code, job.stdout, job.stderr = await execute_command_async(
+                    job.command, stdin=job.stdin, shell=job.shell, env=job.env,
+                    cwd=job.cwd, timeout=job.timeout, quiet=True)
+                job.status = 'timeout' if job.code == TIMEOUT else 'done'
+            except asyncio.CancelledError:
+                job.status = 'cancelled'
+                raise
+            except Exception:
+                job.status = 'error'
+                raise
+            finally:
+                job.finished = time.time()
+        return job.code, job.stdout, job.stderr
+
+    def submit(self, command, stdin=None, env=None, cwd=None, timeout=None, shell=False):
+        """
+        Queues a command and returns its Job.
+
+        :param command: A list or string, as for executeCommand.
+        :param stdin: A file, fileno, filename or bytes for the
+            command's input.
+        :param env: Environment for the command.
+        :param cwd: Directory to run the command in.
+        :param timeout: Seconds before the command is killed.
+            Default is the pool's timeout.
+        :param shell: Run the command with the shell.
+        """
+        if self._closed:
+            raise ValueError('CommandPool is closed.')
+        if timeout is None:
+            timeout = self.timeout
+        job = Job(command, stdin, env, cwd, timeout, shell)
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job), self._loop)
+        job.future.add_done_callback(lambda f: self._cancelled(job, f))
+        with self._lock:
+            self.jobs.append(job)
+        return job
+
+    def _cancelled(self, job, future):
+        # jobs cancelled before they started never ran _run
+        if future.cancelled() and job.status == 'pending':
+            job.status = 'cancelled'
+
+    def map(self, commands, ordered=True, **kwargs):
+        """
+        Submits all commands and returns an iterator of their Jobs
+        as they finish, in the order of commands if ordered is True.  Other keyword
+        arguments are passed to submit.  A command may also be a
+        dict of submit arguments.
+        """
+        jobs = []
+        for c in commands:
+            if isinstance(c, dict):
+                args = dict(kwargs)
+                args.update(c)
+                jobs.append(self.submit(**args))
+            else:
+                jobs.append(self.submit(c, **kwargs))
+        if ordered:
+            return self._in_order(jobs)
+        return self.as_completed(jobs)
+
+    def _in_order(self, jobs):
+        for job in jobs:
+            try:
+                job.future.exception()
+            except concurrent.futures.CancelledError:
+                pass
+            yield job
+
+    def as_completed(self, jobs=None, timeout=None):
+        """
+        Yields jobs (default all submitted) as they finish.
+        """
+        if jobs is None:
+            with self._lock:
+                jobs = list(self.jobs)
+        futures = dict((job.future, job) for job in jobs)
+        for f in concurrent.futures.as_completed(futures, timeout):
+            yield futures[f]
+
+    def wait(self):
+        """
+        Waits for all submitted jobs.
+        """
+        with self._lock:
+            futures = [job.future for job in self.jobs]
+        concurrent.futures.wait(futures)
+
+    def cancel(self):
+        """
+        Cancels all pending and running jobs.
+        """
+        with self._lock:
+            jobs = list(self.jobs)
+        for job in jobs:
+            job.cancel()
+
+    def stats(self):
+        """
+        Returns a dict with counts of jobs by status and
+        throughput (jobs per second since the first was submitted)
+        and latency (mean, p50, p95 and max seconds of finished jobs).
+        """
+        with self._lock:
+            jobs = list(self.jobs)
+        res = dict(jobs=len(jobs))
+        for status in ['pending', 'running', 'done', 'timeout', 'cancelled', 'error']:
+            res[status] = 0
+        for job in jobs:
+            res[job.status] += 1
+        lat = sorted(job.latency for job in jobs if job.latency is not None)
+        waits = [job.wait for job in jobs if job.wait is not None]
+        finished = [job.finished for job in jobs if job.finished is not None]
+        if jobs and finished:
+            elapsed = max(finished) - min(job.submitted for job in jobs)
+            res['elapsed'] = elapsed
+            res['throughput'] = len(finished) / elapsed if elapsed > 0 else float('inf')
+        if lat:
+            res['latency_mean'] = sum(lat) / len(lat)
+            res['latency_p50'] = lat[len(lat) // 2]
+            res['latency_p95'] = lat[min(len(lat) - 1, int(0.95 * len(lat)))]
+            res['latency_max'] = lat[-1]
+        if waits:
+            res['wait_mean'] = sum(waits) / len(waits)
+        return res
+
+    def shutdown(self, wait=True, cancel=False):
+        """
+        Stops the pool.  Running jobs are waited for, or cancelled
+        (killed) if cancel is True or wait is False.  Either way no
+        command outlives the pool.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if cancel or not wait:
+            self.cancel()
+        # cancelled futures return at once; wait for the kills
+        self._call(self._finish())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # on an exception (like KeyboardInterrupt) kill everything
+        self.shutdown(cancel=exc_type is not None)
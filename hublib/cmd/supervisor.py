@@ -0,0 +1,475 @@
+# ----------------------------------------------------------------------
+# Supervisor runs commands and watches all of their pipes, limits
+# and exits from one reactor thread.  executeCommand, iterCommand and
+# the ui RunCommand and Submit widgets use the shared one.
+# ======================================================================
+#  Copyright (c) 2004-2017  HUBzero Foundation, LLC
+#  See LICENSE file for details.
+# ======================================================================
+
+from __future__ import print_function
+import errno
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from .usage import report
+
+BUFSIZ = 4096
+# largest read size; also the default Linux limit on pipe sizes
+MAX_BUFSIZ = 1 << 20
+F_SETPIPE_SZ = 1031
+
+# seconds between SIGTERM and SIGKILL when stopping a command
+KILL_GRACE = 2.0
+
+# codes returned when a command is stopped for a limit
+TIMEOUT = -1
+IDLE_TIMEOUT = -2
+OUTPUT_LIMIT = -3
+LIMIT_NAMES = {
+    TIMEOUT: 'timed out',
+    IDLE_TIMEOUT: 'produced no output for too long',
+    OUTPUT_LIMIT: 'produced too much output',
+}
+
+# wait status reported for a child someone else reaped, whose real
+# status is unknown: exit code 255, so it is not taken for success
+LOST_STATUS = 255 << 8
+
+# longest wait between checks for a child that closed its
+# pipes but has not exited
+MAX_REAP_WAIT = 0.1
+
+
+def set_pipe_size(fd, size):
+    # Try to make a pipe hold size bytes, so reads can be that big.
+    # Linux only.  Returns False if it could not be changed.
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    try:
+        fcntl.fcntl(fd, getattr(fcntl, 'F_SETPIPE_SZ', F_SETPIPE_SZ), size)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def stop_group(pgid, sig=signal.SIGTERM):
+    # signal a process group, ignoring groups that are gone
+    try:
+        os.killpg(pgid, sig)
+    except OSError:
+        pass
+
+
+def _readinto(fd, view):
+    if hasattr(os, 'readv'):
+        return os.readv(fd, [view])
+    data = os.read(fd, len(view))
+    view[:len(data)] = data
+    return len(data)
+
+
+class Process(object):
+    """A command started by a Supervisor.
+
+    command -- the command
+    pid -- its process id, and process group if it has its own session
+    start -- start time from time.time()
+    status -- raw wait status once it has exited
+    stopped -- TIMEOUT, IDLE_TIMEOUT or OUTPUT_LIMIT if it was stopped
+               for a limit, else 0
+    usage -- its usage.Usage once it has exited
+    nbytes -- bytes of output so far
+    paused -- True while its output is not being read
+    """
+
+    def __init__(self, supervisor, child, command, session, on_output, on_exit,
+                 timeout, idleTimeout, maxOutput, bufsize, usage):
+        self.supervisor = supervisor
+        self.child = child
+        self.command = command
+        self.pid = child.pid
+        self.session = session
+        self.start = time.time()
+        self.status = None
+        self.stopped = 0
+        self.usage = None
+        self.nbytes = 0
+        self.on_output = on_output
+        self.on_exit = on_exit
+        self.deadline = None if timeout is None else self.start + timeout
+        self.idleTimeout = idleTimeout
+        self.maxOutput = maxOutput
+        self.lastOutput = self.start
+        self.view = memoryview(bytearray(bufsize))
+        self.pipes = {child.stdout.fileno(): 'stdout'}
+        if child.stderr is not None:
+            self.pipes[child.stderr.fileno()] = 'stderr'
+        self.open = len(self.pipes)
+        self.paused = False
+        # whether the reactor is watching the pipes
+        self.watched = False
+        self.killAt = None
+        self.killed = False
+        self.reapAt = None
+        self.reapWait = 0.001
+        self._sink = usage
+        self._done = threading.Event()
+
+    def signal(self, sig=signal.SIGTERM):
+        """
+        Sends sig to the command, or to its whole process group if it
+        has its own session.  Does nothing once it has exited.
+        """
+        if self.status is not None:
+            return
+        try:
+            if self.session:
+                os.killpg(self.pid, sig)
+            else:
+                os.kill(self.pid, sig)
+        except OSError:
+            pass
+
+    def stop(self, reason=0):
+        """
+        Stops the command: SIGTERM now and SIGKILL after KILL_GRACE
+        seconds if it is still running.
+        """
+        with self.supervisor._lock:
+            if self.killAt is not None or self.status is not None:
+                return
+            if reason:
+                self.stopped = reason
+            self.killAt = time.time() + KILL_GRACE
+        self.signal(signal.SIGTERM)
+        self.supervisor._wake()
+
+    def pause(self):
+        """
+        Stops reading the command's output until resume is called, so
+        a command writing faster than its output is used blocks on a
+        full pipe.  The idle timeout does not run while paused, and a
+        command being stopped is always read.
+        """
+        self._set_paused(True)
+
+    def resume(self):
+        """
+        Reads the command's output again after pause.
+        """
+        self._set_paused(False)
+
+    def _set_paused(self, paused):
+        with self.supervisor._lock:
+            if self.paused == paused:
+                return
+            self.paused = paused
+        self.supervisor._wake()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the command to exit and its on_exit function to
+        return.  Returns True if it has.
+        """
+        return self._done.wait(timeout)
+
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def returncode(self):
+        """
+        As returned by executeCommand: the limit code if stopped for a
+        limit, the exit code, or the raw wait status if killed.
+        """
+        if self.status is None:
+            return None
+        if self.stopped:
+            return self.stopped
+        if os.WIFEXITED(self.status):
+            return os.WEXITSTATUS(self.status)
+        return self.status
+
+    def __repr__(self):
+        return '<Process %d %r>' % (self.pid, self.command)
+
+
+class Supervisor(object):
+    """Runs commands and multiplexes all their pipes in one thread.
+
+    proc = get_supervisor().start('mysim', on_output=show, timeout=600)
+    proc.wait()
+
+    The reactor thread is started with the first command.  It reads
+    output, enforces limits, and reaps children with os.wait4.  It
+    calls on_output(proc, name, data) with each chunk, where name is
+    'stdout' or 'stderr' and data is a memoryview that is only valid
+    during the call, and on_exit(proc) when the command has exited.
+    Both run in the reactor thread, so they should be quick.
+
+    Any thread may start, signal, stop or wait for commands.  No
+    signal handlers are installed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._setup()
+
+    def _setup(self):
+        self._pid = os.getpid()
+        self._new = []
+        self._procs = set()
+        self._thread = None
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        for fd in (self._wake_r, self._wake_w):
+            os.set_blocking(fd, False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ)
+
+    def start(self, command, stdin=None, shell=False, session=False, env=None, cwd=None,
+              on_output=None, on_exit=None, timeout=None, idleTimeout=None,
+              maxOutput=None, bufsize=BUFSIZ, usage=None, stderr=True):
+        """
+        Starts a command and returns its Process.
+
+        :param command: A list, or a string if shell is True.
+        :param stdin: None, a file or a fileno.
+        :param shell: Run the command with the shell.
+        :param session: Run the command in its own session and process
+            group, so signals go to everything it starts.  Always done
+            if a limit is given.
+        :param env: Environment for the command.
+        :param cwd: Directory to run the command in.
+        :param on_output: Called with (proc, name, data) for output.
+        :param on_exit: Called with proc when the command has exited.
+        :param timeout: Seconds the command may run.
+        :param idleTimeout: Seconds it may run without output.
+        :param maxOutput: Bytes of output it may write.  Output after
+            that is not passed to on_output.
+        :param bufsize: Size of each read, up to 1 MiB.
+        :param usage: Function called with the usage.Usage, as well
+            as any sinks added with usage.add_sink.
+        :param stderr: False to leave standard error going to this
+            process's instead of reading it.
+
+        Raises OSError if the command cannot be started.
+        """
+        if not 0 < bufsize <= MAX_BUFSIZ:
+            raise ValueError("bufsize must be between 1 and %d." % MAX_BUFSIZ)
+        if timeout is not None or idleTimeout is not None or maxOutput is not None:
+            session = True
+        if os.getpid() != self._pid:
+            # forked; the reactor thread stayed in the parent
+            self._setup()
+        child = subprocess.Popen(command, bufsize=BUFSIZ,
+                                 stdin=stdin,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE if stderr else None,
+                                 shell=shell,
+                                 close_fds=True,
+                                 start_new_session=session,
+                                 env=env,
+                                 cwd=cwd)
+        proc = Process(self, child, command, session, on_output, on_exit,
+                       timeout, idleTimeout, maxOutput, bufsize, usage)
+        for fd in proc.pipes:
+            os.set_blocking(fd, False)
+            if bufsize > BUFSIZ:
+                set_pipe_size(fd, bufsize)
+        with self._lock:
+            self._new.append(proc)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='Supervisor')
+                self._thread.daemon = True
+                self._thread.start()
+        self._wake()
+        return proc
+
+    def running(self):
+        """
+        Returns a list of the Processes not yet finished.
+        """
+        with self._lock:
+            return list(self._procs) + list(self._new)
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b'x')
+        except OSError:
+            # full pipe; it will wake anyway
+            pass
+
+    def _run(self):
+        sel = self._sel
+        while True:
+            # _procs and _new change together under the lock, so
+            # running() always finds every process in one of them.
+            # Only this thread changes _procs.
+            with self._lock:
+                new, self._new = self._new, []
+                self._procs.update(new)
+                procs = list(self._procs)
+            now = time.time()
+            wait = None
+            for proc in procs:
+                self._watch(proc, now)
+                t = self._next(proc, now)
+                if t is not None and (wait is None or t < wait):
+                    wait = t
+            for key, mask in sel.select(None if wait is None else max(wait - now, 0)):
+                if key.data is None:
+                    try:
+                        while os.read(self._wake_r, 4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                self._read(key.data, key.fd)
+
+            now = time.time()
+            with self._lock:
+                procs = list(self._procs)
+            for proc in procs:
+                self._check(proc, now)
+
+    def _watch(self, proc, now):
+        # register or unregister the pipes as the process is resumed
+        # or paused.  A process being stopped is read to the end.
+        watched = not proc.paused or proc.killAt is not None
+        if watched == proc.watched:
+            return
+        for fd in proc.pipes:
+            if watched:
+                self._sel.register(fd, selectors.EVENT_READ, proc)
+            else:
+                self._sel.unregister(fd)
+        proc.watched = watched
+        if watched:
+            # time spent paused is not idle time
+            proc.lastOutput = now
+
+    def _read(self, proc, fd):
+        # read one chunk, or close the pipe at end of file
+        try:
+            n = _readinto(fd, proc.view)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            n = 0
+        if n == 0:
+            self._close(proc, fd)
+            return
+        proc.lastOutput = time.time()
+        proc.nbytes += n
+        if proc.maxOutput is not None and proc.nbytes > proc.maxOutput:
+            if not proc.stopped:
+                proc.stop(OUTPUT_LIMIT)
+            # keep reading, so the command is not blocked, but drop it
+            if proc.nbytes - n >= proc.maxOutput:
+                return
+        if proc.on_output is not None:
+            self._call(proc.on_output, proc, proc.pipes[fd], proc.view[:n])
+
+    def _close(self, proc, fd):
+        if fd not in proc.pipes:
+            return
+        if proc.watched:
+            self._sel.unregister(fd)
+        del proc.pipes[fd]
+        proc.open -= 1
+        if proc.open == 0:
+            proc.reapAt = time.time()
+            for f in (proc.child.stdout, proc.child.stderr):
+                if f is not None:
+                    f.close()
+
+    def _next(self, proc, now):
+        # when this process next needs attention
+        times = []
+        if proc.killAt is not None:
+            times.append(proc.killAt)
+        else:
+            if proc.deadline is not None:
+                times.append(proc.deadline)
+            if proc.idleTimeout is not None and proc.open and proc.watched:
+                times.append(proc.lastOutput + proc.idleTimeout)
+        if proc.reapAt is not None:
+            times.append(proc.reapAt)
+        return min(times) if times else None
+
+    def _check(self, proc, now):
+        if proc.killAt is not None:
+            if now >= proc.killAt:
+                if not proc.killed:
+                    proc.signal(signal.SIGKILL)
+                    proc.killed = True
+                    proc.killAt = now + KILL_GRACE
+                else:
+                    # something outside the group is holding the pipes open
+                    for fd in list(proc.pipes):
+                        self._close(proc, fd)
+                    proc.killAt = proc.deadline = proc.idleTimeout = None
+        elif proc.deadline is not None and now >= proc.deadline:
+            proc.stop(TIMEOUT)
+        elif (proc.idleTimeout is not None and proc.open and proc.watched and
+              now >= proc.lastOutput + proc.idleTimeout):
+            proc.stop(IDLE_TIMEOUT)
+
+        if proc.reapAt is None or now < proc.reapAt:
+            return
+        try:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid, status, rusage = proc.pid, LOST_STATUS, None
+        if pid == 0:
+            # closed its pipes but still running
+            proc.reapAt = now + proc.reapWait
+            proc.reapWait = min(2 * proc.reapWait, MAX_REAP_WAIT)
+            return
+        self._finish(proc, status, rusage)
+
+    def _finish(self, proc, status, rusage):
+        proc.child.returncode = status
+        if proc.stopped and proc.session:
+            # kill anything left in the group, even if the leader exited
+            stop_group(proc.pid, signal.SIGKILL)
+        proc.usage = report(proc.command, proc.start, status, rusage, proc._sink)
+        proc.status = status
+        with self._lock:
+            self._procs.discard(proc)
+        if proc.on_exit is not None:
+            self._call(proc.on_exit, proc)
+        proc._done.set()
+
+    def _call(self, func, *args):
+        # callbacks must not stop the reactor
+        try:
+            func(*args)
+        except Exception:
+            print(traceback.format_exc(), file=sys.stderr)
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_supervisor():
+    """
+    Returns the Supervisor shared by all of hublib, creating it
+    the first time.
+    """
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = Supervisor()
+    return _supervisor
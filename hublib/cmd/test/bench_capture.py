@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# Peak memory (max RSS) and time of executeCommand capturing a large
+# output in different ways.  Each case runs in a fresh python process.
+#
+# usage: python bench_capture.py [megabytes]
+
+from __future__ import print_function
+import os
+import sys
+import subprocess
+
+CASES = [
+    ('default', ''),
+    ('bufsize=1MiB', 'bufsize=1 << 20'),
+    ('copy=False', 'copy=False'),
+    ('copy=False, 1MiB', 'copy=False, bufsize=1 << 20'),
+    ('tail=64KiB', 'tail=1 << 16'),
+    ('outFile', 'outFile=os.devnull'),
+    ('outFile, 1MiB', 'outFile=os.devnull, bufsize=1 << 20'),
+]
+
+CODE = """
+import os, resource, time
+from hublib.cmd import executeCommand
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t = time.time()
+code, out, err = executeCommand(['head', '-c', '%dM', '/dev/zero'], %s)
+t = time.time() - t
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(len(out), t, (peak - base) / 1024.)
+"""
+
+
+def main():
+    mb = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    print('capturing %d MiB' % mb)
+    print('%-20s %10s %10s %14s' % ('', 'kept MiB', 'seconds', 'peak RSS MiB'))
+    for name, args in CASES:
+        res = subprocess.check_output([sys.executable, '-c', CODE % (mb, args)],
+                                      cwd=os.path.abspath('../../..'))
+        size, t, peak = res.split()
+        print('%-20s %10.1f %10.2f %14.1f' % (name, int(size) / 1048576., float(t), float(peak)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# Startup time of a short-lived program that only runs a command
+# with executeCommand, compared to python alone and to one that also
+# uses units.
+#
+# usage: python bench_startup.py [runs]
+
+from __future__ import print_function
+import os
+import sys
+import subprocess
+import time
+
+PROGRAMS = [
+    ('python', 'pass'),
+    ('executeCommand', 'from hublib.cmd import executeCommand\n'
+                       'executeCommand(["true"])'),
+    ('executeCommand + units', 'from hublib.cmd import executeCommand\n'
+                               'from hublib import ureg\n'
+                               'executeCommand(["true"])\n'
+                               'ureg.parse_expression("3 m")'),
+]
+
+
+def best_time(code, runs):
+    best = None
+    for i in range(runs):
+        t = time.time()
+        subprocess.check_call([sys.executable, '-c', code], cwd=os.path.abspath('../../..'))
+        t = time.time() - t
+        if best is None or t < best:
+            best = t
+    return best
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    print('best of %d runs' % runs)
+    for name, code in PROGRAMS:
+        print('%-24s %8.1f ms' % (name, 1000 * best_time(code, runs)))
+
+
+if __name__ == '__main__':
+    main()
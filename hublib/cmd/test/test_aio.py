@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import pytest
+import asyncio
+import os
+import signal
+import sys
+import time
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cmd import execute_command_async, gather_commands, executeCommand
+from hublib.cmd.supervisor import BUFSIZ, TIMEOUT, IDLE_TIMEOUT, OUTPUT_LIMIT
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def group_alive(pgid):
+    # True if a process in the group is running (zombies don't count)
+    for pid in os.listdir('/proc'):
+        try:
+            with open('/proc/%s/stat' % pid) as f:
+                stat = f.read().rsplit(')', 1)[1].split()
+        except (IOError, ValueError, IndexError):
+            continue
+        if int(stat[2]) == pgid and stat[0] != 'Z':
+            return True
+    return False
+
+
+class TestExecuteAsync:
+
+    def test_basic(self):
+        assert run(execute_command_async('echo hello')) == (0, b'hello\n', b'')
+
+    def test_same_as_execute(self):
+        cmd = 'cat ಕನ್ನಡ.txt'
+        assert run(execute_command_async(cmd)) == executeCommand(cmd)
+
+    def test_stdin(self):
+        code, out, err = run(execute_command_async('cat', stdin='ಕನ್ನಡ.txt'))
+        with open('ಕನ್ನಡ.txt', 'rb') as f:
+            assert out == f.read()
+
+    def test_exit_code(self):
+        code, out, err = run(execute_command_async('ls does_not_exist'))
+        assert code != 0
+        assert err.endswith(b'No such file or directory\n')
+
+    def test_signal(self):
+        code, out, err = run(execute_command_async('kill -9 $$', shell=True))
+        assert code == signal.SIGKILL
+
+    def test_exe_not_exist(self):
+        code, out, err = run(execute_command_async('does_not_exist'))
+        assert code == 1
+        assert err.decode('utf-8').startswith('No such file or directory')
+
+    def test_callbacks(self):
+        out, err = [], []
+
+        async def on_err(chunk):
+            err.append(chunk)
+
+        cmd = 'echo a; echo b 1>&2; echo c'
+        res = run(execute_command_async(cmd, shell=True, on_stdout=out.append, on_stderr=on_err))
+        assert b''.join(out) == res[1] == b'a\nc\n'
+        assert b''.join(err) == res[2] == b'b\n'
+
+    def test_stream(self, capsys):
+        run(execute_command_async('echo hello', streamOutput=True))
+        assert capsys.readouterr().out == 'hello\n'
+
+    def test_timeout(self):
+        pids = []
+        cmd = 'sleep 30 & echo $$; wait'
+        code, out, err = run(execute_command_async(cmd, shell=True, timeout=0.5,
+                                                   on_stdout=lambda c: pids.append(int(c))))
+        assert code == TIMEOUT
+        assert out == b'%d\n' % pids[0]
+        assert not group_alive(pids[0])
+        # the same as executeCommand
+        assert executeCommand('sleep 5', timeout=0.3)[0] == TIMEOUT
+
+    def test_idle_timeout(self):
+        cmd = 'echo a; sleep 0.1; echo b; sleep 5'
+        code, out, err = run(execute_command_async(cmd, shell=True, idleTimeout=0.5))
+        assert code == IDLE_TIMEOUT
+        assert out == b'a\nb\n'
+
+    def test_max_output(self):
+        code, out, err = run(execute_command_async('yes', maxOutput=100000))
+        assert code == OUTPUT_LIMIT
+        assert 100000 <= len(out) < 100000 + 2 * BUFSIZ
+
+    def test_cancel(self):
+        pids = []
+
+        async def main():
+            task = asyncio.ensure_future(execute_command_async(
+                'sleep 30 & echo $$; wait', shell=True,
+                on_stdout=lambda c: pids.append(int(c))))
+            while not pids:
+                await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        run(main())
+        assert not group_alive(pids[0])
+
+
+class TestGather:
+
+    def test_order(self):
+        cmds = ['sh -c "sleep 0.%d; echo %d"' % (3 - i, i) for i in range(3)]
+        res = run(gather_commands(cmds, limit=3))
+        assert [r[1] for r in res] == [b'0\n', b'1\n', b'2\n']
+
+    def test_limit(self):
+        t = time.time()
+        run(gather_commands(['sleep 0.3'] * 4, limit=2))
+        t = time.time() - t
+        assert 0.6 <= t < 1.5
+
+    def test_timeout(self):
+        res = run(gather_commands(['echo ok', 'sleep 5'], timeout=0.3, quiet=True))
+        assert res == [(0, b'ok\n', b''), (TIMEOUT, b'', b'')]
+
+    def test_exceptions(self):
+        def bad(chunk):
+            raise RuntimeError('oops')
+        res = run(gather_commands(['true', 'echo ok'], on_stdout=bad,
+                                  return_exceptions=True))
+        assert res[0] == (0, b'', b'')
+        assert isinstance(res[1], RuntimeError)
@@ -4,9 +4,10 @@ from __future__ import print_function
 import pytest
 import sys
 import os
+import time
 from subprocess import check_output
 sys.path.insert(0, os.path.abspath('../../..'))
-from hublib.cmd import runCommand, executeCommand
+from hublib.cmd import runCommand, executeCommand, command
 
 
 class TestRunCommand:
@@ -64,6 +65,22 @@ class TestRunCommand:
         assert out == b''
         assert err.decode('utf-8').startswith('No such file or directory')
 
+    def test_exe_not_exist_outfile(self, tmp_path, monkeypatch):
+        # files opened by name are closed when the command cannot start
+        opened = []
+        real_open = open
+
+        def tracking_open(*args, **kwargs):
+            f = real_open(*args, **kwargs)
+            opened.append(f)
+            return f
+        monkeypatch.setattr('builtins.open', tracking_open)
+        code, out, err = executeCommand('does_not_exist', outFile=str(tmp_path / 'out'),
+                                        errFile=str(tmp_path / 'err'))
+        assert code != 0
+        assert len(opened) == 2
+        assert all(f.closed for f in opened)
+
     def test_file_not_exist(self):
         code, out, err = runCommand('ls -l does_not_exist')
         assert code != 0
@@ -128,3 +145,127 @@ class TestRunCommand:
         out = out.decode('utf-8')
         assert out == actual
         assert sout == actual
+
+
+class TestCapture:
+
+    def test_bytearray(self):
+        code, out, err = executeCommand(['head', '-c', '100000', '/dev/zero'], copy=False)
+        assert code == 0
+        assert isinstance(out, bytearray)
+        assert out == b'\0' * 100000
+        assert err == b''
+
+    @pytest.mark.parametrize('bufsize', [1, 4096, 65536, 1 << 20])
+    def test_bufsize(self, bufsize):
+        data = os.urandom(300000)
+        with open('capture.tmp', 'wb') as f:
+            f.write(data)
+        try:
+            code, out, err = executeCommand(['cat', 'capture.tmp'], bufsize=bufsize)
+        finally:
+            os.remove('capture.tmp')
+        assert out == data
+
+    def test_bad_bufsize(self):
+        with pytest.raises(ValueError):
+            executeCommand('true', bufsize=0)
+        with pytest.raises(ValueError):
+            executeCommand('true', bufsize=2 << 20)
+
+    def test_tail(self):
+        code, out, err = executeCommand('seq 100000', shell=True, tail=10)
+        assert out == b'\n99999\n100000\n'[-10:]
+        code, out, err = executeCommand('seq 3', shell=True, tail=100)
+        assert out == b'1\n2\n3\n'
+
+    def test_out_file(self, tmp_path):
+        fname = str(tmp_path / 'out')
+        code, out, err = executeCommand('seq 100000; echo oops >&2', shell=True, outFile=fname)
+        assert code == 0
+        assert out == b''
+        assert err == b'oops\n'
+        with open(fname, 'rb') as f:
+            assert f.read() == check_output(['seq', '100000'])
+
+    def test_err_file_object(self, tmp_path):
+        fname = str(tmp_path / 'err')
+        with open(fname, 'wb') as f:
+            code, out, err = executeCommand('echo out; echo err >&2', shell=True,
+                                            errFile=f, tail=2)
+            assert not f.closed
+        assert out == b't\n'
+        assert err == b'r\n'
+        with open(fname, 'rb') as f:
+            assert f.read() == b'err\n'
+
+    def test_fileno(self, tmp_path):
+        fname = str(tmp_path / 'out')
+        fd = os.open(fname, os.O_WRONLY | os.O_CREAT)
+        try:
+            executeCommand(['echo', 'hello'], outFile=fd)
+        finally:
+            os.close(fd)
+        with open(fname, 'rb') as f:
+            assert f.read() == b'hello\n'
+
+    def test_split_utf8_stream(self, capsys):
+        # one byte reads split every multi-byte character
+        code, out, err = executeCommand(['cat', 'ಕನ್ನಡ.txt'], streamOutput=True, bufsize=1)
+        sout, serr = capsys.readouterr()
+        assert sout == out.decode('utf-8')
+
+
+class TestLimits:
+
+    @pytest.fixture(autouse=True)
+    def grace(self, monkeypatch):
+        import hublib.cmd.supervisor
+        monkeypatch.setattr(hublib.cmd.supervisor, 'KILL_GRACE', 0.5)
+
+    def pgid(self, fname):
+        with open(fname) as f:
+            return int(f.read())
+
+    def test_timeout(self, tmp_path):
+        from test_aio import group_alive
+        pidfile = str(tmp_path / 'pid')
+        t = time.time()
+        code, out, err = executeCommand('echo $$ > %s; echo started; sleep 100 & sleep 100' % pidfile,
+                                        shell=True, timeout=0.5)
+        assert time.time() - t < 5
+        assert code == command.TIMEOUT
+        assert out == b'started\n'
+        # the last SIGKILL may take a moment to land
+        pgid = self.pgid(pidfile)
+        for i in range(50):
+            if not group_alive(pgid):
+                break
+            time.sleep(0.05)
+        assert not group_alive(pgid)
+
+    def test_ignores_term(self):
+        t = time.time()
+        code, out, err = executeCommand("trap '' TERM; sleep 100", shell=True, timeout=0.2)
+        assert code == command.TIMEOUT
+        assert time.time() - t < 5
+
+    def test_idle_timeout(self):
+        t = time.time()
+        code, out, err = executeCommand('for i in 1 2 3; do echo $i; sleep 0.1; done; sleep 100',
+                                        shell=True, idleTimeout=0.5)
+        assert code == command.IDLE_TIMEOUT
+        assert out == b'1\n2\n3\n'
+        assert time.time() - t < 5
+
+    def test_max_output(self):
+        code, out, err = executeCommand(['yes'], maxOutput=100000)
+        assert code == command.OUTPUT_LIMIT
+        assert 100000 <= len(out) < 100000 + 2 * command.BUFSIZ
+
+    def test_within_limits(self):
+        code, out, err = executeCommand('seq 3', shell=True, timeout=10, idleTimeout=10, maxOutput=100)
+        assert code == 0
+        assert out == b'1\n2\n3\n'
+        code, out, err = executeCommand('exit 3', shell=True, timeout=10)
+        assert code == 3
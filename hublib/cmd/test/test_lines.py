@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import pytest
+import sys
+import os
+import time
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cmd import iterCommand
+from hublib.cmd.supervisor import TIMEOUT
+
+
+class TestLines:
+
+    def test_lines(self):
+        lines = iterCommand('seq 3')
+        assert list(lines) == [('stdout', '1\n'), ('stdout', '2\n'), ('stdout', '3\n')]
+        assert lines.returncode == 0
+
+    def test_stderr(self):
+        lines = list(iterCommand('echo out; echo err >&2; exit 3', shell=True))
+        assert sorted(lines) == [('stderr', 'err\n'), ('stdout', 'out\n')]
+
+    def test_returncode(self):
+        lines = iterCommand('exit 3', shell=True)
+        assert list(lines) == []
+        assert lines.returncode == 3
+
+    def test_no_newline(self):
+        assert list(iterCommand(['printf', 'a\\nb'])) == [('stdout', 'a\n'), ('stdout', 'b')]
+
+    def test_split_utf8(self):
+        # one byte reads split every character
+        with open('ಕನ್ನಡ.txt', 'rb') as f:
+            actual = f.read().decode('utf-8')
+        lines = iterCommand(['cat', 'ಕನ್ನಡ.txt'], encoding='utf-8', bufsize=1)
+        text = ''.join(line for name, line in lines)
+        assert text == actual
+        assert u'�' not in text
+
+    def test_sep_and_maxline(self):
+        lines = iterCommand(['printf', 'a\\0bb\\0cccccc'], sep='\0', maxline=4)
+        assert [l for n, l in lines] == ['a\0', 'bb\0', 'cccc', 'cc']
+
+    def test_stdin(self):
+        lines = iterCommand('cat', stdin='ಕನ್ನಡ.txt', encoding='utf-8')
+        assert len(list(lines)) == 6
+        with pytest.raises(ValueError):
+            iterCommand('cat', stdin='does_not_exist')
+
+    def test_backpressure(self):
+        # the command blocks on a full pipe while we are not reading
+        lines = iterCommand(['yes'])
+        assert next(lines) == ('stdout', 'y\n')
+        time.sleep(0.2)
+        assert lines.proc.paused
+        assert not lines.proc.done()
+        with open('/proc/%d/status' % lines.child.pid) as f:
+            state = [l for l in f if l.startswith('State')][0]
+        assert 'S' in state
+        lines.close()
+        assert lines.returncode == 9
+
+    def test_break(self):
+        with iterCommand(['yes']) as lines:
+            for name, line in lines:
+                break
+        assert lines.returncode == 9
+
+    def test_abandoned(self):
+        # a paused command is killed when its iterator is collected
+        import gc
+        lines = iterCommand(['yes'])
+        next(lines)
+        proc = lines.proc
+        del lines
+        gc.collect()
+        assert proc.wait(10)
+        assert proc.returncode == 9
+
+    def test_timeout(self):
+        lines = iterCommand(['sleep', '5'], timeout=0.2)
+        assert list(lines) == []
+        assert lines.returncode == TIMEOUT
+
+    def test_idle_while_paused(self):
+        # waiting for the consumer is not idle time
+        lines = iterCommand('yes | head -c 1000000', shell=True, idleTimeout=0.2)
+        next(lines)
+        time.sleep(0.5)
+        assert sum(len(l) for n, l in lines) == 1000000 - 2
+        assert lines.returncode == 0
+
+    def test_usage(self):
+        found = []
+        lines = iterCommand('seq 3', usage=found.append)
+        list(lines)
+        assert found == [lines.usage]
+        assert lines.usage.returncode == 0
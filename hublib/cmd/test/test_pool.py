@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function
+import pytest
+import asyncio
+import concurrent.futures
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cmd import CommandPool
+from hublib.cmd.supervisor import TIMEOUT
+from test_aio import group_alive
+
+
+class TestCommandPool:
+
+    def test_map_ordered(self):
+        cmds = ['sh -c "sleep 0.%d; echo %d"' % (3 - i, i) for i in range(3)]
+        with CommandPool(workers=3) as pool:
+            res = [job.result() for job in pool.map(cmds)]
+        assert [r[1] for r in res] == [b'0\n', b'1\n', b'2\n']
+
+    def test_as_completed(self):
+        cmds = ['sh -c "sleep 0.%d; echo %d"' % (3 - i, i) for i in range(3)]
+        with CommandPool(workers=3) as pool:
+            res = [job.result()[1] for job in pool.map(cmds, ordered=False)]
+        assert res == [b'2\n', b'1\n', b'0\n']
+
+    def test_job_args(self, tmp_path):
+        with CommandPool(workers=2) as pool:
+            a = pool.submit('cat', stdin=b'input data')
+            b = pool.submit('sh -c "echo $FOO; pwd"', env=dict(os.environ, FOO='bar'),
+                            cwd=str(tmp_path))
+            c = pool.submit('exit 3', shell=True)
+            assert a.result() == (0, b'input data', b'')
+            assert b.result()[1] == ('bar\n%s\n' % tmp_path).encode()
+            assert c.result()[0] == 3
+
+    def test_workers(self):
+        with CommandPool(workers=2) as pool:
+            t = time.time()
+            list(pool.map(['sleep 0.3'] * 4))
+            t = time.time() - t
+        assert 0.6 <= t < 1.5
+
+    def test_timeout(self):
+        with CommandPool(workers=2, timeout=0.3) as pool:
+            slow = pool.submit('sleep 5')
+            fast = pool.submit('echo ok', timeout=5)
+            assert slow.result()[0] == TIMEOUT
+            assert fast.result() == (0, b'ok\n', b'')
+        assert slow.status == 'timeout'
+        assert fast.status == 'done'
+
+    def test_cancel(self, tmp_path):
+        pidfile = str(tmp_path / 'pid')
+        pool = CommandPool(workers=1)
+        running = pool.submit('echo $$ > %s; sleep 30 & wait' % pidfile, shell=True)
+        pending = pool.submit('echo never')
+        while not os.path.exists(pidfile) or not open(pidfile).read():
+            time.sleep(0.05)
+        pool.shutdown(cancel=True)
+        assert running.status == 'cancelled'
+        assert pending.status == 'cancelled'
+        with pytest.raises(concurrent.futures.CancelledError):
+            running.result()
+        assert not group_alive(int(open(pidfile).read()))
+
+    def test_no_wait(self, tmp_path):
+        pidfile = str(tmp_path / 'pid')
+        pool = CommandPool(workers=1)
+        running = pool.submit('echo $$ > %s; sleep 30 & wait' % pidfile, shell=True)
+        while not os.path.exists(pidfile) or not open(pidfile).read():
+            time.sleep(0.05)
+        pool.shutdown(wait=False)
+        assert running.status == 'cancelled'
+        assert not group_alive(int(open(pidfile).read()))
+
+    def test_stats(self):
+        with CommandPool(workers=4) as pool:
+            list(pool.map(['true'] * 8 + ['false']))
+            stats = pool.stats()
+        assert stats['jobs'] == 9
+        assert stats['done'] == 9
+        assert stats['throughput'] > 0
+        assert 0 < stats['latency_p50'] <= stats['latency_p95'] <= stats['latency_max']
+
+    def test_closed(self):
+        pool = CommandPool(workers=1)
+        pool.shutdown()
+        with pytest.raises(ValueError):
+            pool.submit('true')
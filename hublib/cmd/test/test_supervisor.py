@@ -0,0 +1,133 @@
+from __future__ import print_function
+import pytest
+import os
+import signal
+import sys
+import threading
+import time
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cmd import executeCommand
+from hublib.cmd.supervisor import Supervisor, get_supervisor, TIMEOUT, LOST_STATUS
+
+
+class TestSupervisor:
+
+    def test_output_and_exit(self):
+        chunks = []
+        exited = []
+        sup = Supervisor()
+        proc = sup.start(['sh', '-c', 'echo out; echo err >&2; exit 4'],
+                         on_output=lambda p, name, data: chunks.append((name, bytes(data))),
+                         on_exit=exited.append)
+        assert proc.wait(10)
+        assert sorted(chunks) == [('stderr', b'err\n'), ('stdout', b'out\n')]
+        assert exited == [proc]
+        assert proc.returncode == 4
+        assert proc.usage.returncode == 4
+        assert sup.running() == []
+
+    def test_running(self):
+        # every unfinished process is listed while others start and exit
+        sup = Supervisor()
+        errors = []
+        stop = threading.Event()
+
+        def watch():
+            try:
+                while not stop.is_set():
+                    sup.running()
+            except Exception as e:
+                errors.append(e)
+        t = threading.Thread(target=watch)
+        t.start()
+        try:
+            procs = []
+            for i in range(50):
+                p = sup.start(['true'])
+                assert p in sup.running() or p.status is not None
+                procs.append(p)
+            for p in procs:
+                assert p.wait(10)
+        finally:
+            stop.set()
+            t.join()
+        assert errors == []
+        assert sup.running() == []
+
+    def test_one_thread(self):
+        sup = Supervisor()
+        before = threading.active_count()
+        procs = [sup.start(['sleep', '0.5']) for i in range(20)]
+        assert threading.active_count() == before + 1
+        for p in procs:
+            assert p.wait(10)
+            assert p.returncode == 0
+
+    def test_threads(self):
+        # executeCommand from many threads at once
+        results = {}
+
+        def run(i):
+            results[i] = executeCommand(['sh', '-c', 'sleep 0.2; echo %d' % i])
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(16):
+            assert results[i] == (0, b'%d\n' % i, b'')
+
+    def test_no_signal_handlers(self):
+        handlers = [signal.getsignal(s) for s in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)]
+        executeCommand('true')
+        assert handlers == [signal.getsignal(s) for s in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP)]
+
+    def test_stop(self):
+        proc = get_supervisor().start(['sleep', '100'], session=True)
+        proc.stop()
+        assert proc.wait(10)
+        assert proc.status == signal.SIGTERM
+        assert not proc.stopped
+
+    def test_timeout(self, monkeypatch):
+        import hublib.cmd.supervisor
+        monkeypatch.setattr(hublib.cmd.supervisor, 'KILL_GRACE', 0.2)
+        proc = get_supervisor().start(['sleep', '100'], timeout=0.2)
+        assert proc.wait(10)
+        assert proc.returncode == TIMEOUT
+
+    def test_reaped_elsewhere(self, monkeypatch):
+        # a child someone else waited for must not look successful
+        import hublib.cmd.supervisor
+
+        def wait4(pid, options):
+            os.waitpid(pid, 0)
+            raise ChildProcessError(pid)
+        monkeypatch.setattr(hublib.cmd.supervisor.os, 'wait4', wait4)
+        proc = Supervisor().start(['true'])
+        assert proc.wait(10)
+        assert proc.status == LOST_STATUS
+        assert proc.returncode == 255
+
+    def test_closed_pipes(self):
+        # exits long after closing its output
+        proc = get_supervisor().start(['sh', '-c', 'exec >&- 2>&-; sleep 0.3; exit 5'])
+        assert proc.wait(10)
+        assert proc.returncode == 5
+
+    def test_bad_callback(self, capsys):
+        def bad(p, name, data):
+            raise RuntimeError('oops')
+        proc = get_supervisor().start(['echo', 'hi'], on_output=bad)
+        assert proc.wait(10)
+        assert proc.returncode == 0
+        assert 'oops' in capsys.readouterr().err
+
+    def test_fork(self):
+        # a forked child gets its own reactor
+        pid = os.fork()
+        if pid == 0:
+            code, out, err = executeCommand(['echo', 'hi'])
+            os._exit(0 if out == b'hi\n' else 1)
+        assert os.waitpid(pid, 0)[1] == 0
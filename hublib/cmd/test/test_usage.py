@@ -0,0 +1,68 @@
+from __future__ import print_function
+import pytest
+import sys
+import os
+import csv
+import json
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.cmd import executeCommand, usage
+
+
+class TestUsage:
+
+    def test_sink(self):
+        found = []
+        code, out, err = executeCommand(
+            [sys.executable, '-c', 'x = bytearray(50 << 20); sum(range(10 ** 6))'],
+            usage=found.append)
+        assert code == 0
+        u, = found
+        assert u.returncode == 0
+        assert u.signal is None
+        assert u.maxrss > 50 << 20
+        assert u.cpu > 0
+        assert u.wall >= u.cpu * 0.5
+        assert u.command.startswith(sys.executable)
+        assert 'Max RSS' in u.summary()
+
+    def test_failed(self):
+        found = []
+        executeCommand('exit 9', shell=True, usage=found.append)
+        assert (found[0].returncode, found[0].signal) == (9, None)
+        executeCommand('kill -9 $$', shell=True, usage=found.append)
+        assert (found[1].returncode, found[1].signal) == (None, 9)
+
+    def test_global_sinks(self, tmp_path):
+        cname = str(tmp_path / 'usage.csv')
+        jname = str(tmp_path / 'usage.jsonl')
+        sinks = [usage.add_sink(usage.CSVSink(cname)), usage.add_sink(usage.JSONLSink(jname))]
+        try:
+            executeCommand('true')
+            executeCommand(['echo', 'hi'])
+            executeCommand('kill -9 $$', shell=True)
+        finally:
+            for s in sinks:
+                usage.remove_sink(s)
+        executeCommand('true')
+        with open(cname) as f:
+            rows = list(csv.DictReader(f))
+        assert [r['command'] for r in rows] == ['true', 'echo hi', 'kill -9 $$']
+        assert set(rows[0]) == set(usage.Usage.FIELDS)
+        assert (rows[0]['returncode'], rows[0]['signal']) == ('0', '')
+        assert (rows[2]['returncode'], rows[2]['signal']) == ('', '9')
+        with open(jname) as f:
+            rows = [json.loads(line) for line in f]
+        assert [r['command'] for r in rows] == ['true', 'echo hi', 'kill -9 $$']
+        assert (rows[0]['returncode'], rows[0]['signal']) == (0, None)
+        assert (rows[2]['returncode'], rows[2]['signal']) == (None, 9)
+
+    def test_bad_sink(self, capsys):
+        def bad(u):
+            raise RuntimeError('oops')
+        code, out, err = executeCommand('true', usage=bad)
+        assert code == 0
+        assert 'oops' in capsys.readouterr().err
+
+    def test_pretty_bytes(self):
+        assert usage.pretty_bytes(100) == '100 B'
+        assert usage.pretty_bytes(3 << 20) == '3.0 MB'
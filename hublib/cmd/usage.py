@@ -0,0 +1,202 @@
+# ----------------------------------------------------------------------
+# Resources used by commands, and sinks to record them in.
+# ======================================================================
+#  Copyright (c) 2004-2017  HUBzero Foundation, LLC
+#  See LICENSE file for details.
+# ======================================================================
+
+from __future__ import print_function
+import csv
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+
+# Linux reports ru_maxrss in KiB, macOS in bytes
+RSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+_sinks = []
+_lock = threading.Lock()
+
+
+class Usage(object):
+    """Resources used by a finished command and everything it waited for.
+
+    command -- the command
+    start -- start time from time.time()
+    wall -- elapsed seconds
+    utime, stime -- user and system CPU seconds
+    maxrss -- largest resident set size in bytes
+    minflt, majflt -- page faults without and with I/O
+    inblock, oublock -- filesystem blocks read and written
+    nvcsw, nivcsw -- voluntary and involuntary context switches
+    returncode -- exit code, or None if killed by a signal
+    signal -- the signal number if killed, else None
+    """
+
+    FIELDS = ['command', 'start', 'wall', 'utime', 'stime', 'maxrss',
+              'minflt', 'majflt', 'inblock', 'oublock', 'nvcsw', 'nivcsw',
+              'returncode', 'signal']
+
+    def __init__(self, command, start, wall, rusage=None, returncode=None, signal=None):
+        if isinstance(command, (list, tuple)):
+            command = ' '.join(command)
+        self.command = command
+        self.start = start
+        self.wall = wall
+        self.returncode = returncode
+        self.signal = signal
+        self.utime = self.stime = 0.0
+        self.maxrss = self.minflt = self.majflt = 0
+        self.inblock = self.oublock = self.nvcsw = self.nivcsw = 0
+        if rusage is not None:
+            self.utime = rusage.ru_utime
+            self.stime = rusage.ru_stime
+            self.maxrss = rusage.ru_maxrss * RSS_SCALE
+            self.minflt = rusage.ru_minflt
+            self.majflt = rusage.ru_majflt
+            self.inblock = rusage.ru_inblock
+            self.oublock = rusage.ru_oublock
+            self.nvcsw = rusage.ru_nvcsw
+            self.nivcsw = rusage.ru_nivcsw
+
+    @property
+    def cpu(self):
+        return self.utime + self.stime
+
+    def as_dict(self):
+        return dict((f, getattr(self, f)) for f in Usage.FIELDS)
+
+    def summary(self):
+        """
+        Returns a short description for status lines.
+        """
+        return "CPU: %.2fs  Max RSS: %s  I/O: %d/%d blocks" % (
+            self.cpu, pretty_bytes(self.maxrss), self.inblock, self.oublock)
+
+    def __repr__(self):
+        return '<Usage %r wall=%.3f cpu=%.3f maxrss=%d>' % (
+            self.command, self.wall, self.cpu, self.maxrss)
+
+
+def pretty_bytes(num):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if num < 1024:
+            break
+        num /= 1024.
+    else:
+        unit = 'TB'
+    if unit == 'B':
+        return '%d B' % num
+    return '%.1f %s' % (num, unit)
+
+
+def wait_usage(pid):
+    """
+    Waits for a child like os.waitpid, but also returns its
+    resource usage (None where os.wait4 is not available).
+
+    Returns:
+    A tuple of (pid, status, rusage).
+    """
+    if hasattr(os, 'wait4'):
+        return os.wait4(pid, 0)
+    pid, status = os.waitpid(pid, 0)
+    return pid, status, None
+
+
+class CSVSink(object):
+    """Appends each Usage as a row of a CSV file.
+
+    A header row is written if the file is new.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.lock = threading.Lock()
+
+    def __call__(self, usage):
+        with self.lock:
+            new = not os.path.exists(self.fname) or os.path.getsize(self.fname) == 0
+            with open(self.fname, 'a') as f:
+                writer = csv.writer(f)
+                if new:
+                    writer.writerow(Usage.FIELDS)
+                writer.writerow([getattr(usage, n) for n in Usage.FIELDS])
+
+
+class JSONLSink(object):
+    """Appends each Usage as a line of JSON.
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.lock = threading.Lock()
+
+    def __call__(self, usage):
+        line = json.dumps(usage.as_dict(), sort_keys=True) + '\n'
+        with self.lock:
+            with open(self.fname, 'a') as f:
+                f.write(line)
+
+
+def add_sink(sink):
+    """
+    Sends the Usage of every command run by hublib to sink.
+
+    :param sink: A function taking a Usage, such as a CSVSink
+        or JSONLSink.
+    """
+    with _lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def record(usage, sink=None):
+    """
+    Sends usage to sink, if given, and to all added sinks.
+    A failing sink is reported on stderr and does not stop the others.
+    """
+    with _lock:
+        sinks = list(_sinks)
+    if sink is not None:
+        sinks.insert(0, sink)
+    for s in sinks:
+        try:
+            s(usage)
+        except Exception:
+            print(traceback.format_exc(), file=sys.stderr)
+
+
+def report(command, start, status, rusage=None, sink=None):
+    """
+    Makes the Usage of a command that was started at time start and
+    has exited with wait status status, and records it.
+    """
+    code = sig = None
+    if os.WIFSIGNALED(status):
+        sig = os.WTERMSIG(status)
+    elif os.WIFEXITED(status):
+        code = os.WEXITSTATUS(status)
+    else:
+        code = status
+    usage = Usage(command, start, time.time() - start, rusage, code, sig)
+    record(usage, sink)
+    return usage
+
+
+def finished(command, start, pid, sink=None):
+    """
+    Waits for pid, which was started at time start, and records its
+    usage.  Returns (status, usage) where status is from os.waitpid.
+    """
+    pid, status, rusage = wait_usage(pid)
+    return status, report(command, start, status, rusage, sink)
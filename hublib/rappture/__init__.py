@@ -1,2 +1,3 @@
 from .rappture import RapXML
 from .tool import Tool
+from .batch import read_runs, iter_runs
@@ -0,0 +1,153 @@
+from __future__ import print_function
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+import numpy as np
+import os
+import sys
+from .rappture import RapXML
+from .outputs import output_data
+
+"""
+Reading values from many run files at once.
+
+    cols = read_runs('runs/*.xml', ['input.number(temperature)',
+                                    'output.curve(f)'], workers=8)
+    cols['input.number(temperature)']   # float array, one per file
+    cols['output.curve(f)'][3]          # curve of the 4th file
+"""
+
+
+class ListColumn(object):
+    """
+    A column of arrays of different lengths, stored like an Arrow
+    list array: one array with all values and the offsets where each
+    row starts.  Row i is values[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, arrays):
+        lens = [len(a) for a in arrays]
+        self.offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        np.cumsum(lens, out=self.offsets[1:])
+        if arrays:
+            self.values = np.concatenate(arrays)
+        else:
+            self.values = np.empty(0)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+
+def run_files(files):
+    """
+    Returns a sorted list of files from a glob pattern or a
+    directory (all xml files in it).  Lists are returned unchanged.
+    """
+    if not isinstance(files, str):
+        return list(files)
+    if os.path.isdir(files):
+        files = os.path.join(files, '*.xml')
+    return sorted(glob(files))
+
+
+def _value(io, name):
+    # value for a path or label.  Curves are returned as Nx2
+    # arrays and histograms as an array of their heights.
+    if name.startswith('input') or name.startswith('output'):
+        path = name
+    else:
+        try:
+            path = io.info.input_path(name)
+        except ValueError:
+            path = io.info.output_path(name)
+    node = io[path]
+    if node is None:
+        return None
+    elem = node.elem
+    if elem.tag == 'curve':
+        return np.array(io.xy_data(elem.find('component/xy')))
+    if elem.tag == 'histogram':
+        return output_data(io, path, elem)['y']
+    return node.value
+
+
+def _read_one(args):
+    fname, select, lazy = args
+    try:
+        io = RapXML(fname, lazy=lazy)
+        return fname, [_value(io, name) for name in select], None
+    except Exception as e:
+        return fname, None, '%s: %s' % (type(e).__name__, e)
+
+
+def iter_runs(files, select, workers=None, chunksize=8, lazy=False, skip_errors=False):
+    """
+    Reads values from run files in parallel, yielding
+    (filename, list of values) in the order of the files.
+
+    :param files: A glob pattern, a directory or a list of files.
+    :param select: List of input or output paths or labels.
+    :param workers: Number of processes.  Default is the number of
+        CPUs.  1 reads the files in this process.
+    :param chunksize: Number of files sent to a process at a time.
+    :param lazy: Open the files with RapXML(lazy=True).
+    :param skip_errors: Leave out files that cannot be read, instead
+        of raising ValueError.
+    """
+    jobs = [(f, list(select), lazy) for f in run_files(files)]
+    if workers == 1:
+        results = map(_read_one, jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_read_one, jobs, chunksize=chunksize)
+    try:
+        for fname, vals, err in results:
+            if err is not None:
+                if not skip_errors:
+                    raise ValueError('%s: %s' % (fname, err))
+                print('Skipping %s: %s' % (fname, err), file=sys.stderr)
+                continue
+            yield fname, vals
+    finally:
+        if pool is not None:
+            try:
+                pool.shutdown(wait=False, cancel_futures=True)
+            except TypeError:
+                # python < 3.9
+                pool.shutdown(wait=False)
+
+
+def _column(vals):
+    arrays = [v for v in vals if isinstance(v, np.ndarray)]
+    if arrays:
+        empty = np.empty((0,) + arrays[0].shape[1:])
+        return ListColumn([empty if v is None else v for v in vals])
+    try:
+        return np.array(vals, dtype=float if None in vals else None)
+    except (TypeError, ValueError):
+        return np.array(vals, dtype=object)
+
+
+def read_runs(files, select, **kwargs):
+    """
+    Reads values from run files in parallel and returns them as
+    columns: an OrderedDict with 'file' and one entry per name in
+    select.  Scalars become NumPy arrays; curves and histograms
+    become ListColumns.  Takes the same arguments as iter_runs.
+    """
+    fnames = []
+    rows = []
+    for fname, vals in iter_runs(files, select, **kwargs):
+        fnames.append(fname)
+        rows.append(vals)
+    cols = OrderedDict()
+    cols['file'] = np.array(fnames, dtype=object)
+    for i, name in enumerate(select):
+        cols[name] = _column([r[i] for r in rows])
+    return cols
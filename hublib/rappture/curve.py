@@ -1,14 +1,11 @@
 from __future__ import print_function
 from lxml import etree as ET
 import numpy as np
-import pint
 from .. import ureg, Q_
 
-import matplotlib
-import matplotlib.pyplot as plt
-from IPython.display import display
 from .node import Node
 from .util import efind
+from . import deps
 
 
 class CInfo:
@@ -39,6 +36,7 @@ class Curve(Node):
         """
         Plot a rappture curve
         """
+        plt = deps.pyplot()
         plt.style.use('ggplot')
 
         if ax is None:
@@ -47,7 +45,7 @@ class Curve(Node):
 
         ci = CInfo(elem)
         xy_elem = elem.find('component/xy')
-        data = np.fromstring(xy_elem.text, sep=' \n').reshape(-1, 2)
+        data = self.xy_data(xy_elem)
         if ci.xscale == 'log':
             ax.set_xscale('log')
         if ci.yscale == 'log':
@@ -77,6 +75,7 @@ class Curve(Node):
         return glist
 
     def mplot(self, ax=None):
+        plt = deps.pyplot()
         plt.style.use('ggplot')
         elem = self.elem
 
@@ -92,7 +91,7 @@ class Curve(Node):
         for elem in glist:
             xy_elem = elem.find('component/xy')
             label = efind(elem, "about/label")
-            data = np.fromstring(xy_elem.text, sep=' \n').reshape(-1, 2)
+            data = self.xy_data(xy_elem)
             if ci.xscale == 'log':
                 ax.set_xscale('log')
             if ci.yscale == 'log':
@@ -0,0 +1,58 @@
+from __future__ import print_function
+import os
+
+"""
+Plotting and display libraries, imported on first use.
+
+Reading and writing Rappture XML only needs lxml, numpy and pint.
+Matplotlib, IPython, qgrid and nglview are loaded the first time
+something is plotted or displayed.
+
+In headless mode (HUBLIB_HEADLESS set in the environment, or
+set_headless()) they are never imported; plotting or displaying
+raises RuntimeError instead.  Use it for batch jobs to make sure
+nothing pulls them in.
+"""
+
+HEADLESS = bool(os.environ.get('HUBLIB_HEADLESS'))
+
+
+def set_headless(headless=True):
+    global HEADLESS
+    HEADLESS = headless
+
+
+def _check(what):
+    if HEADLESS:
+        raise RuntimeError('%s is not available in headless mode.' % what)
+
+
+def pyplot():
+    _check('Plotting')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def display(*objs, **kwargs):
+    _check('Display')
+    from IPython.display import display
+    display(*objs, **kwargs)
+
+
+def ipython_display():
+    # the IPython.display module
+    _check('Display')
+    import IPython.display
+    return IPython.display
+
+
+def qgrid():
+    _check('Grid display')
+    import qgrid
+    return qgrid
+
+
+def nglview():
+    _check('Structure display')
+    import nglview
+    return nglview
@@ -0,0 +1,42 @@
+from base64 import b64decode, b64encode
+import zlib
+
+"""
+Rappture's "@@RP-ENC" encodings for binary or compressed data
+stored in xml text.
+"""
+
+ZB64_HEADER = '@@RP-ENC:zb64\n'
+B64_HEADER = '@@RP-ENC:b64\n'
+
+
+def is_encoded(text):
+    return text.startswith('@@RP-ENC:')
+
+
+def decode(text):
+    """
+    Returns the bytes from text encoded with zb64 or b64.
+    Text without an encoding header is returned encoded as utf-8.
+    """
+    if text.startswith(ZB64_HEADER):
+        data = b64decode(text[len(ZB64_HEADER):])
+        # zlib or gzip header
+        return zlib.decompress(data, zlib.MAX_WBITS | 32)
+    if text.startswith(B64_HEADER):
+        return b64decode(text[len(B64_HEADER):])
+    return text.encode('utf-8')
+
+
+def encode(data, compress=True):
+    """
+    Returns text for bytes data, compressed with gzip and base64
+    encoded (zb64) or just base64 encoded (b64).
+    """
+    if compress:
+        z = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        data = z.compress(data) + z.flush()
+        header = ZB64_HEADER
+    else:
+        header = B64_HEADER
+    return header + b64encode(data).decode('ascii') + '\n'
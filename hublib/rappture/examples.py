@@ -0,0 +1,112 @@
+from __future__ import print_function
+from glob import glob, has_magic
+from lxml import etree as ET
+import os
+
+"""
+Index of the loader example files of a tool.
+
+Loaders list example files with glob patterns relative to
+rappture/examples.  Selecting an example by label, or showing the
+loader table, needs the label and description of every one of them.
+The index keeps the file list of each pattern until the directory
+mtime changes, and the label and description of each file until its
+mtime changes.  Only the <about> section of a file is parsed.
+"""
+
+# tool directory -> ExampleIndex
+_indexes = {}
+
+
+def example_index(dirname):
+    """
+    Returns the shared ExampleIndex for a tool directory.
+    """
+    try:
+        return _indexes[dirname]
+    except KeyError:
+        pass
+    index = _indexes[dirname] = ExampleIndex(dirname)
+    return index
+
+
+def read_about(fname):
+    """
+    Returns the label and description of an example file,
+    reading only up to the end of its top-level <about>.
+    Label is None if there is none.
+    """
+    for event, elem in ET.iterparse(fname, events=('end',), tag='about',
+                                    remove_comments=True):
+        par = elem.getparent()
+        if par is not None and par.getparent() is None:
+            return elem.findtext('label'), elem.findtext('description') or ''
+    return None, ''
+
+
+class ExampleIndex(object):
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        # pattern -> (directory mtime, files)
+        self._globs = {}
+        # file -> (mtime, label, description)
+        self._about = {}
+
+    def files(self, pattern):
+        """
+        Returns the example files matching a pattern from an
+        <example> element.
+        """
+        if self.dirname is None or not pattern:
+            return []
+        path = os.path.join(self.dirname, 'rappture', 'examples', pattern)
+        if has_magic(os.path.dirname(path)):
+            return glob(path)
+        try:
+            mtime = os.path.getmtime(os.path.dirname(path))
+        except OSError:
+            return []
+        try:
+            dmtime, files = self._globs[pattern]
+            if dmtime == mtime:
+                return files
+        except KeyError:
+            pass
+        files = glob(path)
+        self._globs[pattern] = (mtime, files)
+        return files
+
+    def about(self, fname):
+        """
+        Returns the label and description of an example file.
+        """
+        mtime = os.path.getmtime(fname)
+        try:
+            fmtime, label, desc = self._about[fname]
+            if fmtime == mtime:
+                return label, desc
+        except KeyError:
+            pass
+        label, desc = read_about(fname)
+        self._about[fname] = (mtime, label, desc)
+        return label, desc
+
+    def loader_files(self, loader):
+        """
+        Returns the example files of a loader element, in order.
+        """
+        files = []
+        for ex in loader.findall('example'):
+            files.extend(self.files(ex.text))
+        return files
+
+    def find(self, loader, label):
+        """
+        Returns the first example file of a loader element with
+        a label, or None.
+        """
+        for fname in self.loader_files(loader):
+            if self.about(fname)[0] == label:
+                return fname
+        return None
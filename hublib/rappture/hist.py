@@ -1,16 +1,13 @@
 from __future__ import print_function
 from lxml import etree as ET
 import numpy as np
-import pint
 from .. import ureg, Q_
 
-import matplotlib
-import matplotlib.pyplot as plt
-from IPython.display import display
 import shlex
 
 from .node import Node
 from .util import efind
+from . import deps
 
 
 class HInfo:
@@ -47,6 +44,7 @@ class Histogram(Node):
         """
         Plot a rappture histogram
         """
+        plt = deps.pyplot()
         plt.style.use('ggplot')
         elem = self.elem
 
@@ -59,9 +57,9 @@ class Histogram(Node):
 
         ci = HInfo(elem)
 
-        xy = efind(elem, 'component/xy')
+        xy = self.efind(elem, 'component/xy')
         if xy == "":
-            xhw = efind(elem, 'component/xhw')
+            xhw = self.efind(elem, 'component/xhw')
             xhw = shlex.split(xhw)
             labels = Histogram.format(xhw[::3])
             y_pos = [float(x) for x in xhw[1::3]]
@@ -109,6 +107,7 @@ class Histogram(Node):
         return glist
 
     def mplot(self, ax=None, horizontal=None, stacked=False):
+        plt = deps.pyplot()
         elem = self.elem
 
         if ax is None:
@@ -126,7 +125,7 @@ class Histogram(Node):
 
         for i, elem in enumerate(glist):
             label = efind(elem, "about/label")
-            xy = efind(elem, 'component/xy')
+            xy = self.efind(elem, 'component/xy')
             xy = shlex.split(xy)
             labels = Histogram.format(xy[::2])
             x_pos = np.arange(len(labels))
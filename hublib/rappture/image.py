@@ -1,7 +1,7 @@
 from base64 import b64decode, b64encode
-import zlib
-from IPython.display import display, Image
 from .node import Node
+from . import encoding
+from . import deps
 
 """
 Image display code for the Rappture Compatibility Library
@@ -13,16 +13,11 @@ class RapImage(Node):
     @property
     def value(self):
         val = self.get_text()
-        compressed_header = '@@RP-ENC:zb64\n'
-        hlen = len(compressed_header)
-        compressed = False
-        if val.startswith(compressed_header):
-            compressed = True
-            val = val[hlen:-1]
-        data = b64decode(val)
-        if compressed:
-            data = zlib.decompress(data, zlib.MAX_WBITS | 32)
-        return Image(data=data)
+        if encoding.is_encoded(val):
+            data = encoding.decode(val)
+        else:
+            data = b64decode(val)
+        return deps.ipython_display().Image(data=data)
 
     @value.setter
     def value(self, val):
@@ -1,17 +1,19 @@
 from __future__ import print_function
 from .. import ureg, Q_
-from io import BytesIO
 import numpy as np
+import shlex
 from .node import Node
 from .number import parse_rap_expr
 from .util import from_rap
-from .. import ui as ui
+from .xydata import format_xy
+from . import encoding
 
 
 class RapInt(Node):
 
     @property
     def w(self):
+        from .. import ui
         vals = from_rap(self)
         w = ui.Integer(
             name=vals['label'],
@@ -83,27 +85,42 @@ class XY(Node):
         except:
             ValueError("Could not find xy parents.")
 
-        val = self.elem.text
         if par.tag == 'curve':
-            # return a 2D numpy array
-            res = np.fromstring(val, sep=' \n').reshape(-1, 2)
-        else:
-            # return a list of (name, value) tuples
-            it = iter(shlex.split(val))
-            res = zip(it, it)
+            # return a 2D numpy array, a copy of the cached one
+            return self.xy_data(self.elem).copy()
+
+        val = self.text_of(self.elem)
+        if encoding.is_encoded(val):
+            val = encoding.decode(val).decode('utf-8')
+        # return a list of (name, value) tuples
+        it = iter(shlex.split(val))
+        res = zip(it, it)
         return res
 
     @value.setter
     def value(self, val):
+        self.set(val)
+
+    def set(self, val, compress=False):
+        """
+        Sets the data from a 2D array or a list or tuple of columns.
+        If compress is True, the text is zb64 encoded.
+        """
         if type(val) == np.ndarray:
-            s = BytesIO()
-            np.savetxt(s, val, fmt='%.6e %.6e', newline="\n")
-            res = s.getvalue()
+            res = format_xy(val, compress=compress)
         elif type(val) == list or type(val) == tuple:
-            val = '\n'.join([' '.join(map(repr, x)) for x in zip(*val)])
-            # we need the strings double quoted for tcl
-            res = val.replace("'", '"')
-        self.elem.text = res
+            cols = [np.asarray(c) for c in val]
+            if all(c.dtype.kind in 'iuf' for c in cols):
+                # integer columns are written as integers
+                fmts = ['%d' if c.dtype.kind in 'iu' else '%r' for c in cols]
+                res = format_xy(np.column_stack(cols), fmt=fmts, compress=compress)
+            else:
+                val = '\n'.join([' '.join(map(repr, x)) for x in zip(*val)])
+                # we need the strings double quoted for tcl
+                res = val.replace("'", '"')
+                if compress:
+                    res = encoding.encode(res.encode('utf-8'))
+        self.set_text_of(self.elem, res)
 
 
 class RapLog(Node):
@@ -0,0 +1,163 @@
+from __future__ import print_function
+from collections import deque
+from lxml import etree as ET
+import os
+import re
+import zlib
+
+"""
+Lazy loading of large Rappture run files.
+
+Run files can be hundreds of MB, almost all of it <xy> curve data
+and base64 images.  LazyTree streams the file with an lxml pull
+parser and builds the tree without those payloads.  For each one it
+records where the element starts in the file, so its text can be read
+back on first access.  Memory is bounded by the size of the metadata,
+plus the largest single payload while parsing.
+"""
+
+# elements whose text is deferred
+PAYLOAD_TAGS = ('xy', 'xhw', 'current')
+
+_TAG_RE = re.compile(br'<(xy|xhw|current)[\s/>]')
+
+
+def _is_payload(elem):
+    if elem.tag == 'current':
+        # only images keep big data in current
+        par = elem.getparent()
+        return par is not None and par.tag == 'image'
+    return True
+
+
+def _crc(text):
+    return zlib.crc32(text.encode('utf-8'))
+
+
+class LazyTree(object):
+    """
+    Parses fname, deferring the text of curve and histogram data
+    and images that are at least min_size characters long.
+    The default is LazyTree.MIN_SIZE.
+
+    tree -- the parsed tree
+    """
+
+    CHUNK = 1 << 16
+    MIN_SIZE = 4096
+
+    def __init__(self, fname, min_size=None):
+        if min_size is None:
+            min_size = LazyTree.MIN_SIZE
+        # payloads are read later, maybe from another directory
+        self.fname = os.path.abspath(fname)
+        # element -> (file offset, ordinal among its tag, crc of text)
+        self.deferred = {}
+        self.tree = self._parse(min_size)
+
+    def _parse(self, min_size):
+        parser = ET.XMLPullParser(events=('start', 'end'),
+                                  remove_comments=True,
+                                  huge_tree=True)
+        offsets = dict((t, deque()) for t in PAYLOAD_TAGS)
+        counts = dict((t, 0) for t in PAYLOAD_TAGS)
+        starts = {}
+        root = None
+        pos = 0       # file offset of buf[0]
+        last = -1     # offset of the last tag found
+        buf = b''
+        with open(self.fname, 'rb') as f:
+            while True:
+                chunk = f.read(self.CHUNK)
+                # find payload start tags before the parser sees them
+                buf = buf[-16:] + chunk
+                bpos = pos + len(chunk) - len(buf)
+                for m in _TAG_RE.finditer(buf):
+                    off = bpos + m.start()
+                    if off > last:
+                        offsets[m.group(1).decode()].append(off)
+                        last = off
+                pos += len(chunk)
+
+                if chunk:
+                    parser.feed(chunk)
+                else:
+                    root = parser.close()
+                for event, elem in parser.read_events():
+                    tag = elem.tag
+                    if tag not in counts:
+                        continue
+                    if event == 'start':
+                        off = offsets[tag].popleft() if offsets[tag] else -1
+                        starts[elem] = (off, counts[tag])
+                        counts[tag] += 1
+                        continue
+                    off, num = starts.pop(elem)
+                    text = elem.text
+                    if text is not None and len(text) >= min_size and _is_payload(elem):
+                        self.deferred[elem] = (off, num, _crc(text))
+                        elem.text = None
+                if not chunk:
+                    break
+        return ET.ElementTree(root)
+
+    def load(self, elem):
+        """
+        Reads the text of elem from the file, if it was deferred.
+        """
+        try:
+            off, num, crc = self.deferred.pop(elem)
+        except KeyError:
+            return
+        text = self._read_at(elem.tag, off, crc)
+        if text is None:
+            text = self._read_nth(elem.tag, num)
+        elem.text = text
+
+    def load_all(self, elem):
+        # load everything under elem
+        if not self.deferred:
+            return
+        for e in elem.iter(*PAYLOAD_TAGS):
+            self.load(e)
+
+    def forget(self, elem):
+        # elem was given new text
+        self.deferred.pop(elem, None)
+
+    def _read_at(self, tag, off, crc):
+        # Parse the element starting at off.  Returns None if it is
+        # not the one we expected, which can happen if a comment or
+        # CDATA section contains something that looks like a tag.
+        if off < 0:
+            return None
+        end = ('</%s>' % tag).encode()
+        data = bytearray()
+        with open(self.fname, 'rb') as f:
+            f.seek(off)
+            while True:
+                chunk = f.read(self.CHUNK)
+                if not chunk:
+                    return None
+                data.extend(chunk)
+                i = data.find(end, max(0, len(data) - len(chunk) - len(end)))
+                if i >= 0:
+                    data = data[:i + len(end)]
+                    break
+        try:
+            elem = ET.fromstring(bytes(data), ET.XMLParser(huge_tree=True))
+        except ET.XMLSyntaxError:
+            return None
+        if elem.tag != tag or _crc(elem.text or '') != crc:
+            return None
+        return elem.text
+
+    def _read_nth(self, tag, num):
+        # slow path: stream the file to the num'th element with tag
+        for n, (event, elem) in enumerate(ET.iterparse(self.fname, tag=tag,
+                                                       remove_comments=True,
+                                                       huge_tree=True)):
+            if n == num:
+                return elem.text
+            elem.clear()
+        return None
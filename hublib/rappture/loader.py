@@ -1,10 +1,13 @@
 from __future__ import print_function
 from lxml import etree as ET
+from collections import OrderedDict
 from copy import deepcopy
 import re
 import os
-import glob
 from .node import Node
+from .examples import example_index
+
+_units_re = re.compile(r"^[\s]*([0-9.]*)([\S]*)")
 
 
 class RapLoader(Node):
@@ -17,20 +20,13 @@ class RapLoader(Node):
     def value(self, fname):
         flabel = fname 
         if not os.path.isfile(fname):
-            fname = None
             # if fname is a label, search loader files for the one with that label
-            for ex in self.elem.findall('example'):
-                path = os.path.join(self.top.dirname, "rappture", "examples", ex.text)
-                for file in glob.glob(path):
-                    new_tree = ET.parse(file)
-                    label = new_tree.find('about/label').text
-                    if label == flabel:
-                        fname = file
-                        break
-        
+            fname = example_index(self.top.dirname).find(self.elem, flabel)
+
         if fname is None:
             raise ValueError('"No loader file with label "%s"' % flabel)
         RapLoader.load(self.tree, self.elem, self.child, fname)
+        self.top.pindex.invalidate()
 
         # reparse everything
         self.top.reload()
@@ -41,48 +37,50 @@ class RapLoader(Node):
         # print("copy_defaults", tree)
         # Set <current> values from their <default>.  If units are required,
         # be sure to set them. Do some horrible hack to set choices.
-        parse = re.compile(r"^[\s]*([0-9.]*)([\S]*)")
-
+        options = {}
         for default in tree.findall(".//default"):
-            par = default.find("..")
+            par = default.getparent()
             current = par.find("current")
             if current is None:
                 current = ET.SubElement(par, 'current')
                 for elem in default:
                     current.append(deepcopy(elem))
+            if par.tag == 'loader':
+                continue
+            if current.text is not None and reset is False:
+                continue
 
-        for default in tree.findall(".//default"):
-            par = default.find("..")
             newtext = None
             if par.tag == 'choice':
-                # now search for options
-                for elem in par:
-                    if elem.tag != 'option':
-                        continue
-                    label = elem.find('about/label').text.strip()
-                    val = elem.find('value')
-                    if val is not None:
-                        val = val.text.strip()
-                    if default.text == label or default.text == val:
-                        newtext = val
-                        break
-            if par.tag == 'loader':
-                continue
-            current = par.find("current")
-            if current is None:
-                current = ET.SubElement(par, 'current')
-            elif current.text is not None and reset is False:
-                continue 
+                try:
+                    omap = options[par]
+                except KeyError:
+                    omap = options[par] = RapLoader._option_map(par)
+                newtext = omap.get(default.text)
             if newtext is None:
                 newtext = default.text
             units = par.find("units")
-            if units is not None and units.text is not None and units.text != "":
-                v, u = parse.findall(newtext)[0]
-                if u == "":
+            if units is not None and units.text and newtext is not None:
+                if _units_re.match(newtext).group(2) == "":
                     # default did not have units set. Add them to current
                     newtext += units.text
             current.text = newtext
 
+    @staticmethod
+    def _option_map(choice):
+        # option label or value -> value.  The first option wins.
+        omap = {}
+        for opt in choice.iterchildren('option'):
+            val = opt.findtext('value')
+            if val is not None:
+                val = val.strip()
+            label = opt.findtext('about/label')
+            if label is not None:
+                omap.setdefault(label.strip(), val)
+            if val is not None:
+                omap.setdefault(val, val)
+        return omap
+
     @staticmethod
     def load(tree, elem, current, fname):
         # print("RapLoad", elem, current.text, fname)
@@ -92,51 +90,68 @@ class RapLoader(Node):
         start = new_tree.find('input')
         context = ET.iterwalk(start, events=("start", "end"))
 
+        # Loaders are not well-documented. Basically we copy
+        # all the parts of the example xml file that contain "current"
+        # elements into the original tree.
+        #
+        # plist holds [element, matching element in the original
+        # tree or None if not looked up yet] from 'input' down to
+        # the parent of the current element.
         plist = []
+        children = {}
+        touched = OrderedDict()
         root = tree.getroot()
 
-        # find "current" elements in the new tree.
-        # Find parent element and update the original.
-
         for action, element in context:
             if action == 'start':
-                x = element.tag
-                if element.attrib:
-                    x += "[@id='%s']" % element.attrib['id']
                 if element.tag == 'current':
-                    RapLoader.create_element(root, element, plist)
-                plist.append((x, element))
+                    par = RapLoader._find_parent(root, plist, children)
+                    if par is not None:
+                        old = par.find('current')
+                        if old is not None:
+                            par.remove(old)
+                        par.append(deepcopy(element))
+                        children.pop(par, None)
+                        touched[par] = None
+                plist.append([element, None])
             else:
                 plist.pop()
 
+        # loader might have set defaults without setting current?
+        for par in touched:
+            RapLoader.copy_defaults(par)
 
-    # Loaders are not well-documented. Basically we copy
-    # all the parts of the example xml file that contain "current"
-    # elements into the original tree.
+    @staticmethod
+    def _child_map(elem):
+        # (tag, id) -> first child with them. (tag, None) -> first child with tag.
+        cmap = {}
+        for child in elem:
+            cmap.setdefault((child.tag, None), child)
+            cid = child.get('id')
+            if cid is not None:
+                cmap.setdefault((child.tag, cid), child)
+        return cmap
 
     @staticmethod
-    def create_element(root, new_elem, plist):
+    def _find_parent(root, plist, children):
+        # Returns the element in the original tree matching the
+        # path in plist.  If part of the path is missing, copies it
+        # from the new tree and returns None.
         elem = root
-        for p, pelem in plist:
-            child = elem.find(p)
-            if child is None:
-                elem.append(deepcopy(pelem))
-                return
-            elem = child
-
-        current = elem.find('current')
-        if current is not None:
-            elem.remove(current)
-        elem.append(deepcopy(new_elem))
-
-        # loader might have set defaults without setting current?
-        RapLoader.copy_defaults(elem)
-
-        # probably don't need this
-        # current = elem.find('current')
-        # v, u = parse.findall(current.text)[0]
-        # if u == '':
-        #     # no units. Should it have them?
-        #     units = elem.find('units')
-        #     if units is not None and units.text is not None and units.text != "":
-        #         current.text += units.text
+        for ent in plist:
+            if ent[1] is None:
+                pelem = ent[0]
+                key = (pelem.tag, pelem.get('id'))
+                try:
+                    cmap = children[elem]
+                except KeyError:
+                    cmap = children[elem] = RapLoader._child_map(elem)
+                ent[1] = cmap.get(key)
+                if ent[1] is None:
+                    ent[1] = deepcopy(pelem)
+                    elem.append(ent[1])
+                    cmap.setdefault((pelem.tag, None), ent[1])
+                    cmap[key] = ent[1]
+                    return None
+            elem = ent[1]
+        return elem
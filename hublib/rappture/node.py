@@ -1,15 +1,10 @@
 from __future__ import print_function
 from lxml import etree as ET
 import numpy as np
-from bs4 import BeautifulSoup
-
-
-import pint
 from .. import ureg, Q_
 from base64 import b64decode, b64encode
 import zlib
-import imghdr
-from IPython.display import HTML
+from .xydata import parse_xy
 
 
 """
@@ -72,7 +67,7 @@ def _to_xpath(path):
     return '/'.join(xpath)
 
 
-def _create_path(root, path):
+def _create_path(root, path, index=None):
     for a in path.split('.'):
         # print('root=', root)
         par = a.find('(')
@@ -94,11 +89,92 @@ def _create_path(root, path):
             else:
                 # print("Creating %s.%s(%s)" %(root, elem, id))
                 root = ET.SubElement(root, elem, attrib={'id': id})
+            if index is not None:
+                index.add(root)
         else:
             root = nt
     return root
 
 
+# the path components an element can be found by
+def _path_comps(elem):
+    id = elem.get('id')
+    if id is None:
+        return [elem.tag]
+    return [elem.tag, '%s(%s)' % (elem.tag, id)]
+
+
+class PathIndex(object):
+    """
+    Maps rappture paths to elements for one document.
+
+    Every rappture path is indexed, with or without ids, so looking
+    up a path returns the same element tree.find(_to_xpath(path)) does
+    without walking the tree.  Paths containing raw xpath are passed
+    on to find().
+
+    The index is built on first use.  New elements created by
+    _create_path are added to it.  Anything else that changes the
+    structure of the tree must call invalidate().
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.index = None
+
+    def invalidate(self):
+        self.index = None
+
+    def build(self):
+        index = {}
+        # (element, paths to element), in document order
+        stack = [(self.tree.getroot(), [''])]
+        while stack:
+            elem, paths = stack.pop()
+            children = []
+            for child in elem:
+                if callable(child.tag):
+                    # comment or processing instruction
+                    continue
+                cpaths = []
+                for p in paths:
+                    for c in _path_comps(child):
+                        cpaths.append(p + '.' + c if p else c)
+                children.append((child, cpaths))
+            # first match in document order wins, like find()
+            for child, cpaths in children:
+                for p in cpaths:
+                    index.setdefault(p, child)
+            stack.extend(reversed(children))
+        self.index = index
+
+    def find(self, path):
+        if '/' in path or '[' in path or '*' in path:
+            # contains raw xpath, like 'about/label'
+            return self.tree.find(_to_xpath(path))
+        if self.index is None:
+            self.build()
+        return self.index.get(path)
+
+    def add(self, elem):
+        # elem was just appended to the tree
+        if self.index is None:
+            return
+        chain = []
+        while elem.getparent() is not None:
+            chain.append(elem)
+            elem = elem.getparent()
+        paths = ['']
+        for e in reversed(chain):
+            paths = [p + '.' + c if p else c for p in paths for c in _path_comps(e)]
+        for p in paths:
+            if p in self.index:
+                # another element matches too. Let find() pick.
+                self.index[p] = self.tree.find(_to_xpath(p))
+            else:
+                self.index[p] = chain[0]
+
+
 class Node(object):
     def __init__(self, top, tree, path, elem=None, child=None):
         self.top = top
@@ -117,11 +193,9 @@ class Node(object):
 
         # print("create", path)
         # find the xml element from a node path
-        xpath = _to_xpath(path)
-        if create:
-            x = _create_path(self.tree.getroot(), path)
-        else:
-            x = self.tree.find(xpath)
+        x = self._find(path)
+        if x is None and create:
+            x = _create_path(self.tree.getroot(), path, self._index())
 
         if x is None:
             return None
@@ -157,13 +231,25 @@ class Node(object):
             return RapLoader(self.top, self.tree, path, x, child)
         return Node(self.top, self.tree, path, x, child)
 
+    # The path index of the document, if this node is still part of it.
+    def _index(self):
+        if self.tree is self.top.tree:
+            return self.top.pindex
+        return None
+
+    def _find(self, path):
+        index = self._index()
+        if index is None:
+            return self.tree.find(_to_xpath(path))
+        return index.find(path)
+
     def __setitem__(self, path, val):
         # print("SETITEM ", self.tree, self.path, path, val)
         n = self.create(path, create=True)
         if n is None:
             return False
         n.value = val
-        self.top.reload()
+        self.top.update(n.elem)
         return True
 
     def __getitem__(self, path):
@@ -183,18 +269,50 @@ class Node(object):
                 s.append(child.tail)
         return ''.join(s).strip()
 
+    # Text of any element in the document.  Lazy documents read
+    # curve data and images from the file the first time.
+    def text_of(self, elem):
+        if self.top.lazy is not None:
+            self.top.lazy.load(elem)
+        return elem.text
+
+    def set_text_of(self, elem, val):
+        if self.top.lazy is not None:
+            self.top.lazy.forget(elem)
+        self.top.xycache.pop(elem, None)
+        elem.text = val
+
+    # Curve data of an <xy> element as a read-only array.
+    # The text is parsed once and cached until it is set again.
+    def xy_data(self, elem):
+        try:
+            return self.top.xycache[elem]
+        except KeyError:
+            pass
+        data = parse_xy(self.text_of(elem))
+        data.flags.writeable = False
+        self.top.xycache[elem] = data
+        return data
+
+    # like util.efind, for elements that might not be loaded yet
+    def efind(self, elem, path):
+        e = elem.find(path)
+        if e is None:
+            return ""
+        return self.text_of(e)
+
     # get text from a Node or its child(current or default) if present
     def get_text(self):
         if self.child is not None:
-            return self.child.text
-        return self.elem.text
+            return self.text_of(self.child)
+        return self.text_of(self.elem)
 
     # set text in a Node or its child(current or default) if present
     def set_text(self, val):
         if self.child is not None:
-            self.child.text = val
+            self.set_text_of(self.child, val)
         else:
-            self.elem.text = val
+            self.set_text_of(self.elem, val)
 
     @property
     def value(self):
@@ -231,8 +349,9 @@ class Node(object):
         if self.path == '':
             elem = self.tree.getroot()
         else:
-            xpath = _to_xpath(self.path)
-            elem = self.tree.find(xpath)
+            elem = self._find(self.path)
+        if self.top.lazy is not None:
+            self.top.lazy.load_all(elem)
         xml = ET.tostring(elem, pretty_print=pretty)
         if header is True:
             xml = b'<?xml version="1.0"?>\n' + xml
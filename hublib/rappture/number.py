@@ -1,9 +1,82 @@
 from __future__ import print_function
+from collections import OrderedDict
+import re
+import numpy as np
 from .. import ureg, Q_
 from .node import Node
-from .. import ui as ui
 from .util import from_rap
 
+# Rappture units string -> (pint units or None, magnitude if it is 1
+# or 1.0 or else None).  Least recently used entries are dropped once
+# there are UNITS_CACHE_SIZE of them.
+_units_cache = OrderedDict()
+UNITS_CACHE_SIZE = 256
+
+# (from units, to units) -> (factor, offset), or None if the
+# conversion is not linear
+_conv_cache = OrderedDict()
+
+# a number, optionally followed by units
+_num_re = re.compile(r'\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*(.*?)\s*$')
+_int_re = re.compile(r'[+-]?\d+$')
+
+
+def _cached(cache, key, func):
+    # look up key in an LRU cache, calling func(key) if missing
+    try:
+        res = cache.pop(key)
+    except KeyError:
+        res = func(key)
+        if len(cache) >= UNITS_CACHE_SIZE:
+            cache.popitem(last=False)
+    cache[key] = res
+    return res
+
+
+def _parse_units(text):
+    try:
+        q = ureg.parse_expression(text)
+        return q.units, q.magnitude if q.magnitude == 1 else None
+    except:
+        return None, None
+
+
+def _lookup_units(text):
+    return _cached(_units_cache, text, _parse_units)
+
+
+def rap_units(units):
+    """
+    Returns the pint units for a Rappture units string,
+    or None if pint cannot parse it.  C is Celsius.
+    """
+    if units == 'C':
+        return ureg.degC
+    return _lookup_units(units)[0]
+
+
+def fast_magnitude(units, val):
+    """
+    Returns the number in val if no conversion is needed to get
+    it in units, which is when val is a number followed by units
+    or by nothing.  Otherwise returns None.
+    """
+    if val is None:
+        return None
+    m = _num_re.match(val)
+    if m is None:
+        return None
+    num, vunits = m.groups()
+    if vunits and vunits != units.strip():
+        return None
+    pint_units, one = _lookup_units(units)
+    if pint_units is None or one is None:
+        return None
+    # multiply by one so the type is what pint would return
+    if _int_re.match(num):
+        return int(num) * one
+    return float(num) * one
+
 
 def parse_rap_expr(units, val):
     # units and val are strings from rappture
@@ -13,13 +86,9 @@ def parse_rap_expr(units, val):
         return val
 
     # Rappture compatibility. C is Celsius, not Coulombs
-    if units == 'C':
-        units = ureg.degC
-    else:
-        try:
-            units = ureg.parse_expression(units).units
-        except:
-            pass
+    pint_units = rap_units(units)
+    if pint_units is not None:
+        units = pint_units
 
     # Another Rappture compatibility hack
     if type(units) == str and units.startswith('/'):
@@ -30,22 +99,104 @@ def parse_rap_expr(units, val):
             return val
     try:
         val = ureg.parse_expression(val)
-        if hasattr(val, 'units'):
+        if hasattr(val, 'units') and not val.unitless:
             if val.units == ureg.coulomb and (units == ureg.K or units == ureg.degC):
                 # C -> Celsius
                 val = Q_(val.magnitude, ureg.degC)
             val = val.to(units)
         else:
-            val = Q_(val, units)
+            val = Q_(getattr(val, 'magnitude', val), units)
         return val
     except:
         raise ValueError("Bad input value.")
 
 
+def _conversion(pair):
+    from_units, to_units = pair
+    fu = rap_units(from_units)
+    tu = rap_units(to_units)
+    if fu is None or tu is None:
+        raise ValueError("Bad units.")
+    # works for offset units like degC too
+    x = Q_(np.array([0.0, 1.0, 2.0]), fu).to(tu).magnitude
+    offset = x[0]
+    factor = x[1] - x[0]
+    if not np.isclose(x[2], offset + 2 * factor):
+        # logarithmic units
+        return None
+    return factor, offset
+
+
+def convert(values, from_units, to_units):
+    """
+    Converts an array of values between two Rappture units
+    strings.  The factor and offset for each pair of units are
+    computed once and cached.
+
+    :param values: A number or array-like.
+    :param from_units: Units of values, like 'K' or 'C' (Celsius).
+    :param to_units: Units to convert to.
+    :returns: A float NumPy array.
+    """
+    values = np.asarray(values, dtype=float)
+    if from_units == to_units:
+        return values.copy()
+    conv = _cached(_conv_cache, (from_units, to_units), _conversion)
+    if conv is None:
+        return Q_(values, rap_units(from_units)).to(rap_units(to_units)).magnitude
+    factor, offset = conv
+    res = values * factor
+    if offset:
+        res += offset
+    return res
+
+
+def parse_rap_values(units, vals):
+    """
+    Like parse_rap_expr for many values.  Returns a float NumPy
+    array of the values in units.  Values like '300K' or '25C' are
+    converted with one vectorized convert() per distinct units.
+
+    :param units: Rappture units string, or '' or None.
+    :param vals: List of Rappture value strings.
+    """
+    res = np.empty(len(vals))
+    # value units -> indices
+    groups = OrderedDict()
+    for i, val in enumerate(vals):
+        m = _num_re.match(val) if val is not None else None
+        if m is None:
+            groups.setdefault(None, []).append(i)
+            continue
+        res[i] = float(m.group(1))
+        vunits = m.group(2)
+        if vunits and not units:
+            groups.setdefault(None, []).append(i)
+        elif vunits and vunits != units.strip():
+            if vunits == 'C' and rap_units(units) not in (ureg.K, ureg.degC):
+                # Coulombs, unless converting to a temperature
+                groups.setdefault(None, []).append(i)
+                continue
+            groups.setdefault(vunits, []).append(i)
+
+    for vunits, ind in groups.items():
+        if vunits is None:
+            for i in ind:
+                val = parse_rap_expr(units, vals[i])
+                res[i] = float(getattr(val, 'magnitude', val))
+            continue
+        try:
+            res[ind] = convert(res[ind], vunits, units.strip())
+        except Exception:
+            raise ValueError("Bad input value.")
+    return res
+
+
 class Number(Node):
 
     @property
     def w(self):
+        from .. import ui
         vals = from_rap(self)
         w = ui.Number(
             name=vals['label'],
@@ -65,10 +216,19 @@ class Number(Node):
         if units:
             if u is None or u.text == '':
                 return ''
-            return ureg.parse_expression(u.text).units
+            pint_units = _lookup_units(u.text)[0]
+            if pint_units is None:
+                # raise pint's error
+                pint_units = ureg.parse_expression(u.text).units
+            return pint_units
         if u is None or u == '' or (type(u) == str and u.startswith('/')):
             return float(val)
 
+        if magnitude and u.text:
+            num = fast_magnitude(u.text, val)
+            if num is not None:
+                return num
+
         val = parse_rap_expr(u.text, val)
         if type(val) == str:
             return float(val)
@@ -88,7 +248,11 @@ class Number(Node):
 
         vunits = ''
         if hasattr(val, 'units'):
-            vunits = val.units
+            if val.unitless:
+                # a dimensionless Quantity is just its number
+                val = val.magnitude
+            else:
+                vunits = val.units
 
         if vunits == '':
             # Not PINT, so just set to string value
@@ -103,13 +267,13 @@ class Number(Node):
         # Rappture wants units and we have them
 
         # convert Rappture units to PINT units
-        if uelem.text == 'C':
-            units = ureg.degC
-        else:
+        units = rap_units(uelem.text)
+        if units is None:
             units = ureg.parse_expression(uelem.text).units
 
         # let PINT do the conversion
-        val = val.to(units)
+        if val.units != units:
+            val = val.to(units)
 
         # a Rappture-friendly string
         self.set_text('%s %s' % (val.magnitude, uelem.text))
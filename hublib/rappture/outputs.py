@@ -0,0 +1,137 @@
+from __future__ import print_function
+from collections import OrderedDict
+import shlex
+import numpy as np
+from .util import INFO_TAGS
+from .curve import CInfo
+from .hist import HInfo
+from .number import Number
+from .node import _path_comps
+from . import encoding
+
+"""
+Bulk extraction of output data.
+"""
+
+
+def _walk(elem, path):
+    # yield (path, element) for each output, like RapXMLInfo.parse_elem
+    for child in elem:
+        if callable(child.tag):
+            continue
+        # the path Node finds the element by, tag(id) if it has an id
+        cpath = '%s.%s' % (path, _path_comps(child)[-1])
+        if child.tag in INFO_TAGS:
+            yield cpath, child
+            continue
+        for res in _walk(child, cpath):
+            yield res
+
+
+def _column(vals):
+    # numbers if possible, otherwise strings
+    try:
+        return np.array(vals, dtype=float)
+    except ValueError:
+        return np.array(vals, dtype=object)
+
+
+def _curve(top, elem):
+    info = CInfo(elem)
+    xy = elem.find('component/xy')
+    if xy is None:
+        data = np.empty((0, 2))
+    else:
+        data = top.xy_data(xy)
+    return dict(x=data[:, 0], y=data[:, 1], xunits=info.xunits, yunits=info.yunits)
+
+
+def _histogram(top, elem):
+    info = HInfo(elem)
+    res = dict(xunits=info.xunits, yunits=info.yunits)
+    text = top.efind(elem, 'component/xy')
+    ncols = 2
+    if not text:
+        text = top.efind(elem, 'component/xhw')
+        ncols = 3
+    if text and encoding.is_encoded(text):
+        text = encoding.decode(text).decode('utf-8')
+    vals = shlex.split(text or '')
+    res['x'] = _column(vals[::ncols])
+    res['y'] = np.array(vals[1::ncols], dtype=float)
+    if ncols == 3:
+        res['width'] = np.array(vals[2::ncols], dtype=float)
+    return res
+
+
+def _number(top, path, elem):
+    units = top.efind(elem, 'units') or ''
+    current = elem.find('current')
+    text = None if current is None else top.text_of(current)
+    if text is None:
+        return dict(value=np.nan, units=units)
+    if elem.tag == 'integer':
+        return dict(value=int(text), units=units)
+    return dict(value=Number(top, top.tree, path, elem, current).value, units=units)
+
+
+def output_data(top, path, elem):
+    """
+    Returns the data dict (as in to_arrays) for one output element,
+    or None if it is not a curve, histogram, number or integer.
+    """
+    if elem.tag == 'curve':
+        data = _curve(top, elem)
+    elif elem.tag == 'histogram':
+        data = _histogram(top, elem)
+    elif elem.tag in ('number', 'integer'):
+        data = _number(top, path, elem)
+    else:
+        return None
+    data['type'] = elem.tag
+    data['label'] = top.efind(elem, 'about/label') or ''
+    data['group'] = top.efind(elem, 'about/group') or ''
+    return data
+
+
+def to_arrays(top):
+    res = OrderedDict()
+    outputs = top.tree.find('output')
+    if outputs is None:
+        return res
+    for path, elem in _walk(outputs, 'output'):
+        data = output_data(top, path, elem)
+        if data is not None:
+            res[path] = data
+    return res
+
+
+def to_frame(top):
+    import pandas as pd
+    cols = OrderedDict((c, []) for c in ['Path', 'Label', 'Group', 'Type',
+                                         'X', 'Y', 'XUnits', 'YUnits'])
+    for path, data in to_arrays(top).items():
+        if 'value' in data:
+            x = np.array([np.nan])
+            y = np.array([data['value']])
+            xunits, yunits = '', data['units']
+        else:
+            x, y = data['x'], data['y']
+            xunits, yunits = data['xunits'], data['yunits']
+        n = len(y)
+        cols['Path'].append(np.repeat(path, n))
+        cols['Label'].append(np.repeat(data['label'], n))
+        cols['Group'].append(np.repeat(data['group'], n))
+        cols['Type'].append(np.repeat(data['type'], n))
+        cols['X'].append(x)
+        cols['Y'].append(y)
+        cols['XUnits'].append(np.repeat(xunits, n))
+        cols['YUnits'].append(np.repeat(yunits, n))
+    if not cols['Path']:
+        return pd.DataFrame(columns=list(cols))
+    for c in cols:
+        vals = cols[c]
+        if c == 'X' and any(v.dtype == object for v in vals):
+            vals = [v.astype(object) for v in vals]
+        cols[c] = np.concatenate(vals)
+    return pd.DataFrame(cols)
@@ -10,15 +10,17 @@
 # ======================================================================
 from __future__ import print_function
 import os
-import pandas as pd
-import qgrid
-from IPython.display import Markdown
-from .node import Node
+from collections import OrderedDict
+from contextlib import contextmanager
+from .node import Node, PathIndex
 from lxml import etree as ET
-from glob import glob
 from .loader import RapLoader
-#qgrid.enable()
-
+from .util import INFO_TAGS
+from . import outputs
+from .lazy import LazyTree
+from . import toolcache
+from .examples import example_index
+from . import deps
 
 def get_elem_info(elem):
     try:
@@ -47,28 +49,107 @@ def get_elem_info(elem):
 
 
 class RapXML(Node):
+    """
+    Reads and writes a Rappture XML file.
+
+    :param fname: The xml file.
+    :param lazy: Read curve data and images from the file only when
+        they are used.  Use this for very large run files.
+    :param cache: For tools, reuse the prepared tool.xml saved
+        on disk by an earlier session.  See toolcache.
+    """
 
-    def __init__(self, fname):
+    def __init__(self, fname, lazy=False, cache=True):
         self.fname = fname
-        parser = ET.XMLParser(remove_comments=True)
-        self.tree = ET.parse(fname, parser)
+        self._batch = 0
+        self._pending = None
         self.path = ''
+        self.top = self
         if hasattr(self, 'dirname'):
             # only Tools have dirname
-            RapLoader.copy_defaults(self.tree, reset=True)
-            self._load_loaders()
-        else:
-            try:
-                self.dirname = self.tree.find('tool/version/application/directory[@id]').text
-                self.dirname = os.path.split(self.dirname)[0]
-            except:
-                self.dirname = None
-        self.top = self
+            self._load_tool(fname, cache and toolcache.enabled())
+            return
+        self._load(fname, lazy, ET.XMLParser(remove_comments=True))
+        try:
+            self.dirname = self.tree.find('tool/version/application/directory[@id]').text
+            self.dirname = os.path.split(self.dirname)[0]
+        except:
+            self.dirname = None
         self.info = RapXMLInfo(self)
-        
+
+    def _load_tool(self, fname, cache):
+        # parse tool.xml, copy defaults and apply the default loaders,
+        # or read all that back from the cache
+        parser = ET.XMLParser(remove_comments=True)
+        with open(fname, 'rb') as f:
+            data = f.read()
+        key = toolcache.tool_key(data, self.dirname) if cache else None
+        state = toolcache.load(key) if cache else None
+        if state is not None:
+            self._set_tree(ET.ElementTree(ET.fromstring(state['xml'], parser)))
+            self.info = RapXMLInfo.from_state(self, state['info'])
+            return
+        self._set_tree(ET.ElementTree(ET.fromstring(data, parser)))
+        RapLoader.copy_defaults(self.tree, reset=True)
+        self._load_loaders()
+        self.info = RapXMLInfo(self)
+        if cache:
+            toolcache.save(key, dict(xml=ET.tostring(self.tree),
+                                     info=self.info.get_state()))
+
+    def _load(self, fname, lazy=False, parser=None):
+        # read a new document and reset everything kept for the old one
+        if lazy:
+            self.lazy = LazyTree(fname)
+            self._set_tree(self.lazy.tree, self.lazy)
+        else:
+            self._set_tree(ET.parse(fname, parser))
+
+    def _set_tree(self, tree, lazy=None):
+        self.tree = tree
+        self.lazy = lazy
+        self.pindex = PathIndex(self.tree)
+        self.xycache = {}
+
     def reload(self):
+        if self._batch:
+            self._pending = True
+            return
         self.info = RapXMLInfo(self)
 
+    def update(self, elem):
+        # the value of elem was set
+        if self._batch:
+            if self._pending is not True:
+                self._pending[elem] = None
+            return
+        self.info.update(elem)
+
+    @contextmanager
+    def batch(self):
+        """
+        Defers updating the input and output tables until the
+        block exits.
+
+        with tool.batch():
+            for label, val in params:
+                tool.set_input(label, val)
+        """
+        if self._batch == 0:
+            self._pending = OrderedDict()
+        self._batch += 1
+        try:
+            yield self
+        finally:
+            self._batch -= 1
+            if self._batch == 0:
+                pending, self._pending = self._pending, None
+                if pending is True:
+                    self.reload()
+                else:
+                    for elem in pending:
+                        self.info.update(elem)
+
     def _load_loaders(self):
         # now load all the default loaders
         for loader in self.tree.findall("input//loader"):
@@ -78,97 +159,100 @@ class RapXML(Node):
             if current is None:
                 current = ET.SubElement(loader, 'current')
 
-            for ex in loader.findall('example'):
-                path = os.path.join(self.dirname, "rappture", "examples", ex.text)
-                # print("path=", path)
-                for file in glob(path):
-                    if os.path.basename(file) == default.text:
-                        RapLoader.load(self.tree, loader, current, file)
-                        break
+            for file in example_index(self.dirname).loader_files(loader):
+                if os.path.basename(file) == default.text:
+                    RapLoader.load(self.tree, loader, current, file)
+                    break
+        self.pindex.invalidate()
     
     def set_input(self, label, val):
-        match = self.info.in_df[self.info.in_df['Label'] == label].index.tolist()
-        if len(match) == 0:
-            # maybe a loader?
-            match = self.info.loader_df[self.info.loader_df['Label'] == label].index.tolist()
-            if len(match) > 0:
-                match = [match[0]]
-        if len(match) == 0:
-            raise ValueError("No matches with that label.")
-        if len(match) > 1:
-            raise ValueError("Error: %d labels match." % len(match))
-        self[match[0]] = val
+        self[self.info.input_path(label)] = val
 
     def get_input(self, label):
-        match = self.info.in_df[self.info.in_df['Label'] == label].index.tolist()
-        if len(match) == 0:
-            # maybe a loader?
-            match = self.info.loader_df[self.info.loader_df['Label'] == label].index.tolist()
-            if len(match) > 0:
-                match = [match[0]]
-        if len(match) == 0:            
-            raise ValueError("No matches with that label.")
-        if len(match) > 1:
-            raise ValueError("Error: %d labels match." % len(match))
-        return self[match[0]]
+        return self[self.info.input_path(label)]
 
     def set_output(self, label, val):
-        match = self.info.out_df[self.info.out_df['Label'] == label].index.tolist()
-        if len(match) == 0:
-            raise ValueError("No matches with that label.")
-        if len(match) > 1:
-            raise ValueError("Error: %d labels match." % len(match))
-        self[match[0]] = val
+        self[self.info.output_path(label)] = val
 
     def get_output(self, label):
-        match = self.info.out_df[self.info.out_df['Label'] == label].index.tolist()
-        if len(match) == 0:            
-            raise ValueError("No matches with that label.")
-        if len(match) > 1:
-            raise ValueError("Error: %d labels match." % len(match))
-        return self[match[0]]
+        return self[self.info.output_path(label)]
 
     def create_input_widget(self, label):
-        match = self.info.in_df[self.info.in_df['Label'] == label].index.tolist()
-        if len(match) == 0:
-            raise ValueError("No matches with that label.")
-        if len(match) > 1:
-            raise ValueError("Error: %d labels match." % len(match))
-        return self[match[0]].w
+        return self[self.info.input_path(label, loaders=False)].w
+
+    def outputs_to_arrays(self):
+        """
+        Returns the data of all curves, histograms, numbers and
+        integers in the outputs, reading the output tree once.
 
+        The result is an OrderedDict of path -> dict with keys 'type',
+        'label' and 'group'.  Curves and histograms also have 'x',
+        'y', 'xunits' and 'yunits'; histograms with widths have 'width'.
+        Numbers and integers have 'value' and 'units'.
+        """
+        return outputs.to_arrays(self)
+
+    def to_frame(self):
+        """
+        Returns the outputs as a tidy DataFrame with one row per data
+        point and columns Path, Label, Group, Type, X, Y, XUnits and
+        YUnits.  Numbers and integers have one row with the value in
+        Y, the units in YUnits and no X.
+        """
+        return outputs.to_frame(self)
+
+    def _show_table(self, df, title=None):
+        grid = deps.qgrid().show_grid(df, grid_options={'editable': False})
+        if title is None:
+            deps.display(grid)
+        else:
+            deps.display(deps.ipython_display().Markdown(title), grid)
 
     def _ipython_display_(self):
         if self.info.in_df.size:
-            display(Markdown('## INPUTS'), qgrid.show_grid(self.info.in_df, grid_options={'editable': False}))
+            self._show_table(self.info.in_df, '## INPUTS')
         if self.info.loader_df.size:
-            display(Markdown('## LOADERS'), qgrid.show_grid(self.info.loader_df, grid_options={'editable': False}))
+            self._show_table(self.info.loader_df, '## LOADERS')
         if self.info.out_df.size:
-            display(Markdown('## OUTPUTS'), qgrid.show_grid(self.info.out_df, grid_options={'editable': False}))
+            self._show_table(self.info.out_df, '## OUTPUTS')
 
     @property
     def inputs(self):
-        display(Markdown('## INPUTS'), qgrid.show_grid(self.info.in_df, grid_options={'editable': False}))
+        self._show_table(self.info.in_df, '## INPUTS')
         if self.info.loader_df.size:
-            display(Markdown('## LOADERS'), qgrid.show_grid(self.info.loader_df, grid_options={'editable': False}))
+            self._show_table(self.info.loader_df, '## LOADERS')
 
     @property
     def outputs(self):
-        display(qgrid.show_grid(self.info.out_df, grid_options={'editable': False}))        
-
+        self._show_table(self.info.out_df)
 
     @property
     def loaders(self):
-        display(qgrid.show_grid(self.info.loader_df, grid_options={'editable': False}))
+        self._show_table(self.info.loader_df)
 
 
 class RapXMLInfo(object):
+    """
+    Tables of the inputs, outputs and loaders in a RapXML.
 
-    def __init__(self, parent):
+    Rows are kept per element, so update() can refresh a single row
+    after a value is set.  The DataFrames are built the first time
+    they are read after a change.
+    """
 
-        self.ilist = {'Path':[], 'Label':[], 'Description':[]}
-        self.olist = {'Path':[], 'Label':[], 'Group':[], 'Description':[]}
-        self.llist = {'Path':[], 'Label':[], 'Description':[],
-                      'File':[], 'FileLabel':[], 'FileDescription':[]}
+    def __init__(self, parent):
+        # element -> row, in document order
+        self.irows = OrderedDict()
+        self.orows = OrderedDict()
+        self.lrows = []
+        # label -> list of paths
+        self.ilabels = {}
+        self.olabels = {}
+        # loader label -> path of first loader with it
+        self.llabels = {}
+        self._in_df = None
+        self._out_df = None
+        self._loader_df = None
         self.parent = parent
 
         inputs = parent.tree.find('input')
@@ -179,14 +263,71 @@ class RapXMLInfo(object):
         if outputs is not None:
             self.parse_elem('', outputs)
 
-        # save all data in dataframes
-        self.in_df = pd.DataFrame(data=self.ilist, columns=['Path', 'Label', 'Description'])
-        self.in_df = self.in_df.set_index('Path')
-        self.out_df = pd.DataFrame(data=self.olist, columns=['Path', 'Label', 'Group', 'Description'])
-        self.out_df = self.out_df.set_index('Path')
-        self.loader_df = pd.DataFrame(data=self.llist, columns=['Path', 'Label', 'Description',
-                                                                'File', 'FileLabel', 'FileDescription'])
-        self.loader_df = self.loader_df.set_index('Path')
+    def get_state(self):
+        """
+        Returns the tables as plain data, with elements replaced
+        by their position in the document.  See from_state.
+        """
+        pos = dict((e, i) for i, e in enumerate(self.parent.tree.getroot().iter()))
+        return dict(irows=[(pos[e], r) for e, r in self.irows.items()],
+                    orows=[(pos[e], r) for e, r in self.orows.items()],
+                    lrows=list(self.lrows))
+
+    @classmethod
+    def from_state(cls, parent, state):
+        """
+        Returns a RapXMLInfo for parent from get_state() of an
+        identical document, without parsing it.
+        """
+        self = cls.__new__(cls)
+        self.irows = OrderedDict()
+        self.orows = OrderedDict()
+        self.lrows = list(state['lrows'])
+        self.ilabels = {}
+        self.olabels = {}
+        self.llabels = {}
+        self._in_df = None
+        self._out_df = None
+        self._loader_df = None
+        self.parent = parent
+
+        elems = list(parent.tree.getroot().iter())
+        for rows, labels, saved in [(self.irows, self.ilabels, state['irows']),
+                                    (self.orows, self.olabels, state['orows'])]:
+            for i, row in saved:
+                rows[elems[i]] = row
+                labels.setdefault(row[1], []).append(row[0])
+        for row in self.lrows:
+            self.llabels.setdefault(row[1], row[0])
+        return self
+
+    @property
+    def in_df(self):
+        if self._in_df is None:
+            import pandas as pd
+            df = pd.DataFrame(data=list(self.irows.values()),
+                              columns=['Path', 'Label', 'Description'])
+            self._in_df = df.set_index('Path')
+        return self._in_df
+
+    @property
+    def out_df(self):
+        if self._out_df is None:
+            import pandas as pd
+            df = pd.DataFrame(data=list(self.orows.values()),
+                              columns=['Path', 'Label', 'Group', 'Description'])
+            self._out_df = df.set_index('Path')
+        return self._out_df
+
+    @property
+    def loader_df(self):
+        if self._loader_df is None:
+            import pandas as pd
+            df = pd.DataFrame(data=self.lrows,
+                              columns=['Path', 'Label', 'Description',
+                                       'File', 'FileLabel', 'FileDescription'])
+            self._loader_df = df.set_index('Path')
+        return self._loader_df
 
     def append(self, path, elem):
         pid, label, group, desc = get_elem_info(elem)
@@ -196,17 +337,81 @@ class RapXMLInfo(object):
             path = '%s.%s' % (path, elem.tag)
 
         if path.startswith('input'):
-            self.ilist['Path'].append(path)
-            self.ilist['Label'].append(label)
-            self.ilist['Description'].append(desc)
+            rows, labels = self.irows, self.ilabels
+            row = (path, label, desc)
+            self._in_df = None
         else:
-            self.olist['Path'].append(path)
-            self.olist['Label'].append(label)
-            self.olist['Group'].append(group)
-            self.olist['Description'].append(desc)
+            rows, labels = self.orows, self.olabels
+            row = (path, label, group, desc)
+            self._out_df = None
+
+        old = rows.get(elem)
+        if old is not None:
+            labels[old[1]].remove(old[0])
+            if not labels[old[1]]:
+                del labels[old[1]]
+        rows[elem] = row
+        labels.setdefault(label, []).append(path)
+
+    @staticmethod
+    def _match(paths):
+        if len(paths) == 0:
+            raise ValueError("No matches with that label.")
+        if len(paths) > 1:
+            raise ValueError("Error: %d labels match." % len(paths))
+        return paths[0]
+
+    def input_path(self, label, loaders=True):
+        """
+        Returns the path of the input with a label.  If no input
+        has it, loaders are checked. Raises ValueError if there is
+        no match or the label is ambiguous.
+        """
+        paths = self.ilabels.get(label, [])
+        if not paths and loaders and label in self.llabels:
+            paths = [self.llabels[label]]
+        return self._match(paths)
+
+    def output_path(self, label):
+        """
+        Returns the path of the output with a label.
+        """
+        return self._match(self.olabels.get(label, []))
+
+    def update(self, elem):
+        """
+        Refresh the row of the input or output containing elem.
+        Adds a row if elem is part of a new input or output.
+        """
+        chain = []
+        while elem.getparent() is not None:
+            chain.append(elem)
+            elem = elem.getparent()
+        chain.reverse()
+
+        # only the first input and output are parsed
+        top = chain[0]
+        if top.tag not in ('input', 'output') or top is not self.parent.tree.find(top.tag):
+            return
+
+        path = ''
+        for elem in chain:
+            if elem.tag in INFO_TAGS:
+                self.append(path, elem)
+                return
+            if elem.tag == 'loader':
+                return
+            if path == '':
+                path += elem.tag
+            else:
+                path += '.%s' % elem.tag
+            try:
+                path += "(%s)" % elem.attrib['id']
+            except:
+                pass
 
     def parse_loader(self, elem, path):
-        tdir = self.parent.dirname
+        index = example_index(self.parent.dirname)
         try:
             label = elem.find('about/label').text
             try:
@@ -220,47 +425,22 @@ class RapXMLInfo(object):
             except:
                 pass
             # print("LOADER: label=%s path=%s desc=%s" % (label, path, desc))
-            for ex in elem.findall('example'):
-                # print('ex=', ex.text)
-                fpath = '%s/rappture/examples/%s' % (tdir, ex.text)
-                for file in glob(fpath):
-                    if file.endswith('.'):
-                        continue
-                    r = ET.parse(file).getroot()
-                    flabel = r.find('about/label').text
-                    try:
-                        fdesc = r.find('about/description').text
-                    except:
-                        fdesc = ''
-                    # print(file, flabel, fdesc)
-                    self.llist['Path'].append(path)
-                    self.llist['Label'].append(label)
-                    self.llist['Description'].append(desc)
-                    self.llist['File'].append(file)
-                    self.llist['FileLabel'].append(flabel)
-                    self.llist['FileDescription'].append(fdesc)
+            for file in index.loader_files(elem):
+                if file.endswith('.'):
+                    continue
+                flabel, fdesc = index.about(file)
+                if flabel is None:
+                    raise ValueError('%s has no label' % file)
+                # print(file, flabel, fdesc)
+                self.lrows.append((path, label, desc, file, flabel, fdesc))
+                self.llabels.setdefault(label, path)
+            self._loader_df = None
         except:
             pass
 
-
     def parse_elem(self, path, elem):
         # print("parse:", path, elem.tag)
-        if elem.tag == 'number' or \
-           elem.tag == 'integer' or \
-           elem.tag == 'string' or \
-           elem.tag == 'log' or \
-           elem.tag == 'boolean' or \
-           elem.tag == 'choice' or \
-           elem.tag == 'drawing' or \
-           elem.tag == 'field' or \
-           elem.tag == 'flow' or \
-           elem.tag == 'histogram' or \
-           elem.tag == 'image' or \
-           elem.tag == 'mesh' or \
-           elem.tag == 'period element' or \
-           elem.tag == 'structure' or \
-           elem.tag == 'curve' or \
-           elem.tag == 'table':
+        if elem.tag in INFO_TAGS:
             self.append(path, elem)
         elif elem.tag == 'loader':
             self.parse_loader(elem, path)
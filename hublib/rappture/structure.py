@@ -1,17 +1,13 @@
 from __future__ import print_function
 from lxml import etree as ET
 import numpy as np
-import pint
 from .. import ureg, Q_
 
 import os
-import matplotlib
-import matplotlib.pyplot as plt
-from IPython.display import display
 import tempfile
-import nglview as nv
 from .util import efind
 from .node import Node
+from . import deps
 
 
 class Structure(Node):
@@ -69,7 +65,7 @@ class Structure(Node):
             print(pdb, file=f)
             f.close()
             
-        w = nv.show_structure_file(f.name)
+        w = deps.nglview().show_structure_file(f.name)
         w.representations = [
             {"type": "ball+stick", "params": {}}
         ]
@@ -77,4 +73,4 @@ class Structure(Node):
             "backgroundColor": "black",
         }
         os.unlink(f.name)
-        display(w)
+        deps.display(w)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# Reading one input and one curve from many run files:
+# a serial RapXML loop compared to read_runs.
+#
+# usage: python bench_batch.py [num_files [workers]]
+
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+
+
+def main():
+    nfiles = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    select = ['input.integer(points)', 'output.curve(single)']
+
+    tdir = tempfile.mkdtemp()
+    try:
+        io = rappture.RapXML('curve.xml')
+        io['output.curve(single).component.xy'] = np.random.rand(1000, 2)
+        xml = str(io.xml(header=True))
+        for i in range(nfiles):
+            with open(os.path.join(tdir, 'run%05d.xml' % i), 'w') as f:
+                f.write(xml)
+
+        t = time.time()
+        vals = []
+        for fname in rappture.batch.run_files(tdir):
+            r = rappture.RapXML(fname)
+            vals.append((r[select[0]].value, r[select[1] + '.component.xy'].value))
+        serial = time.time() - t
+        print('%d files' % nfiles)
+        print('%-24s %8.2f s' % ('serial RapXML loop', serial))
+
+        for w in [1, workers]:
+            t = time.time()
+            rappture.read_runs(tdir, select, workers=w)
+            t = time.time() - t
+            print('%-24s %8.2f s  (%.1fx)' % ('read_runs workers=%s' % w, t, serial / t))
+    finally:
+        shutil.rmtree(tdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# Import time of hublib.rappture from python -X importtime.
+# Exits with status 1 if the best of several runs is over the
+# threshold, or if a plotting or display library was imported.
+#
+# usage: python bench_import.py [threshold_ms [runs]]
+
+from __future__ import print_function
+import os
+import sys
+import subprocess
+
+HEAVY = ['matplotlib', 'pandas', 'qgrid', 'IPython', 'nglview', 'bs4', 'ipywidgets']
+
+
+def import_times(module):
+    # module -> cumulative import time in us, for one run
+    env = dict(os.environ, HUBLIB_HEADLESS='1')
+    proc = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=os.path.abspath('../../..'), env=env,
+                            stderr=subprocess.PIPE)
+    _, err = proc.communicate()
+    times = {}
+    for line in err.decode().splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        try:
+            _, cumul, name = line.split('|')
+            times[name.strip()] = int(cumul)
+        except ValueError:
+            pass
+    return times
+
+
+def main():
+    threshold = float(sys.argv[1]) if len(sys.argv) > 1 else 300
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    best = None
+    for i in range(runs):
+        times = import_times('hublib.rappture')
+        if best is None or times['hublib.rappture'] < best['hublib.rappture']:
+            best = times
+
+    total = best['hublib.rappture'] / 1000.0
+    print('import hublib.rappture: %.1f ms (threshold %.0f ms)' % (total, threshold))
+    print('slowest imports:')
+    for name, t in sorted(best.items(), key=lambda x: -x[1])[1:11]:
+        print('  %8.1f ms  %s' % (t / 1000.0, name))
+
+    heavy = [m for m in best if m.split('.')[0] in HEAVY]
+    if heavy:
+        print('FAIL: imported %s' % ', '.join(sorted(set(m.split('.')[0] for m in heavy))))
+        sys.exit(1)
+    if total > threshold:
+        print('FAIL: over threshold')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
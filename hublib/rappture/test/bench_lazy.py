@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# Peak memory of loading a large run file with and without lazy=True.
+# Memory is reported as the growth of peak RSS after importing hublib.
+#
+# usage: python bench_lazy.py [num_curves [points_per_curve]]
+
+from __future__ import print_function
+import os
+import sys
+import subprocess
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath('../../..'))
+
+LOAD = """
+import resource, sys, time
+sys.path.insert(0, %r)
+import hublib.rappture as rappture
+rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t = time.time()
+io = rappture.RapXML(%r, lazy=%s)
+t = time.time() - t
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0
+io['output.curve(c0).component.xy'].value
+rss2 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0
+print(t, rss, rss2)
+"""
+
+
+def make_run(fname, ncurves, npoints):
+    with open(fname, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<run>\n<output>\n')
+        for i in range(ncurves):
+            f.write('<curve id="c%d"><about><label>Curve %d</label></about>\n' % (i, i))
+            f.write('<component><xy>')
+            for j in range(npoints):
+                f.write('%.6e %.6e\n' % (j, i * j))
+            f.write('</xy></component></curve>\n')
+        f.write('</output>\n</run>\n')
+
+
+def main():
+    ncurves = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    npoints = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    fd, fname = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        make_run(fname, ncurves, npoints)
+        print('file size: %.1f MB' % (os.path.getsize(fname) / 1e6))
+        print('%6s %10s %16s %20s' % ('lazy', 'load(s)', 'RSS growth(MB)', 'after 1 curve(MB)'))
+        top = os.path.abspath('../../..')
+        for lazy in [False, True]:
+            out = subprocess.check_output([sys.executable, '-c', LOAD % (top, fname, lazy)])
+            t, rss, rss2 = out.decode().split()[-3:]
+            print('%6s %10.2f %16.1f %20.1f' % (lazy, float(t), int(rss) / 1024., int(rss2) / 1024.))
+    finally:
+        os.unlink(fname)
+
+
+if __name__ == '__main__':
+    main()
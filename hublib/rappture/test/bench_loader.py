@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# Time copy_defaults and RapLoader.load on generated tool.xml files
+# of increasing size.  The time per input should stay flat.
+#
+# usage: python bench_loader.py [max_inputs]
+
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import time
+from lxml import etree as ET
+
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.rappture.loader import RapLoader
+
+
+def make_tool(n, noptions=20, gsize=1000):
+    # n numbers and n/10 choices in groups of gsize, and an example
+    # that sets all of them
+    tool = ['<run><input>']
+    example = ['<run><about><label>Example</label></about><input>']
+    for g in range(0, n, gsize):
+        tool.append('<group id="g%d">' % g)
+        example.append('<group id="g%d">' % g)
+        for i in range(g, min(g + gsize, n)):
+            if i % 10:
+                tool.append('<number id="n%d"><about><label>N%d</label></about>'
+                            '<units>K</units><default>%d</default></number>' % (i, i, i))
+                example.append('<number id="n%d"><current>%dK</current></number>' % (i, i + 1))
+            else:
+                opts = ''.join('<option><about><label>Opt %d</label></about>'
+                               '<value>%d</value></option>' % (j, j)
+                               for j in range(noptions))
+                tool.append('<choice id="c%d"><about><label>C%d</label></about>%s'
+                            '<default>Opt %d</default></choice>' % (i, i, opts, noptions - 1))
+                example.append('<choice id="c%d"><current>0</current></choice>' % i)
+        tool.append('</group>')
+        example.append('</group>')
+    tool.append('<loader><about><label>Ex</label></about>'
+                '<default>example.xml</default></loader></input></run>')
+    example.append('</input></run>')
+    return ''.join(tool), ''.join(example)
+
+
+def main():
+    nmax = int(sys.argv[1]) if len(sys.argv) > 1 else 16000
+    tdir = tempfile.mkdtemp()
+    try:
+        print('%8s %12s %12s %14s' % ('inputs', 'defaults(s)', 'load(s)', 'us per input'))
+        n = 1000
+        while n <= nmax:
+            tool, example = make_tool(n)
+            exfile = os.path.join(tdir, 'example.xml')
+            with open(exfile, 'w') as f:
+                f.write(example)
+            tree = ET.ElementTree(ET.fromstring(tool))
+
+            t = time.time()
+            RapLoader.copy_defaults(tree, reset=True)
+            t1 = time.time() - t
+
+            loader = tree.find('input/loader')
+            t = time.time()
+            RapLoader.load(tree, loader, loader.find('current'), exfile)
+            t2 = time.time() - t
+
+            print('%8d %12.3f %12.3f %14.1f' % (n, t1, t2, 1e6 * (t1 + t2) / n))
+            n *= 2
+    finally:
+        shutil.rmtree(tdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# Read and write Number values 10k times, with and without the
+# units cache and the fast path for "<float><units>" values.
+#
+# usage: python bench_number.py [count]
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+from hublib.rappture import number
+from hublib import ureg, Q_
+
+
+def bench(io, count):
+    node = io['input.number(temperature)']
+    t = time.time()
+    for i in range(count):
+        node.value
+    tread = time.time() - t
+
+    vals = [Q_(300 + i % 100, ureg.kelvin) for i in range(count)]
+    t = time.time()
+    for v in vals:
+        node.value = v
+    twrite = time.time() - t
+    return tread, twrite
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    io = rappture.RapXML('number.xml')
+
+    fast = bench(io, count)
+
+    # pint on every access, as before
+    save = number.fast_magnitude, number._lookup_units
+    number.fast_magnitude = lambda units, val: None
+    number._lookup_units = lambda text: number._units_cache.clear() or save[1](text)
+    try:
+        slow = bench(io, count)
+    finally:
+        number.fast_magnitude, number._lookup_units = save
+
+    print('%d numbers' % count)
+    print('%-8s %10s %10s %8s' % ('', 'pint (s)', 'fast (s)', 'speedup'))
+    for name, s, f in zip(['read', 'write'], slow, fast):
+        print('%-8s %10.3f %10.3f %7.1fx' % (name, s, f, s / f))
+
+
+if __name__ == '__main__':
+    main()
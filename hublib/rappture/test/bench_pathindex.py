@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# Micro-benchmark for rappture path lookups.
+# Compares tree.find() on an xpath with the PathIndex
+# for documents with an increasing number of outputs.
+#
+# usage: python bench_pathindex.py
+
+from __future__ import print_function
+import os
+import sys
+import timeit
+from lxml import etree as ET
+
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.rappture.node import PathIndex, _to_xpath
+
+
+def make_tree(n):
+    root = ET.Element('run')
+    inp = ET.SubElement(root, 'input')
+    out = ET.SubElement(root, 'output')
+    for i in range(n):
+        num = ET.SubElement(inp, 'number', id='n%d' % i)
+        ET.SubElement(ET.SubElement(num, 'about'), 'label').text = 'Input %d' % i
+        ET.SubElement(num, 'units').text = 'K'
+        ET.SubElement(num, 'current').text = '300K'
+        curve = ET.SubElement(out, 'curve', id='c%d' % i)
+        ET.SubElement(ET.SubElement(curve, 'about'), 'label').text = 'Curve %d' % i
+        ET.SubElement(ET.SubElement(curve, 'component'), 'xy').text = '0 0\n1 1\n'
+    return ET.ElementTree(root)
+
+
+def main():
+    print('%8s %12s %12s %12s' % ('outputs', 'find(us)', 'index(us)', 'build(ms)'))
+    for n in [10, 100, 1000, 10000]:
+        tree = make_tree(n)
+        paths = ['input.number(n%d).current' % i for i in range(0, n, max(1, n // 100))]
+        paths += ['output.curve(c%d).component.xy' % i for i in range(0, n, max(1, n // 100))]
+        xpaths = [_to_xpath(p) for p in paths]
+
+        def use_find():
+            for x in xpaths:
+                tree.find(x)
+
+        index = PathIndex(tree)
+        build = timeit.timeit(index.build, number=1)
+
+        def use_index():
+            for p in paths:
+                index.find(p)
+
+        reps = 5
+        tf = min(timeit.repeat(use_find, number=1, repeat=reps)) / len(paths)
+        ti = min(timeit.repeat(use_index, number=1, repeat=reps)) / len(paths)
+        print('%8d %12.2f %12.2f %12.2f' % (n, tf * 1e6, ti * 1e6, build * 1e3))
+
+
+if __name__ == '__main__':
+    main()
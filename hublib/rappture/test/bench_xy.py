@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# Benchmark for reading and writing curve data in <xy> elements.
+#
+# usage: python bench_xy.py [points]
+
+from __future__ import print_function
+import os
+import sys
+import timeit
+from io import BytesIO
+import numpy as np
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+from hublib.rappture.xydata import format_xy, parse_xy
+
+
+def best(func, number=1, repeat=3):
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    a = np.random.rand(n, 2)
+
+    def savetxt():
+        s = BytesIO()
+        np.savetxt(s, a, fmt='%.6e %.6e', newline="\n")
+        return s.getvalue()
+
+    text = format_xy(a)
+    ztext = format_xy(a, compress=True)
+    print('%d points' % n)
+    print('%-28s %8.3f s' % ('format np.savetxt', best(savetxt)))
+    print('%-28s %8.3f s' % ('format_xy', best(lambda: format_xy(a))))
+    print('%-28s %8.3f s' % ('format_xy zb64', best(lambda: format_xy(a, compress=True))))
+    print('%-28s %8.3f s' % ('parse text', best(lambda: parse_xy(text))))
+    print('%-28s %8.3f s' % ('parse zb64', best(lambda: parse_xy(ztext))))
+    print('text %.1f MB, zb64 %.1f MB' % (len(text) / 1e6, len(ztext) / 1e6))
+
+    io = rappture.RapXML('curve.xml')
+    xy = io['output.curve(single).component.xy']
+    xy.value = a
+    print('%-28s %8.3f s' % ('first .value', best(lambda: io.xycache.clear() or xy.value)))
+    print('%-28s %8.6f s' % ('cached .value', best(lambda: xy.value, number=1000)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+import shutil
+import numpy as np
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+
+
+@pytest.fixture
+def rundir(tmpdir):
+    # copies of curve.xml with different data
+    for i in range(6):
+        io = rappture.RapXML('curve.xml')
+        io['input.integer(points).current'] = i + 2
+        io['output.curve(single).component.xy'] = np.arange(2 * (i + 2)).reshape(-1, 2) * i
+        with open(str(tmpdir.join('run%d.xml' % i)), 'w') as f:
+            f.write(str(io.xml(header=True)))
+    return str(tmpdir)
+
+
+class TestBatch:
+
+    select = ['input.integer(points)', 'output.curve(single)']
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_read(self, rundir, workers):
+        cols = rappture.read_runs(rundir, self.select, workers=workers, chunksize=2)
+        assert [os.path.basename(f) for f in cols['file']] == ['run%d.xml' % i for i in range(6)]
+        assert list(cols['input.integer(points)']) == [2, 3, 4, 5, 6, 7]
+        curves = cols['output.curve(single)']
+        assert len(curves) == 6
+        for i in range(6):
+            assert np.allclose(curves[i], np.arange(2 * (i + 2)).reshape(-1, 2) * i)
+
+    def test_iter(self, rundir):
+        res = list(rappture.iter_runs(os.path.join(rundir, 'run*.xml'), self.select, workers=2))
+        assert [os.path.basename(f) for f, v in res] == ['run%d.xml' % i for i in range(6)]
+
+    def test_label(self, rundir):
+        label = rappture.RapXML('curve.xml').info.in_df.Label.iloc[0]
+        cols = rappture.read_runs(rundir, [label], workers=1)
+        assert len(cols[label]) == 6
+
+    def test_errors(self, rundir):
+        with open(os.path.join(rundir, 'bad.xml'), 'w') as f:
+            f.write('<run>')
+        with pytest.raises(ValueError):
+            rappture.read_runs(rundir, self.select, workers=1)
+        cols = rappture.read_runs(rundir, self.select, workers=1, skip_errors=True)
+        assert len(cols['file']) == 6
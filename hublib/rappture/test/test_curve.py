@@ -67,3 +67,39 @@ class TestCurve:
         assert np.allclose(x, val[:, 0])
         assert np.allclose(y, val[:, 1])
 
+    def test_write_int_columns(self):
+        xy = self.io['output.curve(single).component.xy']
+        xy.value = [np.arange(3), np.array([0.5, 1.5, 2.5])]
+        assert xy.rvalue == '0 0.5\n1 1.5\n2 2.5\n'
+        xy.value = (np.arange(2), np.arange(2) * 10)
+        assert xy.rvalue == '0 0\n1 10\n'
+
+    def test_cached(self):
+        xy = self.io['output.curve(single).component.xy']
+        val = xy.value
+        # a writable copy; changing it leaves the document alone
+        old = val[0, 1]
+        val[0, 1] = -1
+        assert xy.value[0, 1] == old
+        assert xy.top.xycache[xy.elem] is not val
+        a = np.arange(10).reshape(-1, 2)
+        xy.value = a
+        assert np.allclose(xy.value, a)
+
+    def test_write_compressed(self):
+        a = np.arange(200).reshape(-1, 2) / 7.0
+        self.io['output.curve(single).component.xy'].set(a, compress=True)
+        text = self.io['output.curve(single).component.xy'].rvalue
+        assert text.startswith('@@RP-ENC:zb64\n')
+        val = self.io['output.curve(single).component.xy'].value
+        assert np.allclose(a, val)
+
+    def test_format(self):
+        from hublib.rappture.xydata import format_xy, parse_xy
+        from io import BytesIO
+        a = np.random.rand(1000, 2) * 1e5
+        s = BytesIO()
+        np.savetxt(s, a, fmt='%.6e %.6e', newline="\n")
+        text = format_xy(a)
+        assert text == s.getvalue().decode()
+        assert np.allclose(parse_xy(text), a, rtol=1e-6)
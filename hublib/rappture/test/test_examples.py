@@ -0,0 +1,96 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.rappture.rappture import RapXML
+from hublib.rappture.examples import ExampleIndex, read_about
+
+TOOL = """<?xml version="1.0"?>
+<run>
+<input>
+    <loader>
+        <about><label>Example</label></about>
+        <example>*.xml</example>
+        <default>a.xml</default>
+    </loader>
+    <string id="name">
+        <about><label>Name</label></about>
+        <default>none</default>
+    </string>
+</input>
+</run>
+"""
+
+EXAMPLE = """<?xml version="1.0"?>
+<run>
+<input>
+    <string id="name">
+        <about><label>Not this one</label></about>
+        <current>%s</current>
+    </string>
+</input>
+<about><label>%s</label><description>About %s</description></about>
+</run>
+"""
+
+
+class TestExamples:
+
+    @pytest.fixture(autouse=True)
+    def tooldir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('HUBLIB_NO_CACHE', '1')
+        self.exdir = tmp_path / 'tool' / 'rappture' / 'examples'
+        self.exdir.mkdir(parents=True)
+        (tmp_path / 'tool' / 'rappture' / 'tool.xml').write_text(TOOL)
+        self.add('a.xml', 'alpha', 'First')
+        self.add('b.xml', 'beta', 'Second')
+        self.tdir = str(tmp_path / 'tool')
+
+    def add(self, name, value, label):
+        (self.exdir / name).write_text(EXAMPLE % (value, label, label))
+
+    def test_read_about(self):
+        assert read_about(str(self.exdir / 'a.xml')) == ('First', 'About First')
+        (self.exdir / 'c.xml').write_text('<run><input/></run>')
+        assert read_about(str(self.exdir / 'c.xml')) == (None, '')
+
+    def test_index(self):
+        index = ExampleIndex(self.tdir)
+        files = index.files('*.xml')
+        assert sorted(os.path.basename(f) for f in files) == ['a.xml', 'b.xml']
+        assert index.files('*.xml') is files
+        assert index.files('missing/*.xml') == []
+        assert ExampleIndex(None).files('*.xml') == []
+
+    def test_new_file(self):
+        index = ExampleIndex(self.tdir)
+        index.files('*.xml')
+        self.add('c.xml', 'gamma', 'Third')
+        # make sure the directory mtime changes
+        st = os.stat(str(self.exdir))
+        os.utime(str(self.exdir), (st.st_atime, st.st_mtime + 10))
+        assert len(index.files('*.xml')) == 3
+
+    def test_changed_label(self):
+        index = ExampleIndex(self.tdir)
+        fname = str(self.exdir / 'a.xml')
+        assert index.about(fname)[0] == 'First'
+        self.add('a.xml', 'alpha', 'Renamed')
+        st = os.stat(fname)
+        os.utime(fname, (st.st_atime, st.st_mtime + 10))
+        assert index.about(fname)[0] == 'Renamed'
+
+    def test_select_by_label(self):
+        tool = RapXML.__new__(RapXML)
+        tool.dirname = self.tdir
+        RapXML.__init__(tool, os.path.join(self.tdir, 'rappture', 'tool.xml'))
+        assert tool['input.string(name).current'].value == 'alpha'
+        df = tool.info.loader_df
+        assert sorted(df.FileLabel) == ['First', 'Second']
+        tool['input.loader'].value = 'Second'
+        assert tool['input.string(name).current'].value == 'beta'
+        assert tool['input.loader.current'].value == 'Second'
+        with pytest.raises(ValueError):
+            tool['input.loader'].value = 'Not this one'
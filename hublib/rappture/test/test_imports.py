@@ -0,0 +1,77 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+import subprocess
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib
+import hublib.rappture as rappture
+from hublib.rappture import deps, number
+
+HEAVY = ['matplotlib', 'pandas', 'qgrid', 'IPython', 'nglview', 'bs4', 'ipywidgets']
+
+
+def imported_after(code, heavy=HEAVY):
+    # modules in heavy loaded by running code in a new python
+    script = 'import sys\n%s\nprint(" ".join(m for m in %r if m in sys.modules))' % (code, heavy)
+    env = dict(os.environ, HUBLIB_HEADLESS='1')
+    out = subprocess.check_output([sys.executable, '-c', script],
+                                  cwd=os.path.abspath('../../..'), env=env)
+    return out.decode().split()
+
+
+class TestImports:
+
+    def test_import(self):
+        assert imported_after('import hublib.rappture') == []
+
+    def test_read_write(self):
+        code = """
+import hublib.rappture as rappture
+io = rappture.RapXML('hublib/rappture/test/curve.xml')
+io['input.integer(points).current'] = 5
+io.outputs_to_arrays()
+str(io.xml())
+"""
+        assert imported_after(code) == []
+
+    def test_headless(self, monkeypatch):
+        monkeypatch.setattr(deps, 'HEADLESS', True)
+        io = rappture.RapXML('curve.xml')
+        with pytest.raises(RuntimeError):
+            io['output.curve(single)'].plot()
+        with pytest.raises(RuntimeError):
+            io.loaders
+
+    def test_units_on_first_use(self):
+        assert imported_after('import hublib.cmd; import hublib.rappture', ['pint']) == []
+        code = """
+import hublib.rappture as rappture
+io = rappture.RapXML('hublib/rappture/test/number.xml')
+io['input.number(temperature)'].value
+"""
+        assert imported_after(code, ['pint']) == ['pint']
+
+    def test_shared_registry(self):
+        ureg = hublib.get_ureg()
+        assert ureg is hublib.get_ureg()
+        assert number.rap_units('K') == ureg.kelvin
+        q = hublib.Q_(3, 'm')
+        assert isinstance(q, hublib.Q_)
+        assert isinstance(q, ureg.Quantity)
+        assert (q + ureg.Quantity(2, 'm')).magnitude == 5
+        assert hublib.ureg('2 m').magnitude == 2
+
+    def test_configure_registry(self):
+        ureg = hublib.get_ureg()
+        old = ureg.autoconvert_offset_to_baseunit
+        try:
+            hublib.ureg.autoconvert_offset_to_baseunit = not old
+            assert ureg.autoconvert_offset_to_baseunit is (not old)
+            assert hublib.ureg.autoconvert_offset_to_baseunit is (not old)
+            assert 'autoconvert_offset_to_baseunit' not in vars(hublib.ureg)
+        finally:
+            ureg.autoconvert_offset_to_baseunit = old
+        assert 'Quantity' in dir(hublib.ureg)
+        assert 'to' in dir(hublib.Q_)
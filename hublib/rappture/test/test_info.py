@@ -0,0 +1,75 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+from hublib.rappture.rappture import RapXMLInfo
+
+
+class TestInfo:
+
+    def setup_method(self, method):
+        self.io = rappture.RapXML('number.xml')
+
+    def test_lazy_frames(self):
+        info = self.io.info
+        assert info._in_df is None and info._out_df is None
+        assert list(info.in_df.index)[0] == 'input.number(temperature)'
+        assert info._in_df is not None
+
+    def test_set_value(self):
+        df = self.io.info.in_df
+        self.io['input.number(temperature).current'] = '310K'
+        # a value change leaves the table alone
+        assert self.io.info.in_df.equals(df)
+
+    def test_set_label(self):
+        self.io['input.number(temperature).about.label'] = 'New Label'
+        assert self.io.info.in_df.loc['input.number(temperature)', 'Label'] == 'New Label'
+        assert self.io.info.in_df.equals(RapXMLInfo(self.io).in_df)
+
+    def test_new_output(self):
+        self.io['output.number(new).about.label'] = 'New Output'
+        self.io['output.number(new).current'] = 7
+        full = RapXMLInfo(self.io)
+        assert self.io.info.out_df.equals(full.out_df)
+        assert self.io.info.out_df.loc['output.number(new)', 'Label'] == 'New Output'
+
+    def test_batch(self):
+        with self.io.batch():
+            self.io['output.number(new).about.label'] = 'New Output'
+            assert 'output.number(new)' not in self.io.info.out_df.index
+            with self.io.batch():
+                self.io['output.number(new2).about.label'] = 'New Output 2'
+            assert 'output.number(new2)' not in self.io.info.out_df.index
+        assert 'output.number(new)' in self.io.info.out_df.index
+        assert 'output.number(new2)' in self.io.info.out_df.index
+
+    def test_batch_reload(self):
+        info = self.io.info
+        with self.io.batch():
+            self.io.reload()
+            assert self.io.info is info
+        assert self.io.info is not info
+
+    def test_labels(self):
+        assert self.io.info.input_path('Ambient temperature') == 'input.number(temperature)'
+        assert self.io.info.output_path('Ambient temperature') == 'output.number(outt)'
+        self.io.set_input('Ambient temperature', '310K')
+        assert self.io.get_input('Ambient temperature').rvalue == '310K'
+        with pytest.raises(ValueError):
+            self.io.get_input('No such label')
+
+    def test_label_change(self):
+        self.io['input.number(temperature).about.label'] = 'New Label'
+        assert self.io.info.input_path('New Label') == 'input.number(temperature)'
+        with pytest.raises(ValueError):
+            self.io.info.input_path('Ambient temperature')
+
+    def test_ambiguous(self):
+        self.io['input.number(temperature2).about.label'] = 'Ambient temperature'
+        with pytest.raises(ValueError) as e:
+            self.io.set_input('Ambient temperature', '310K')
+        assert '2 labels match' in str(e.value)
@@ -0,0 +1,80 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+from hublib.rappture.lazy import LazyTree
+
+
+def lazy_io(fname):
+    # defer everything, even small payloads
+    LazyTree.MIN_SIZE = 0
+    try:
+        return rappture.RapXML(fname, lazy=True)
+    finally:
+        LazyTree.MIN_SIZE = 4096
+
+
+class TestLazy:
+
+    def test_curve(self):
+        io = lazy_io('curve.xml')
+        eager = rappture.RapXML('curve.xml')
+        path = 'output.curve(single).component.xy'
+        elem = io.pindex.find(path)
+        assert elem.text is None
+        assert np.allclose(io[path].value, eager[path].value)
+        assert elem.text == eager.pindex.find(path).text
+        assert str(io.xml()) == str(eager.xml())
+
+    def test_hist(self):
+        io = lazy_io('hist_run.xml')
+        eager = rappture.RapXML('hist_run.xml')
+        assert str(io.xml()) == str(eager.xml())
+
+    def test_image(self):
+        io = lazy_io('image_test.xml')
+        eager = rappture.RapXML('image_test.xml')
+        path = 'output.image(outi)'
+        assert io[path].value.data == eager[path].value.data
+        # small currents are not images, so they are never deferred
+        assert io.pindex.find('input.loader.current').text == 'nanoHUB'
+
+    def test_info(self):
+        io = lazy_io('curve.xml')
+        eager = rappture.RapXML('curve.xml')
+        assert io.info.out_df.equals(eager.info.out_df)
+
+    def test_set(self):
+        io = lazy_io('curve.xml')
+        path = 'output.curve(single).component.xy'
+        a = np.arange(20).reshape(-1, 2)
+        io[path] = a
+        assert np.allclose(io[path].value, a)
+
+    def test_chdir(self, monkeypatch, tmp_path):
+        io = lazy_io('curve.xml')
+        eager = rappture.RapXML('curve.xml')
+        path = 'output.curve(single).component.xy'
+        monkeypatch.chdir(str(tmp_path))
+        assert np.allclose(io[path].value, eager[path].value)
+
+    def test_min_size(self):
+        io = rappture.RapXML('curve.xml', lazy=True)
+        assert not io.lazy.deferred
+
+    def test_comment(self, tmpdir):
+        # a comment that looks like a tag must not confuse the offsets
+        fname = str(tmpdir.join('run.xml'))
+        with open(fname, 'w') as f:
+            f.write('<run><output><!-- <xy>bogus</xy> -->\n'
+                    '<curve id="a"><component><xy>1 2\n3 4\n</xy></component></curve>'
+                    '<curve id="b"><component><xy>5 6\n7 8\n</xy></component></curve>'
+                    '</output></run>')
+        io = lazy_io(fname)
+        assert len(io.lazy.deferred) == 2
+        assert np.allclose(io['output.curve(b).component.xy'].value, [[5, 6], [7, 8]])
+        assert np.allclose(io['output.curve(a).component.xy'].value, [[1, 2], [3, 4]])
@@ -0,0 +1,74 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+from lxml import etree as ET
+
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.rappture.loader import RapLoader
+
+TOOL = """<run><input>
+<number id="temp"><units>K</units><default>300</default></number>
+<number id="len"><units>m</units><default>2cm</default><current>5m</current></number>
+<choice id="c">
+    <option><about><label>First</label></about><value>1</value></option>
+    <option><about><label>Second</label></about><value>2</value></option>
+    <option><about><label>Third</label></about></option>
+    <default>Second</default>
+</choice>
+<choice id="v">
+    <option><about><label>One</label></about><value>1</value></option>
+    <default>1</default>
+</choice>
+<loader><about><label>Ex</label></about><default>ex.xml</default></loader>
+<group id="g"><string id="s"><default>x</default></string></group>
+</input></run>
+"""
+
+EXAMPLE = """<run><about><label>Example 1</label></about><input>
+<number id="temp"><current>400K</current></number>
+<group id="g"><string id="s"><current>loaded</current></string></group>
+<group id="new"><number id="n"><units>K</units><default>1</default><current>7K</current></number></group>
+</input></run>
+"""
+
+
+class TestLoader:
+
+    def setup_method(self, method):
+        self.tree = ET.ElementTree(ET.fromstring(TOOL))
+
+    def current(self, path):
+        return self.tree.findtext('input/%s/current' % path)
+
+    def test_copy_defaults(self):
+        RapLoader.copy_defaults(self.tree)
+        assert self.current("number[@id='temp']") == '300K'
+        assert self.current("number[@id='len']") == '5m'
+        assert self.current("choice[@id='c']") == '2'
+        assert self.current("choice[@id='v']") == '1'
+        assert self.current("group/string") == 'x'
+        assert self.tree.find('input/loader/current') is not None
+
+    def test_copy_defaults_reset(self):
+        RapLoader.copy_defaults(self.tree, reset=True)
+        assert self.current("number[@id='len']") == '2cm'
+
+    def test_choice_label_without_value(self):
+        self.tree.find("input/choice[@id='c']/default").text = 'Third'
+        RapLoader.copy_defaults(self.tree)
+        assert self.current("choice[@id='c']") == 'Third'
+
+    def test_load(self, tmp_path):
+        fname = str(tmp_path / 'ex.xml')
+        with open(fname, 'w') as f:
+            f.write(EXAMPLE)
+        RapLoader.copy_defaults(self.tree, reset=True)
+        loader = self.tree.find('input/loader')
+        RapLoader.load(self.tree, loader, loader.find('current'), fname)
+        assert loader.findtext('current') == 'Example 1'
+        assert self.current("number[@id='temp']") == '400K'
+        assert len(self.tree.findall("input/number[@id='temp']/current")) == 1
+        assert self.current("group[@id='g']/string") == 'loaded'
+        # missing parts are copied over
+        assert self.current("group[@id='new']/number") == '7K'
@@ -6,6 +6,7 @@ import numpy as np
 sys.path.insert(0, os.path.abspath('../../..'))
 import hublib.rappture as rappture
 from hublib import ureg, Q_
+from hublib.rappture import number
 
 
 class TestNumber:
@@ -117,3 +118,77 @@ output.number(outv)\t"Voltage Sweep +/-"
         val = self.io['input.number(temperature4)'].value
         assert val == 270
 
+
+
+class TestFastNumber:
+
+    def setup_method(self, method):
+        self.io = rappture.RapXML('number.xml')
+
+    @pytest.mark.parametrize('units,val', [
+        ('K', '300K'), ('K', ' 300 K '), ('K', '300'), ('C', '25C'),
+        ('V', '-4V'), ('V', '.5V'), ('eV', '1e5eV'), ('m/s', '2 m/s'),
+        ('1/s', '3 1/s'), ('kg*m', '3kg*m')])
+    def test_same_as_pint(self, units, val):
+        fast = number.fast_magnitude(units, val)
+        slow = number.parse_rap_expr(units, val).magnitude
+        assert fast == slow
+        assert type(fast) == type(slow)
+
+    @pytest.mark.parametrize('units,val', [
+        ('K', '25C'), ('mV', '4V'), ('1/s', '31/s'), ('10m', '5 10m'),
+        ('K', 'abc'), ('K', None)])
+    def test_needs_pint(self, units, val):
+        assert number.fast_magnitude(units, val) is None
+
+    def test_read(self):
+        assert self.io['input.number(temperature)'].value == 300
+        assert np.isclose(self.io['input.number(temperature2)'].value, 26.85)
+        assert self.io['input.number(temperature3)'].value == 300
+
+    def test_write(self):
+        self.io['input.number(temperature)'] = Q_(310, ureg.kelvin)
+        assert self.io.tree.findtext("input/number[@id='temperature']/current") == '310 K'
+        self.io['input.number(temperature2)'] = Q_(300, ureg.kelvin)
+        assert np.isclose(self.io['input.number(temperature2)'].value, 26.85)
+
+    def test_write_dimensionless(self):
+        self.io['input.number(temperature)'] = Q_(5)
+        assert self.io.tree.findtext("input/number[@id='temperature']/current") == '5'
+
+    def test_units_cache(self, monkeypatch):
+        monkeypatch.setattr(number, 'UNITS_CACHE_SIZE', 2)
+        monkeypatch.setattr(number, '_units_cache', number.OrderedDict())
+        for u in ['K', 'V', 'K', 'm']:
+            number.rap_units(u)
+        assert list(number._units_cache) == ['K', 'm']
+        assert number.rap_units('C') == ureg.degC
+        assert number.rap_units('/cm3') is None
+
+
+class TestConvert:
+
+    def test_convert(self):
+        assert np.allclose(number.convert([0, 100], 'C', 'degF'), [32, 212])
+        assert np.allclose(number.convert([300, 0], 'K', 'C'), [26.85, -273.15])
+        assert np.allclose(number.convert(np.arange(3), 'm', 'cm'), [0, 100, 200])
+        assert number.convert(5, 'nm', 'nm') == 5
+        assert ('C', 'degF') in number._conv_cache
+
+    def test_bad_units(self):
+        with pytest.raises(ValueError):
+            number.convert([1], 'K', 'xyzzy')
+
+    @pytest.mark.parametrize('units,vals', [
+        ('K', ['300K', '25C', '300', '80degF', ' 1e2 K', '0.3kK']),
+        ('C', ['300K', '25C', '25', '77degF']),
+        ('V', ['4V', '400mV']),
+        ('', ['1', '2.5'])])
+    def test_parse_rap_values(self, units, vals):
+        slow = [getattr(number.parse_rap_expr(units, v), 'magnitude', None) for v in vals]
+        slow = [float(v) if s is None else s for s, v in zip(slow, vals)]
+        assert np.allclose(number.parse_rap_values(units, vals), slow)
+
+    def test_parse_rap_values_bad(self):
+        with pytest.raises(ValueError):
+            number.parse_rap_values('K', ['300K', 'hot'])
@@ -0,0 +1,86 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+
+
+class TestOutputs:
+
+    def test_curves(self):
+        io = rappture.RapXML('curve.xml')
+        res = io.outputs_to_arrays()
+        assert list(res.keys()) == list(io.info.out_df.index)
+        for path, data in res.items():
+            assert data['type'] == 'curve'
+            val = io[path + '.component.xy'].value
+            assert np.allclose(data['x'], val[:, 0])
+            assert np.allclose(data['y'], val[:, 1])
+        single = res['output.curve(single)']
+        assert single['label'] == io.info.out_df.loc['output.curve(single)', 'Label']
+
+    def test_histograms(self):
+        io = rappture.RapXML('hist_run.xml')
+        res = io.outputs_to_arrays()
+        ex = res['output.histogram(example)']
+        assert np.allclose(ex['x'], [1, 2, 4, 6, 7])
+        assert np.allclose(ex['y'], [0.99, 0.34, 0.57, 0.22, 0.11])
+        assert ex['xunits'] == 's' and ex['yunits'] == 'V'
+        assert res['output.histogram(namevalue)']['x'][0] == 'Bengal Tigers'
+        width = res['output.histogram(width)']
+        assert width['x'][0] == 'Bengal Tigers'
+        assert len(width['width']) == len(width['y'])
+
+    def test_numbers(self):
+        io = rappture.RapXML('number.xml')
+        res = io.outputs_to_arrays()
+        assert res['output.number(outt)']['units'] == 'K'
+        assert res['output.number(outt)']['value'] == io['output.number(outt)'].value
+
+    def test_frame(self):
+        io = rappture.RapXML('hist_run.xml')
+        res = io.outputs_to_arrays()
+        df = io.to_frame()
+        assert list(df.columns) == ['Path', 'Label', 'Group', 'Type',
+                                    'X', 'Y', 'XUnits', 'YUnits']
+        assert len(df) == sum(len(np.atleast_1d(d.get('y', 0))) for d in res.values())
+        ex = df[df.Path == 'output.histogram(example)']
+        assert np.allclose(ex.Y.values, res['output.histogram(example)']['y'])
+
+    def test_frame_numbers(self):
+        io = rappture.RapXML('number.xml')
+        df = io.to_frame()
+        row = df[df.Path == 'output.number(outt)']
+        assert len(row) == 1
+        assert row.YUnits.values[0] == 'K'
+
+    def test_lazy_numbers(self):
+        # numbers are read through the lazy tree, not left as NaN
+        from hublib.rappture.lazy import LazyTree
+        LazyTree.MIN_SIZE = 0
+        try:
+            io = rappture.RapXML('number.xml', lazy=True)
+        finally:
+            LazyTree.MIN_SIZE = 4096
+        eager = rappture.RapXML('number.xml').outputs_to_arrays()
+        res = io.outputs_to_arrays()
+        assert res['output.number(outt)']['value'] == eager['output.number(outt)']['value']
+        assert not np.isnan(res['output.number(outt)']['value'])
+
+    def test_paths(self, tmpdir):
+        # outputs sharing a tag are told apart by id, as Node paths are
+        fname = str(tmpdir.join('run.xml'))
+        with open(fname, 'w') as f:
+            f.write('<run><output>'
+                    '<integer id="a"><current>1</current></integer>'
+                    '<integer id="b"><current>2</current></integer>'
+                    '<integer id=""><current>3</current></integer>'
+                    '</output></run>')
+        io = rappture.RapXML(fname)
+        res = io.outputs_to_arrays()
+        assert list(res) == ['output.integer(a)', 'output.integer(b)', 'output.integer()']
+        for path, data in res.items():
+            assert data['value'] == int(io[path].value)
@@ -0,0 +1,67 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+from lxml import etree as ET
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+from hublib.rappture.node import PathIndex, _to_xpath
+
+
+def all_paths(tree):
+    # every rappture path in the tree, with and without ids
+    res = []
+
+    def walk(elem, paths):
+        for child in elem:
+            if callable(child.tag):
+                continue
+            comps = [child.tag]
+            if child.get('id') is not None:
+                comps.append('%s(%s)' % (child.tag, child.get('id')))
+            cpaths = [p + '.' + c if p else c for p in paths for c in comps]
+            res.extend(cpaths)
+            walk(child, cpaths)
+    walk(tree.getroot(), [''])
+    return res
+
+
+class TestPathIndex:
+
+    @pytest.mark.parametrize('fname', ['number.xml', 'curve.xml', 'log.xml',
+                                       'CNTbands_run.xml', 'hist_run.xml'])
+    def test_matches_find(self, fname):
+        tree = ET.parse(fname)
+        index = PathIndex(tree)
+        for path in all_paths(tree):
+            assert index.find(path) is tree.find(_to_xpath(path))
+
+    def test_missing(self):
+        io = rappture.RapXML('number.xml')
+        assert io.pindex.find('input.number(nosuchid)') is None
+        assert io['input.number(nosuchid)'] is None
+
+    def test_create(self):
+        io = rappture.RapXML('number.xml')
+        assert io['input.number(temperature).current'].value is not None
+        io['output.number(newnum).current'] = 42
+        assert io['output.number(newnum)'].rvalue == '42'
+        for path in all_paths(io.tree):
+            assert io.pindex.find(path) is io.tree.find(_to_xpath(path))
+
+    def test_create_ambiguous(self):
+        # 'output.number.current' resolves to the first number with a
+        # current, wherever it was added.
+        io = rappture.RapXML('number.xml')
+        io.pindex.build()
+        io['output.number(outv).new'] = 1
+        io['output.number(outt).new'] = 2
+        assert io['output.number.new'].rvalue == '2'
+        for path in all_paths(io.tree):
+            assert io.pindex.find(path) is io.tree.find(_to_xpath(path))
+
+    def test_xpath(self):
+        io = rappture.RapXML('log.xml')
+        log = io['output.log(output_log)']
+        assert log['about/label'].value == "Output Log"
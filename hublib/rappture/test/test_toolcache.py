@@ -0,0 +1,144 @@
+from __future__ import print_function
+import pytest
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath('../../..'))
+import hublib.rappture as rappture
+from hublib.rappture import toolcache
+from hublib.rappture.rappture import RapXML, RapXMLInfo
+
+TOOL = """<?xml version="1.0"?>
+<run>
+<tool><about>Cache test</about></tool>
+<input>
+    <number id="temp">
+        <about><label>Temperature</label></about>
+        <units>K</units>
+        <default>300K</default>
+    </number>
+    <loader>
+        <about><label>Example</label></about>
+        <example>*.xml</example>
+        <default>a.xml</default>
+    </loader>
+    <string id="name">
+        <about><label>Name</label></about>
+        <default>none</default>
+    </string>
+</input>
+<output>
+    <number id="out">
+        <about><label>Result</label></about>
+    </number>
+</output>
+</run>
+"""
+
+EXAMPLE = """<?xml version="1.0"?>
+<run>
+<about><label>%s</label></about>
+<input>
+    <string id="name"><current>%s</current></string>
+</input>
+</run>
+"""
+
+
+def make_tool(tdir, fname='tool.xml', cache=True):
+    # a Tool without the session setup
+    tool = RapXML.__new__(RapXML)
+    tool.dirname = tdir
+    RapXML.__init__(tool, os.path.join(tdir, 'rappture', fname), cache=cache)
+    return tool
+
+
+class TestToolCache:
+
+    @pytest.fixture(autouse=True)
+    def tooldir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('HUBLIB_CACHE', str(tmp_path / 'cache'))
+        monkeypatch.delenv('HUBLIB_NO_CACHE', raising=False)
+        exdir = tmp_path / 'tool' / 'rappture' / 'examples'
+        exdir.mkdir(parents=True)
+        (tmp_path / 'tool' / 'rappture' / 'tool.xml').write_text(TOOL)
+        (exdir / 'a.xml').write_text(EXAMPLE % ('First', 'alpha'))
+        (exdir / 'b.xml').write_text(EXAMPLE % ('Second', 'beta'))
+        self.tdir = str(tmp_path / 'tool')
+        self.exdir = exdir
+
+    def cached(self):
+        return os.listdir(toolcache.cache_dir())
+
+    def test_warm_start(self):
+        cold = make_tool(self.tdir)
+        assert len(self.cached()) == 1
+        warm = make_tool(self.tdir)
+        assert str(warm.xml()) == str(cold.xml())
+        assert warm['input.number(temp).current'].value == 300
+        assert warm['input.string(name).current'].value == 'alpha'
+        for df in ['in_df', 'out_df', 'loader_df']:
+            assert getattr(warm.info, df).equals(getattr(cold.info, df))
+        assert warm.info.input_path('Example') == 'input.loader'
+        assert warm.info.output_path('Result') == 'output.number(out)'
+
+    def test_rows_use_new_tree(self):
+        make_tool(self.tdir)
+        warm = make_tool(self.tdir)
+        for elem in warm.info.irows:
+            assert elem.getroottree().getroot() is warm.tree.getroot()
+        warm['input.number(temp).about.label'] = 'T'
+        assert warm.info.in_df.equals(RapXMLInfo(warm).in_df)
+        warm.set_input('T', '310K')
+        assert warm['input.number(temp).current'].value == 310
+
+    def test_invalidate_tool(self):
+        make_tool(self.tdir)
+        fname = os.path.join(self.tdir, 'rappture', 'tool.xml')
+        with open(fname, 'w') as f:
+            f.write(TOOL.replace('300K', '400K'))
+        tool = make_tool(self.tdir)
+        assert tool['input.number(temp).current'].value == 400
+        # the old file is removed
+        assert len(self.cached()) == 1
+
+    def test_invalidate_example(self):
+        make_tool(self.tdir)
+        ex = self.exdir / 'a.xml'
+        ex.write_text(EXAMPLE % ('First', 'gamma'))
+        st = os.stat(str(ex))
+        os.utime(str(ex), (st.st_atime, st.st_mtime + 10))
+        tool = make_tool(self.tdir)
+        assert tool['input.string(name).current'].value == 'gamma'
+
+    def test_version(self, monkeypatch):
+        make_tool(self.tdir)
+        key = toolcache.tool_key(b'x', self.tdir)
+        monkeypatch.setattr(toolcache, '__version__', '999')
+        assert toolcache.tool_key(b'x', self.tdir) != key
+        make_tool(self.tdir)
+        assert len(self.cached()) == 1
+
+    def test_other_tools_kept(self, tmp_path):
+        make_tool(self.tdir)
+        other = str(tmp_path / 'other')
+        os.makedirs(os.path.join(other, 'rappture'))
+        with open(os.path.join(other, 'rappture', 'tool.xml'), 'w') as f:
+            f.write(TOOL)
+        make_tool(other)
+        assert len(self.cached()) == 2
+
+    def test_disabled(self, monkeypatch):
+        make_tool(self.tdir, cache=False)
+        assert not os.path.exists(toolcache.cache_dir())
+        monkeypatch.setenv('HUBLIB_NO_CACHE', '1')
+        make_tool(self.tdir)
+        assert not os.path.exists(toolcache.cache_dir())
+
+    def test_bad_cache_file(self):
+        make_tool(self.tdir)
+        for name in self.cached():
+            with open(os.path.join(toolcache.cache_dir(), name), 'wb') as f:
+                f.write(b'garbage')
+        tool = make_tool(self.tdir)
+        assert tool['input.string(name).current'].value == 'alpha'
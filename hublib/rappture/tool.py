@@ -9,13 +9,15 @@ from .rappture import RapXML
 
 
 class Tool(RapXML):
-    def __init__(self, tool):
+    def __init__(self, tool, cache=True):
         """
         tool can be any of the following:
 
         - Path to a tool.xml file.
         - Name of a published tool.  The current version will be run.
 
+        Set cache to False to always prepare tool.xml from scratch
+        instead of using the copy saved by an earlier session.
         """
         dirname, xml = os.path.split(tool)
         if dirname == "":
@@ -52,9 +54,16 @@ class Tool(RapXML):
         self.dirname = dirname
         self.sessdir = sessdir
         self.tool = xml
-        RapXML.__init__(self, xml)
+        RapXML.__init__(self, xml, cache=cache)
 
-    def run(self, verbose=False):
+    def run(self, verbose=False, lazy=False):
+        """
+        Runs the tool with the current inputs and loads the results.
+
+        :param verbose: Print the command.
+        :param lazy: Read curve data and images from the run file
+            only when they are used.
+        """
         with open(self.driver_name, 'w') as f:
             f.write(str(self.xml(pretty=False, header=True)))
 
@@ -91,7 +100,7 @@ class Tool(RapXML):
                 break
 
         if run_name is not None:
-            self.tree = ET.parse(run_name)
+            self._load(run_name, lazy)
 
         os.chdir(cwd)
         self.reload()
@@ -0,0 +1,129 @@
+from __future__ import print_function
+import hashlib
+import os
+import pickle
+import tempfile
+from hublib import __version__
+
+"""
+On-disk cache of prepared tool.xml files.
+
+Opening a tool parses tool.xml, copies defaults to current values,
+applies the default loader examples and builds the info tables.
+The result only depends on tool.xml and the example files, so it
+is saved keyed by a hash of tool.xml, the size and mtime of every
+example and the hublib version.  The next time the same tool is
+opened, the prepared tree and the tables are read back instead.
+Each tool directory keeps only its newest file.
+
+The cache directory is $HUBLIB_CACHE/rappture, or
+~/.cache/hublib/rappture.  Set HUBLIB_NO_CACHE to disable it.
+"""
+
+# change this when the saved data changes
+FORMAT = 1
+
+
+def cache_dir():
+    base = os.environ.get('HUBLIB_CACHE')
+    if base is None:
+        base = os.path.join(os.path.expanduser('~'), '.cache', 'hublib')
+    return os.path.join(base, 'rappture')
+
+
+def enabled():
+    return not os.environ.get('HUBLIB_NO_CACHE')
+
+
+def _example_stats(dirname):
+    # (path, size, mtime) of everything under rappture/examples
+    exdir = os.path.join(dirname, 'rappture', 'examples')
+    stats = []
+    for root, dirs, files in os.walk(exdir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            stats.append((path, st.st_size, st.st_mtime))
+    return stats
+
+
+def tool_key(data, dirname):
+    """
+    Returns the cache key for a tool.
+
+    :param data: Contents of tool.xml (bytes).
+    :param dirname: The tool directory.
+    """
+    # <hash of the directory>-<hash of the contents>, so save can
+    # find the older files of the same tool
+    dirname = os.path.abspath(dirname)
+    h = hashlib.sha1()
+    h.update(('%d\0%s\0%s\0' % (FORMAT, __version__, dirname)).encode('utf-8'))
+    h.update(data)
+    h.update(repr(_example_stats(dirname)).encode('utf-8'))
+    return '%s-%s' % (_dir_hash(dirname), h.hexdigest())
+
+
+def _dir_hash(dirname):
+    return hashlib.sha1(dirname.encode('utf-8')).hexdigest()[:16]
+
+
+def _fname(key):
+    return os.path.join(cache_dir(), key + '.pkl')
+
+
+def _prune(cdir, key):
+    # remove the files saved for older versions of the same tool, and
+    # files named before keys had a directory prefix
+    prefix = key.split('-')[0] + '-'
+    for name in os.listdir(cdir):
+        if not name.endswith('.pkl') or name == key + '.pkl':
+            continue
+        if name.startswith(prefix) or '-' not in name:
+            try:
+                os.remove(os.path.join(cdir, name))
+            except OSError:
+                pass
+
+
+def load(key):
+    """
+    Returns the saved state for key, or None.
+    """
+    try:
+        with open(_fname(key), 'rb') as f:
+            state = pickle.load(f)
+    except Exception:
+        # missing, unreadable or from another python
+        return None
+    if not isinstance(state, dict) or state.get('format') != FORMAT:
+        return None
+    return state
+
+
+def save(key, state):
+    """
+    Saves state for key, replacing what was saved for the same
+    tool directory.  Errors are ignored; the cache is only an
+    optimization.
+    """
+    state = dict(state, format=FORMAT)
+    try:
+        cdir = cache_dir()
+        if not os.path.isdir(cdir):
+            os.makedirs(cdir)
+        fd, tmp = tempfile.mkstemp(dir=cdir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, _fname(key))
+        except Exception:
+            os.remove(tmp)
+            raise
+        _prune(cdir, key)
+    except Exception:
+        pass
@@ -1,5 +1,11 @@
 # misc functions for rappture
 
+# elements listed in the input and output tables
+INFO_TAGS = set(['number', 'integer', 'string', 'log', 'boolean', 'choice',
+                 'drawing', 'field', 'flow', 'histogram', 'image', 'mesh',
+                 'period element', 'structure', 'curve', 'table'])
+
+
 def efind(elem, path):
     try:
         text = elem.find(path).text
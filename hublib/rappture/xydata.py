@@ -0,0 +1,49 @@
+from __future__ import print_function
+import numpy as np
+from . import encoding
+
+"""
+Reading and writing curve data in <xy> elements.
+"""
+
+# rows formatted per string operation
+FORMAT_ROWS = 1 << 16
+
+
+def parse_xy(text, ncols=2):
+    """
+    Returns a float64 array with ncols columns from the text of
+    an <xy> element.  The text may be zb64 or b64 encoded.
+    """
+    if text is None:
+        return np.empty((0, ncols))
+    if encoding.is_encoded(text):
+        text = encoding.decode(text).decode('utf-8')
+    return np.fromstring(text, sep=' \n').reshape(-1, ncols)
+
+
+def format_xy(data, fmt='%.6e', compress=False):
+    """
+    Returns <xy> text for a 2D array, one row per line.  fmt is a
+    format for every column, or a list of one per column.
+    If compress is True, the text is zb64 encoded.
+
+    This gives the same text as np.savetxt(fmt=' '.join([fmt] * ncols)),
+    but formats many rows with a single string operation.
+    """
+    data = np.asarray(data)
+    if data.dtype.kind not in 'iu':
+        data = data.astype(float)
+    if data.ndim == 1:
+        data = data.reshape(-1, 2)
+    if isinstance(fmt, str):
+        fmt = [fmt] * data.shape[1]
+    line = ' '.join(fmt) + '\n'
+    res = []
+    for i in range(0, len(data), FORMAT_ROWS):
+        block = data[i:i + FORMAT_ROWS]
+        res.append((line * len(block)) % tuple(block.ravel().tolist()))
+    text = ''.join(res)
+    if compress:
+        return encoding.encode(text.encode('utf-8'))
+    return text
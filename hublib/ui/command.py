@@ -3,17 +3,15 @@ from __future__ import print_function
 import ipywidgets as w
 import sys
 import os
-import fcntl
-import collections
+import codecs
 import signal
-import threading
-import subprocess
-import select
 import time
 import shutil
-from queue import Queue
-from joblib import Memory
-import uuid
+import tempfile
+from hublib.cache import ResultCache
+from hublib.cmd.supervisor import get_supervisor
+from .render import TextRenderer, OutputQueue, FPS
+from .scrollback import Scrollback, MAXLINES, MAXBYTES
 
 color_rect = '<svg width="4" height="20"><rect width="4" height="20" style="fill:%s"/></svg>  %s'
 colors = ["rgb(60,179,113)", "rgb(255,165,0)", "rgb(255,99,71)", "rgb(51,153,255"]
@@ -40,9 +38,25 @@ class RunCommand(object):
         is written to the submit output widget, otherwise that widget
         will be empty when this is used.
     :param cachename: Optional. Name of the tool or other unique
-        name that will be used for the cache directory.
+        name that will be used for the cache directory.  Cached
+        results are read-only hard links shared by every run with the
+        same contents, so a done_func must not chmod them or change
+        them in place; copy a file before changing it.
     :param cachecb: Optional function to call when the cache is cleared.
+    :param version: Optional tool version.  It is part of the names
+        make_rname returns, so new versions do not use old results.
+    :param cachepolicy: Optional limits on the cache size, a
+        hublib.cache.Policy or a dict with max_bytes, max_age and
+        max_entries.  Least recently used results are removed in the
+        background.  Default is the limits saved for the cache with
+        'hublib-cache policy'.
     :param width: Default is 'auto'.
+    :param fps: Most times a second the output widget is updated
+        while the command runs.  Default is 10.
+    :param maxlines: Most lines of output shown.  Default is 5000.
+    :param maxbytes: Most bytes of output shown.  Default is 1 MiB.
+        All of the output is kept in a temporary log file,
+        self.cbuf.logfile, and in the cache.
     """
 
     SIGNALS_TO_NAMES_DICT = dict((getattr(signal, n), n)
@@ -58,21 +72,27 @@ class RunCommand(object):
                  cachename=None,
                  cachedir=None,
                  cachecb=None,
-                 showcache=True):
+                 showcache=True,
+                 version=None,
+                 cachepolicy=None,
+                 fps=FPS,
+                 maxlines=MAXLINES,
+                 maxbytes=MAXBYTES):
         self.label = label
         self.tooltip = tooltip
         self.start_func = start_func
         self.done_func = done_func
         self.outcb = outcb
         self.cachename = cachename
-        self.q = Queue()
         self.thread = 0
+        self.proc = None
         self.status = None
         self.output = None
         self.width = width
         self.cachecb = cachecb
         self.showcache = showcache
-        self.cbuf = collections.deque(maxlen=200)  # circular buffer
+        self.cbuf = Scrollback(maxlines, maxbytes, spill=True)
+        self.usage = None  # resources used by the last run
 
         if start_func is None:
             print("start_func is required", file=sys.stderr)
@@ -89,19 +109,15 @@ class RunCommand(object):
                     sys.exit(1)
 
             self.cachedir = os.path.join(os.path.expanduser(cachedir), cachename)
+            # table of the joblib cache older versions used
             self.cachetabdir = os.path.join(self.cachedir, '.cache_table')
-            if not os.path.isdir(self.cachedir):
-                os.makedirs(self.cachedir)
-            memory = Memory(cachedir=self.cachetabdir, verbose=0)
-
-            @memory.cache
-            def make_rname(*args):
-                # uuid should be unique, but check just in case
-                while True:
-                    fname = str(uuid.uuid4()).replace('-', '')
-                    if not os.path.isdir(os.path.join(self.cachedir, fname)):
-                        break
-                return fname
+            self.cache = ResultCache(self.cachedir, cachepolicy)
+            self.cache.evict(background=True)
+
+            def make_rname(*args, **kwargs):
+                # name for results of a run with these inputs
+                kwargs.setdefault('version', version)
+                return self.cache.key(*args, **kwargs)
 
             self.make_rname = make_rname
 
@@ -111,6 +127,7 @@ class RunCommand(object):
             button_style='success'
         )
         self.output = w.Textarea(layout={'width': '100%', 'height': '400px'})
+        self.renderer = TextRenderer(self.output, self.cbuf.text, fps)
         self.acc = w.Accordion(children=[self.output])
         self.acc.set_title(0, 'Output')
         self.acc.selected_index = None
@@ -130,8 +147,8 @@ class RunCommand(object):
         if self.but.description == 'Cancel':
             self.but.description = 'Stopping'
             self.but.button_style = 'warning'
-            if self.pid:
-                os.killpg(self.pid, signal.SIGTERM)
+            if self.proc:
+                self.proc.signal(signal.SIGTERM)
 
     def run(self, cmd, runname=None):
         """
@@ -159,40 +176,27 @@ class RunCommand(object):
             if runname is None:
                 print("ERROR: run method should be called a runname when caching is on.", file=sys.stderr)
                 return
-            rdir = os.path.join(self.cachedir, runname)
-            tfile = os.path.join(rdir, '.submit_time')
-            if os.path.exists(tfile):
+            entry = self.cache.lookup(runname)
+            if entry is not None:
                 # cache hit
+                rdir = self.cache.path(runname)
+                tfile = os.path.join(rdir, '.submit_time')
                 try:
                     with open(tfile, 'r') as f:
                         etime = f.read() 
                 except:
                     etime = "unknown"
                 
-                try:
-                    ofile = os.path.join(self.rdir, '.output')
-                    with open(ofile, 'r') as f:
-                        self.output.value = f.read() 
-                except:
-                    self.output.value = ''
-                    self.cbuf.clear()
-
-
-                try:
-                    ctime = time.localtime(os.path.getctime(tfile))
-                    ctime = time.strftime('%d %b %Y', ctime)
-                except:
-                    ctime = 'unknown'
+                ctime = time.strftime('%d %b %Y', time.localtime(entry.created))
                 errState = "Cached: (%s, RunTime: %s)" % (ctime, etime)
 
                 self.status = self.statusbar(0, errState)
                 outfile = os.path.join(rdir, '.output')
                 try:
-                    with open(outfile) as f:
-                        self.output.value = f.read()
+                    self.cbuf.load(outfile)
                 except:
-                    self.output.value = ''
                     self.cbuf.clear()
+                self.renderer.flush()
                 self.w.children = [self.acc, self.status, self.but]
                 # notify callback we are finished
                 self.cached = True
@@ -205,24 +209,18 @@ class RunCommand(object):
         self.but.description = 'Cancel'
         self.but.button_style = 'danger'
 
-        self.thread = threading.Thread(target=poll_thread, args=(cmd, self))
-        self.thread.start()
-        self.pid = os.getpgid(self.q.get())
+        self.proc = start_command(cmd, self)
+        self.pid = self.proc.pid if self.proc else 0
 
     def clear_cache(self, x):
         x.disabled = True
         if x.description == "Clear All":
-            if os.path.exists(self.cachedir):
-                shutil.rmtree(self.cachedir)
-            if os.path.exists(self.cachetabdir):
-                shutil.rmtree(self.cachetabdir)
+            self.cache.clear()
             if self.cachecb:
                 self.cachecb()
             return
 
-        rdir = os.path.join(self.cachedir, self.runname)
-        if os.path.exists(rdir):
-            shutil.rmtree(rdir)
+        self.cache.remove(self.runname)
         if self.cachecb:
             self.cachecb()
 
@@ -271,38 +269,38 @@ class RunCommand(object):
         self.w.layout.visibility = 'hidden'
   
     def copy_files(self, start_time, elapsed_time, errNum):
-        rdir = os.path.join(self.cachedir, self.runname)
-
-        # shouldn't happen, but overwrite if it does
-        if os.path.exists(rdir):
-            shutil.rmtree(rdir)
-
-        # don't copy canceled runs
+        # don't cache canceled runs
         if errNum > 0:
+            self.cache.remove(self.runname)
             return
 
         # Results are in current working directory.
-        # Use the timestamp to copy all newer files to the cacheName.
-        os.makedirs(rdir)
-
-        # save output to cache dir
-        outfile = os.path.join(rdir, '.output')
-        with open(outfile, 'w') as f:
-            f.write(self.output.value)
-
-        files = os.listdir('.')
-        for f in files:
-            if os.path.getmtime(f) > start_time:
-                shutil.copy2(f, rdir)
-
-        with open(os.path.join(rdir, '.submit_time'), 'w') as f:
-            f.write(pretty_time_delta(elapsed_time))
+        # Use the timestamp to store all newer files in the cache.
+        files = dict((f, f) for f in os.listdir('.')
+                     if os.path.isfile(f) and os.path.getmtime(f) > start_time)
 
-        return rdir
-
-
-def poll_thread(cmd, self):
-    # set the output encoding
+        # save output and run time with the results
+        tmp = tempfile.mkdtemp(dir=self.cachedir, prefix='.tmp-')
+        try:
+            files['.output'] = os.path.join(tmp, '.output')
+            self.cbuf.save(files['.output'])
+            files['.submit_time'] = os.path.join(tmp, '.submit_time')
+            with open(files['.submit_time'], 'w') as f:
+                f.write(pretty_time_delta(elapsed_time))
+            self.cache.put(self.runname, files, etime=elapsed_time,
+                           move=['.output', '.submit_time'])
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.cache.evict(background=True)
+
+        return self.cache.path(self.runname)
+
+
+def start_command(cmd, self):
+    # Start cmd with the shared supervisor.  Its reactor thread only
+    # queues the output; this widget's OutputQueue thread decodes it,
+    # calls outcb and finishes the run, so slow callbacks and done_func
+    # cannot hold up other commands.
     outenc = sys.stdout.encoding
 
     start_time = time.time()
@@ -311,68 +309,44 @@ def poll_thread(cmd, self):
 
     self.status = self.statusbar(errNum, errState)
     self.w.children = [self.acc, self.status, self.but]
-    
+
+    decoders = dict((name, codecs.getincrementaldecoder(outenc)('replace'))
+                    for name in ['stdout', 'stderr'])
+
+    def output(name, data):
+        c = decoders[name].decode(data)
+        if not c:
+            return
+        if name == 'stderr':
+            # the scrollback marks stderr lines with <STDERR>
+            self.cbuf.append(c, 'stderr')
+        else:
+            if self.outcb:
+                c = self.outcb(c)
+            # write c to output widget
+            if c:
+                self.cbuf.append(c)
+        self.renderer.changed()
+
+    queue = OutputQueue(output, lambda proc: finish_command(cmd, self, proc))
+    self.thread = queue.thread
     try:
-        child = subprocess.Popen(
-            cmd, bufsize=4096,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=True,
-            close_fds=True,
-            preexec_fn=os.setsid)
+        return get_supervisor().start(cmd, shell=True, session=True,
+                                      on_output=queue.put, on_exit=queue.close)
     except Exception as e:
         print(e)
-        return
+        # ends the queue's thread without finishing a run
+        queue.done = None
+        queue.close(None)
+        return None
 
-    self.q.put(child.pid)
-    poller = select.poll()
-    poller.register(child.stdout, select.POLLIN)
-    poller.register(child.stderr, select.POLLIN)
 
-    numfds = 2
-    while numfds > 0:
-        try:
-            r = poller.poll(1)
-        except select.error as err:
-            print(err, file=sys.stderr)
-            break
-        for fd, flags in r:
-            if flags & (select.POLLIN | select.POLLPRI):
-                c = os.read(fd, 4096).decode(outenc)
-                if fd == child.stderr.fileno():
-                    # add some special characters to indicate stderr
-                    if c.endswith('\n'):
-                        c = c[:-1]
-                    c = u'<STDERR> ' + c + u' </STDERR>\n'
-                elif self.outcb:
-                    c = self.outcb(c)
-                # write c to output widget
-                if c:
-                    self.cbuf.append(c)
-            if flags & (select.POLLHUP | select.POLLERR):
-                poller.unregister(fd)
-                numfds -= 1
-        self.output.value = ''.join(self.cbuf)
-
-    # drain buffers
-    for fp in [child.stdout, child.stderr]:
-        fcntl.fcntl(fp, fcntl.F_SETFL, os.O_NONBLOCK)
-        while True:
-            c = fp.read(4096).decode(outenc)
-            if len(c) == 0:
-                break
-            if fp == child.stderr:
-                if c.endswith('\n'):
-                    c = c[:-1]
-                c = u'<STDERR> ' + c + u' </STDERR>\n'
-            elif self.outcb:
-                self.outcb(c)
-            # write c to output widget
-            self.cbuf.append(c)
-    self.output.value = ''.join(self.cbuf)
-    
-    pid, exitStatus = os.waitpid(child.pid, 0)
+def finish_command(cmd, self, proc):
+    start_time = proc.start
+    exitStatus = proc.status
+    self.usage = proc.usage
     elapsed_time = time.time() - start_time
+    self.renderer.flush()
 
     self.but.description = self.label
     self.but.button_style = 'success'  # green
@@ -393,11 +367,12 @@ def poll_thread(cmd, self):
             errStr = "\"%s\" failed w/ exit code %d\n" % (cmd, exitStatus)
             errNum = 2
             errState = "Last Run: Failed"
-        c = unicode('\n' + '='*50 + '\n' + errStr + '\n' + '='*50 + '\n')
+        c = '\n' + '='*50 + '\n' + errStr + '\n' + '='*50 + '\n'
         self.cbuf.append(c)
-        self.output.value = ''.join(self.cbuf)
+        self.renderer.flush()
 
     errState += ".  Run Time: %s" % time.strftime("%H:%M:%S", time.gmtime(elapsed_time))
+    errState += ".  " + self.usage.summary()
     self.status = self.statusbar(errNum, errState)
     self.w.children = [self.acc, self.status, self.but]
 
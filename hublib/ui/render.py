@@ -0,0 +1,179 @@
+"""
+Throttled rendering of command output into widgets.
+
+Setting a Textarea's value sends the whole text to the browser, so
+doing it for every chunk a chatty command writes keeps a kernel core
+and the websocket busy.  A TextRenderer coalesces changes and sets
+the value at most fps times a second, and only if the text changed.
+One clock thread serves all renderers.
+
+OutputQueue takes a command's output off the supervisor's reactor
+thread, so slow widget code holds up only its own command.
+"""
+from __future__ import print_function
+import collections
+import heapq
+import sys
+import threading
+import time
+import traceback
+
+FPS = 10
+
+
+class _Clock(object):
+    # Calls renderers' _render when they are due, from one thread.
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.heap = []
+        self.count = 0
+        self.thread = None
+
+    def schedule(self, due, renderer):
+        with self.cond:
+            self.count += 1
+            heapq.heappush(self.heap, (due, self.count, renderer))
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='TextRenderer')
+                self.thread.daemon = True
+                self.thread.start()
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.heap:
+                    self.cond.wait()
+                due, _, renderer = self.heap[0]
+                wait = due - time.time()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                heapq.heappop(self.heap)
+            try:
+                renderer._render()
+            except Exception:
+                print(traceback.format_exc(), file=sys.stderr)
+
+
+_clock = _Clock()
+
+
+class TextRenderer(object):
+    """
+    Keeps widget.value up to date with source() without setting it
+    more than fps times a second.
+
+    :param widget: A widget with a value, like a Textarea.
+    :param source: Function returning the text to show.
+    :param fps: Maximum updates per second.  Default 10.
+    """
+
+    def __init__(self, widget, source, fps=FPS):
+        if fps <= 0:
+            raise ValueError('fps must be positive.')
+        self.widget = widget
+        self.source = source
+        self.interval = 1.0 / fps
+        self.last = 0
+        self.frames = 0
+        self._lock = threading.Lock()
+        # renders one at a time, without holding up changed()
+        self._render_lock = threading.Lock()
+        self._dirty = False
+        self._scheduled = False
+
+    def changed(self):
+        """
+        Notes that the text changed.  It is shown on the next frame.
+        """
+        with self._lock:
+            self._dirty = True
+            if self._scheduled:
+                return
+            self._scheduled = True
+            due = max(time.time(), self.last + self.interval)
+        _clock.schedule(due, self)
+
+    def flush(self):
+        """
+        Shows the text now, if it changed.
+        """
+        with self._lock:
+            self._dirty = True
+        self._render()
+
+    def _render(self):
+        with self._render_lock:
+            with self._lock:
+                self._scheduled = False
+                if not self._dirty:
+                    return
+                self._dirty = False
+                self.last = time.time()
+            text = self.source()
+            if text != self.widget.value:
+                self.frames += 1
+                self.widget.value = text
+
+
+class OutputQueue(object):
+    """
+    Hands a command's output from the supervisor's reactor thread to
+    a thread of its own.  Pass put as the command's on_output and
+    close as its on_exit.  The reactor only appends the bytes; the
+    queue's thread calls handler(name, data) with them, in order, and
+    then done(proc) once the command has exited.  While more than
+    limit bytes are waiting the command is paused.
+
+    thread -- the queue's thread, which ends after done returns
+    """
+
+    def __init__(self, handler, done=None, limit=1 << 20):
+        self.handler = handler
+        self.done = done
+        self.limit = limit
+        self.chunks = collections.deque()
+        self.size = 0
+        self.proc = None
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name='CommandOutput')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, proc, name, data):
+        with self.cond:
+            self.chunks.append((name, bytes(data)))
+            self.size += len(data)
+            if self.size > self.limit:
+                proc.pause()
+            self.proc = proc
+            self.cond.notify()
+
+    def close(self, proc):
+        with self.cond:
+            self.proc = proc
+            self.closed = True
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.chunks and not self.closed:
+                    self.cond.wait()
+                chunks, self.chunks = self.chunks, collections.deque()
+                self.size = 0
+                proc = self.proc
+                if proc is not None:
+                    proc.resume()
+            if not chunks:
+                break
+            for name, data in chunks:
+                try:
+                    self.handler(name, data)
+                except Exception:
+                    print(traceback.format_exc(), file=sys.stderr)
+        if self.done is not None:
+            self.done(proc)
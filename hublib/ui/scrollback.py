@@ -0,0 +1,265 @@
+"""
+A scrollback buffer for command output.
+
+Only the last lines are kept in memory, limited both by number of
+lines and by size, so a widget's memory use does not depend on how
+much a command writes.  The full output can also be written to a log
+file as it arrives, so it can still be saved or downloaded.
+"""
+from __future__ import print_function
+import codecs
+import collections
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+MAXLINES = 5000
+MAXBYTES = 1 << 20
+STDERR_FORMAT = u'<STDERR> %s </STDERR>\n'
+
+
+def _open(f, mode):
+    return io.open(f, mode, encoding='utf-8', errors='replace')
+
+
+def _size(text):
+    # bytes of text in UTF-8
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-8', 'replace'))
+
+
+class Scrollback(object):
+    """
+    The last lines of a command's output.
+
+    :param maxlines: Most complete lines kept.
+    :param maxbytes: Most bytes (as UTF-8) kept.
+    :param spill: True to write all output to a temporary log file,
+        or the name of a log file.  Lines are logged as they are
+        finished.  The file is removed by clear()
+        or when the Scrollback is deleted, unless it was named.
+    :param encoding: Encoding used by write.
+    :param stderr_format: Format for complete lines from stderr.
+
+    Appending is O(1) per line.  Lines from stdout and stderr are
+    kept whole even if their chunks arrive interleaved.
+    """
+
+    def __init__(self, maxlines=MAXLINES, maxbytes=MAXBYTES, spill=False,
+                 encoding='utf-8', stderr_format=STDERR_FORMAT):
+        if maxlines < 1 or maxbytes < 1:
+            raise ValueError('maxlines and maxbytes must be positive.')
+        self.maxlines = maxlines
+        self.maxbytes = maxbytes
+        self.encoding = encoding
+        self.stderr_format = stderr_format
+        self.lines = collections.deque()
+        self.nbytes = 0
+        self.dropped = 0
+        self.total = 0
+        self._partial = {}
+        self._decoders = {}
+        self._lock = threading.Lock()
+        self._spill = spill
+        self._log = None
+        self.logfile = None
+        # True when logfile is a file given to load, not ours to change
+        self._borrowed = False
+        self._open_log()
+
+    def _open_log(self):
+        if not self._spill:
+            return
+        if self._spill is True:
+            fd, self.logfile = tempfile.mkstemp(prefix='hublib-output-', suffix='.log')
+            self._log = _open(fd, 'w')
+        else:
+            self.logfile = self._spill
+            self._log = _open(self.logfile, 'w')
+
+    def _copy_log(self):
+        # Output is added after load: continue in a copy of the loaded file.
+        loaded = self.logfile
+        self._borrowed = False
+        self._open_log()
+        self._log.close()
+        shutil.copyfile(loaded, self.logfile)
+        self._log = _open(self.logfile, 'a')
+
+    def write(self, data, stream='stdout'):
+        """
+        Adds bytes from stream, decoding them incrementally so
+        characters split between chunks come out whole.
+        """
+        dec = self._decoders.get(stream)
+        if dec is None:
+            dec = self._decoders[stream] = codecs.getincrementaldecoder(self.encoding)('replace')
+        self.append(dec.decode(data), stream)
+
+    def append(self, text, stream='stdout'):
+        """
+        Adds text from stream ('stdout' or 'stderr').
+        """
+        if not text:
+            return
+        with self._lock:
+            self.total += len(text)
+            text = self._partial.pop(stream, u'') + text
+            parts = text.split(u'\n')
+            rest = parts.pop()
+            for line in parts:
+                if stream == 'stderr':
+                    line = self.stderr_format % line
+                else:
+                    line += u'\n'
+                self._add(line)
+            if rest:
+                if len(rest) > self.maxbytes:
+                    # log the start of a very long line now
+                    self._write_log(rest[:-self.maxbytes])
+                    rest = rest[-self.maxbytes:]
+                self._partial[stream] = rest
+
+    def _add(self, line):
+        lines = self.lines
+        lines.append(line)
+        self.nbytes += _size(line)
+        self._write_log(line)
+        while len(lines) > self.maxlines or (self.nbytes > self.maxbytes and len(lines) > 1):
+            self.nbytes -= _size(lines.popleft())
+            self.dropped += 1
+
+    def _write_log(self, text):
+        if self._log is None:
+            if not self._borrowed:
+                return
+            self._copy_log()
+        try:
+            self._log.write(text)
+        except (IOError, OSError) as e:
+            print('Output log %s: %s' % (self.logfile, e), file=sys.stderr)
+            self._close_log()
+
+    def _close_log(self):
+        try:
+            self._log.close()
+        except (IOError, OSError):
+            pass
+        self._log = None
+
+    def _unfinished(self):
+        text = u''
+        for stream in sorted(self._partial):
+            line = self._partial[stream]
+            if stream == 'stderr':
+                line = self.stderr_format % line
+            text += line
+        return text
+
+    def text(self):
+        """
+        Returns the lines kept, followed by any unfinished lines.
+        """
+        with self._lock:
+            return u''.join(self.lines) + self._unfinished()
+
+    def save(self, fname):
+        """
+        Writes all the output to fname: a copy of the log if there is
+        one, else the lines kept.  Unfinished lines are included.
+        """
+        with self._lock:
+            if self._log is not None:
+                self._log.flush()
+            logfile = self.logfile
+            text = self._unfinished()
+        if logfile is None:
+            text = self.text()
+        elif os.path.abspath(fname) != logfile or not self._borrowed:
+            shutil.copyfile(logfile, fname)
+        with _open(fname, 'a' if logfile else 'w') as f:
+            f.write(text)
+
+    def load(self, fname, bufsize=1 << 16):
+        """
+        Replaces the contents with the end of the text in fname.
+        Only about maxbytes are read, and fname becomes the log
+        instead of being copied, so loading large output is quick.
+        """
+        with self._lock:
+            self._reset()
+            if self._log is not None:
+                self._close_log()
+            self._remove_log()
+        with open(fname, 'rb') as f:
+            start = max(0, os.fstat(f.fileno()).st_size - self.maxbytes)
+            f.seek(start)
+            dec = codecs.getincrementaldecoder('utf-8')('replace')
+            skip = start > 0
+            for data in iter(lambda: f.read(bufsize), b''):
+                text = dec.decode(data)
+                if skip:
+                    # drop the line the tail starts in the middle of
+                    nl = text.find(u'\n')
+                    if nl < 0:
+                        continue
+                    text = text[nl + 1:]
+                    skip = False
+                self.append(text)
+            self.append(dec.decode(b'', True))
+        with self._lock:
+            # the file's last line is finished, as far as the log goes
+            rest = self._partial.pop('stdout', None)
+            if rest:
+                self._add(rest)
+            if self._spill:
+                self.logfile = os.path.abspath(fname)
+                self._borrowed = True
+
+    def _reset(self):
+        self.lines.clear()
+        self.nbytes = self.dropped = self.total = 0
+        self._partial.clear()
+        self._decoders.clear()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            if self._log is not None:
+                self._close_log()
+            self._remove_log()
+            self._open_log()
+
+    def _remove_log(self):
+        if self._spill is True and self.logfile is not None and not self._borrowed:
+            try:
+                os.remove(self.logfile)
+            except OSError:
+                pass
+        self.logfile = None
+        self._borrowed = False
+
+    def close(self):
+        """
+        Closes and, if temporary, removes the log.
+        """
+        with self._lock:
+            if self._log is not None:
+                self._close_log()
+            self._remove_log()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.text().splitlines(True))
@@ -4,17 +4,15 @@ import ipywidgets as w
 import sys
 import re
 import os
-import fcntl
-import collections
+import codecs
 import signal
-import threading
-import subprocess
-import select
 import time
 import shutil
-from queue import Queue
-from joblib import Memory
-import uuid
+import tempfile
+from hublib.cache import ResultCache
+from hublib.cmd.supervisor import get_supervisor
+from .render import TextRenderer, OutputQueue, FPS
+from .scrollback import Scrollback, MAXLINES, MAXBYTES
 import glob
 
 color_rect = '<svg width="4" height="20"><rect width="4" height="20" style="fill:%s"/></svg>  %s'
@@ -33,19 +31,36 @@ class Submit(object):
     :param done_func: Optional function to be called when the
         submit function is completed.
     :param cachename: Optional. Name of the tool or other unique
-        name that will be used for the cache directory.
+        name that will be used for the cache directory.  Cached
+        results are read-only hard links shared by every run with the
+        same contents, so a done_func must not chmod them or change
+        them in place; copy a file before changing it.
     :param cachecb: Optional function to call when the cache is cleared.
     :param outcb: Optional function to be called when
         standard output is received. Any returned value
         is written to the submit output widget, otherwise that widget
         will be empty when this is used.
     :param show_progress: Show progress bar?  Default is True.
+    :param version: Optional tool version.  It is part of the names
+        make_rname returns, so new versions do not use old results.
+    :param cachepolicy: Optional limits on the cache size, a
+        hublib.cache.Policy or a dict with max_bytes, max_age and
+        max_entries.  Least recently used results are removed in the
+        background.  Default is the limits saved for the cache with
+        'hublib-cache policy'.
     :param width: Default is 'auto'.
+    :param fps: Most times a second the output widget is updated
+        while the command runs.  Default is 10.
+    :param maxlines: Most lines of output shown.  Default is 5000.
+    :param maxbytes: Most bytes of output shown.  Default is 1 MiB.
+        All of the output is kept in a temporary log file,
+        self.cbuf.logfile, and in the cache.
     """
     SIGNALS_TO_NAMES_DICT = dict((getattr(signal, n), n)
         for n in dir(signal) if n.startswith('SIG') and '_' not in n)
 
     CACHEDIR = os.path.expanduser('~/data/results/.submit_cache')
+    # joblib cache older versions used
     CACHETABDIR = os.path.expanduser('~/data/results/.submit_cache_table')
 
     regex = re.compile(r"=SUBMIT-PROGRESS=> aborted=(\d+) finished=(\d+) failed=(\d+) executing=(\d+) waiting=(\d+) setting_up=(\d+) setup=(\d+) %done=(\d*\.\d+|\d+) timestamp=(\d*\.\d+|\d+)")
@@ -60,15 +75,20 @@ class Submit(object):
                  width='auto',
                  cachename=None,
                  cachecb=None,
-                 showcache=True):
+                 showcache=True,
+                 version=None,
+                 cachepolicy=None,
+                 fps=FPS,
+                 maxlines=MAXLINES,
+                 maxbytes=MAXBYTES):
         self.label = label
         self.tooltip = tooltip
         self.start_func = start_func
         self.done_func = done_func
         self.outcb = outcb
         self.cachename = cachename
-        self.q = Queue()
         self.thread = 0
+        self.proc = None
         self.status = None
         self.output = None
         self.show_progress = show_progress
@@ -77,7 +97,8 @@ class Submit(object):
         self.width = width
         self.cachecb = cachecb
         self.showcache = showcache
-        self.cbuf = collections.deque(maxlen=200)  # circular buffer
+        self.cbuf = Scrollback(maxlines, maxbytes, spill=True)
+        self.usage = None  # resources used by the last run
 
         if start_func is None:
             print("start_func is required.", file=sys.stderr)
@@ -85,20 +106,13 @@ class Submit(object):
 
         if cachename:
             # set up cache
-            cachedir = os.path.join(Submit.CACHEDIR, cachename)
-            cachetabdir = os.path.join(Submit.CACHETABDIR, cachename)
-            if not os.path.isdir(cachedir):
-                os.makedirs(cachedir)
-            memory = Memory(cachedir=cachetabdir, verbose=0)
-
-            @memory.cache
-            def make_rname(*args):
-                # uuid should be unique, but check just in case
-                while True:
-                    fname = str(uuid.uuid4()).replace('-', '')
-                    if not os.path.isdir(os.path.join(cachedir, fname)):
-                        break
-                return fname
+            self.cache = ResultCache(os.path.join(Submit.CACHEDIR, cachename), cachepolicy)
+            self.cache.evict(background=True)
+
+            def make_rname(*args, **kwargs):
+                # name for results of a run with these inputs
+                kwargs.setdefault('version', version)
+                return self.cache.key(*args, **kwargs)
 
             self.make_rname = make_rname
 
@@ -108,6 +122,7 @@ class Submit(object):
             button_style='success'
         )
         self.output = w.Textarea(layout={'width': '100%', 'height': '400px'})
+        self.renderer = TextRenderer(self.output, self.cbuf.text, fps)
         self.acc = w.Accordion(children=[self.output], width=self.width)
         self.acc.set_title(0, 'Output')
         self.acc.selected_index = None
@@ -127,29 +142,27 @@ class Submit(object):
         if self.but.description == 'Cancel':
             self.but.description = 'Stopping'
             self.but.button_style = 'warning'
-            if self.pid:
-                os.killpg(self.pid, signal.SIGTERM)
+            if self.proc:
+                self.proc.signal(signal.SIGTERM)
 
     def _check_cache(self):
+        entry = self.cache.lookup(self.runname)
+        if entry is None:
+            return False
+        self.rdir = self.cache.path(self.runname)
         try:
             tfile = os.path.join(self.rdir, '.submit_time')
             with open(tfile, 'r') as f:
                 etime = f.read() 
         except:
-            return False  # invalid cache
+            etime = 'unknown'
 
         try:
-            ofile = os.path.join(self.rdir, '.output')
-            with open(ofile, 'r') as f:
-                self.output.value = f.read() 
+            self.cbuf.load(os.path.join(self.rdir, '.output'))
         except:
-            self.output.value = ''
             self.cbuf.clear()
-        try:
-            ctime = time.localtime(os.path.getctime(tfile))
-            ctime = time.strftime('%d %b %Y', ctime)
-        except:
-            ctime = 'unknown'
+        self.renderer.flush()
+        ctime = time.strftime('%d %b %Y', time.localtime(entry.created))
         errState = "Cached: (%s, RunTime: %s)" % (ctime, etime)
 
         self.status = self.statusbar(0, errState)
@@ -204,9 +217,8 @@ class Submit(object):
             self.rdir = runname
 
         # check cache
-        if self.cachename and os.path.exists(self.rdir):
-            if self._check_cache():
-                return
+        if self.cachename and self._check_cache():
+            return
 
         self.but.disabled = True
         self.cached = False
@@ -216,10 +228,6 @@ class Submit(object):
         if os.path.exists(runname):
             shutil.rmtree(runname)
 
-        # create cache directory
-        if self.cachename and not os.path.exists(self.rdir):
-            os.makedirs(self.rdir)
-
         cmd = "submit --runName=%s --progress submit %s" % (runname, cmd)
 
         self.but.description = 'Cancel'
@@ -229,9 +237,8 @@ class Submit(object):
         self.progress = None
         self.w.children = [self.acc, self.but]
    
-        self.thread = threading.Thread(target=poll_thread, args=(cmd, self))
-        self.thread.start()
-        self.pid = os.getpgid(self.q.get())
+        self.proc = start_command(cmd, self)
+        self.pid = self.proc.pid if self.proc else 0
 
     def update(self, val):
         # parse string and update progress bars
@@ -262,9 +269,7 @@ class Submit(object):
     def clear_cache(self, x):
         x.disabled = True
         if x.description == "Clear All":
-            tooldir = os.path.join(Submit.CACHEDIR, self.cachename)
-            if os.path.exists(tooldir):
-                shutil.rmtree(tooldir)
+            self.cache.clear()
             tabdir = os.path.join(Submit.CACHETABDIR, self.cachename)
             if os.path.exists(tabdir):
                 shutil.rmtree(tabdir)
@@ -272,8 +277,7 @@ class Submit(object):
                 self.cachecb()
             return
 
-        if os.path.exists(self.rdir):
-            shutil.rmtree(self.rdir)
+        self.cache.remove(self.runname)
         if self.cachecb:
             self.cachecb()
 
@@ -343,46 +347,57 @@ class Submit(object):
                 val += 40 * "=" + "\n"
                 self.cbuf.append(val)
                 with open(fname, 'rb') as f:
-                    for chunk in iter(lambda: f.read(4096), b''):
-                        self.cbuf.append(chunk.decode('utf-8'))
+                    for chunk in iter(lambda: f.read(65536), b''):
+                        self.cbuf.write(chunk)
         else:
             fname = '%s.stdout' % self.runname
             if os.path.isfile(fname) and os.path.getmtime(fname) >= self.start_time:
                 with open(fname, 'rb') as f:
                     self.cbuf.append('\n')
-                    for chunk in iter(lambda: f.read(4096), b''):
-                        self.cbuf.append(chunk.decode('utf-8'))
+                    for chunk in iter(lambda: f.read(65536), b''):
+                        self.cbuf.write(chunk)
         # set the widget from the circular buffer
-        self.output.value = ''.join(self.cbuf)
+        self.renderer.flush()
 
     def copy_files(self, errnum, etime):
+        # don't cache failed runs
+        if errnum > 0:
+            self.cache.remove(self.runname)
+            return self.rdir
+
         if os.path.isdir(self.runname):
             # output directory was created.  Must have been a parametric run
-            if errnum > 0:
-                shutil.rmtree(self.rdir)
-            else:
-                os.system('/bin/cp -pr %s/* %s' % (self.runname, self.rdir))
-                shutil.rmtree(self.runname)
+            files = {'.': self.runname}
         else:
             # nonparametric run.  Results are in current working directory.
-            # Use the timestamp to copy all newer files to the cacheName.
-            if errnum == 0:
-                files = os.listdir('.')
-                for f in files:
-                    if os.path.getmtime(f) >= self.start_time:
-                        shutil.copy2(f, self.rdir)
-
-        if errnum == 0:
-            with open(os.path.join(self.rdir, '.submit_time'), 'w') as f:
+            # Use the timestamp to store all newer files in the cache.
+            files = dict((f, f) for f in os.listdir('.')
+                         if os.path.isfile(f) and os.path.getmtime(f) >= self.start_time)
+
+        # save output and run time with the results
+        tmp = tempfile.mkdtemp(dir=self.cache.root, prefix='.tmp-')
+        try:
+            files['.output'] = os.path.join(tmp, '.output')
+            self.cbuf.save(files['.output'])
+            files['.submit_time'] = os.path.join(tmp, '.submit_time')
+            with open(files['.submit_time'], 'w') as f:
                 f.write(pretty_time_delta(etime))
-            with open(os.path.join(self.rdir, '.output'), 'w') as f:
-                f.write(self.output.value)
+            move = True if '.' in files else ['.output', '.submit_time']
+            self.cache.put(self.runname, files, etime=etime, move=move)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.cache.evict(background=True)
+        if os.path.isdir(self.runname):
+            shutil.rmtree(self.runname)
 
         return self.rdir
 
 
-def poll_thread(cmd, self):
-    # set the output encoding
+def start_command(cmd, self):
+    # Start cmd with the shared supervisor.  Its reactor thread only
+    # queues the output; this widget's OutputQueue thread decodes it,
+    # calls outcb and finishes the run, so slow callbacks and done_func
+    # cannot hold up other commands.
     outenc = sys.stdout.encoding
     errState = "Start Time: %s" % time.strftime("%H:%M:%S", time.localtime(self.start_time))
     errNum = 3
@@ -390,70 +405,46 @@ def poll_thread(cmd, self):
     self.status = self.statusbar(errNum, errState)
     self.but.disabled = False
     self.w.children = [self.acc, self.status, self.but]
-    
+
+    decoders = dict((name, codecs.getincrementaldecoder(outenc)('replace'))
+                    for name in ['stdout', 'stderr'])
+
+    def output(name, data):
+        c = decoders[name].decode(data)
+        if not c:
+            return
+        if name == 'stderr':
+            # the scrollback marks stderr lines with <STDERR>
+            self.cbuf.append(c, 'stderr')
+        else:
+            # parse string and update progress bars
+            if self.show_progress:
+                self.update(c)
+            if self.outcb:
+                c = self.outcb(c)
+            # write c to output widget buffer
+            if c:
+                self.cbuf.append(c)
+        self.renderer.changed()
+
+    queue = OutputQueue(output, lambda proc: finish_command(cmd, self, proc))
+    self.thread = queue.thread
     try:
-        child = subprocess.Popen(
-            cmd, bufsize=4096,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=True,
-            close_fds=True,
-            preexec_fn=os.setsid)
+        return get_supervisor().start(cmd, shell=True, session=True,
+                                      on_output=queue.put, on_exit=queue.close)
     except Exception as e:
         print(e)
-        return
-
-    self.q.put(child.pid)
-    poller = select.poll()
-    poller.register(child.stdout, select.POLLIN)
-    poller.register(child.stderr, select.POLLIN)
-    numfds = 2
-    while numfds > 0:
-        try:
-            r = poller.poll(1)
-        except select.error as err:
-            print(err, file=sys.stderr)
-            break
-        for fd, flags in r:
-            if flags & (select.POLLIN | select.POLLPRI):
-                c = os.read(fd, 4096).decode(outenc)
-                if fd == child.stderr.fileno():
-                    if c.endswith('\n'):
-                        c = c[:-1]
-                    self.cbuf.append(u'<STDERR> ' + c + u' </STDERR>\n')
-                else:
-                    # parse string and update progress bars
-                    if self.show_progress:
-                        self.update(c)
-                    if self.outcb:
-                        c = self.outcb(c)
-                    # write c to output widget buffer
-                    if c:
-                        self.cbuf.append(c)
-            if flags & (select.POLLHUP | select.POLLERR):
-                poller.unregister(fd)
-                numfds -= 1
-        self.output.value = ''.join(self.cbuf)
-
-    # drain buffers
-    for fp in [child.stdout, child.stderr]:
-        fcntl.fcntl(fp, fcntl.F_SETFL, os.O_NONBLOCK)
-        while True:
-            c = fp.read(4096).decode(outenc)
-            if len(c) == 0:
-                break
-            if fp == child.stderr:
-                if c.endswith('\n'):
-                    c = c[:-1]
-                c = u'<STDERR> ' + c + u' </STDERR>\n'
-            elif self.outcb:
-                self.outcb(c)
-            # write c to output widget
-            self.cbuf.append(c)
-    self.output.value = ''.join(self.cbuf)
-
-    pid, exitStatus = os.waitpid(child.pid, 0)
+        # ends the queue's thread without finishing a run
+        queue.done = None
+        queue.close(None)
+        return None
+
+
+def finish_command(cmd, self, proc):
+    exitStatus = proc.status
+    self.usage = proc.usage
     elapsed_time = time.time() - self.start_time
+    self.renderer.flush()
     self.but.description = self.label
     self.but.button_style = 'success'  # green
     self.but.disabled = True
@@ -479,9 +470,10 @@ def poll_thread(cmd, self):
 #       c = unicode('\n' + '='*50 + '\n' + errStr + '\n' + '='*50 + '\n')
         c = '\n' + '='*50 + '\n' + errStr + '\n' + '='*50 + '\n'
         self.cbuf.append(c)
-        self.output.value = ''.join(self.cbuf)
+        self.renderer.flush()
 
     errState += ".  Run Time: %s" % time.strftime("%H:%M:%S", time.gmtime(elapsed_time))
+    errState += ".  " + self.usage.summary()
     self.status = self.statusbar(errNum, errState)
     self.w.children = [self.acc, self.status, self.but]
 
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# CPU used by this process while a RunCommand widget shows the output
+# of a chatty command, at 10 updates a second and at an unlimited rate
+# (an update for every chunk, as before throttling).  'MB sent' is the
+# text that would go to the browser.
+#
+# usage: python bench_render.py [lines]
+
+from __future__ import print_function
+import os
+import sys
+import time
+sys.path.insert(0, os.path.abspath('../../..'))
+from hublib.ui.test import setup_test_comm
+import hublib.ui as ui
+
+
+def run(fps, lines):
+    r = ui.RunCommand(start_func=lambda s: None, fps=fps)
+    sent = [0]
+
+    def count(change):
+        sent[0] += len(change['new'])
+    r.output.observe(count, 'value')
+    cpu = time.process_time()
+    t = time.time()
+    r.run('for i in $(seq %d); do echo "line $i of some simulator output"; done' % lines)
+    r.proc.wait()
+    r.thread.join()
+    return time.time() - t, time.process_time() - cpu, r.renderer.frames, sent[0]
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    setup_test_comm()
+    print('%-12s %10s %10s %8s %10s' % ('fps', 'seconds', 'CPU s', 'frames', 'MB sent'))
+    for fps in [10, 1e6]:
+        wall, cpu, frames, sent = run(fps, lines)
+        print('%-12s %10.2f %10.2f %8d %10.1f' % ('unlimited' if fps > 1000 else fps,
+                                                wall, cpu, frames, sent / 1e6))
+
+
+if __name__ == '__main__':
+    main()
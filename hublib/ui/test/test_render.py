@@ -0,0 +1,100 @@
+from __future__ import print_function
+import pytest
+import time
+from . import setup_test_comm, teardown_test_comm
+import hublib.ui as ui
+from hublib.ui.render import TextRenderer, OutputQueue
+from hublib.cmd import executeCommand
+from hublib.cmd.supervisor import get_supervisor
+
+
+class Box(object):
+    # stands in for a widget, counting updates
+    def __init__(self):
+        self._value = ''
+        self.sets = 0
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, val):
+        self._value = val
+        self.sets += 1
+
+
+class TestRender:
+
+    @classmethod
+    def setup_class(cls):
+        setup_test_comm()
+
+    @classmethod
+    def teardown_class(cls):
+        teardown_test_comm()
+
+    def test_coalesce(self):
+        box = Box()
+        chunks = []
+        r = TextRenderer(box, lambda: ''.join(chunks), fps=10)
+        t = time.time()
+        while time.time() - t < 0.5:
+            chunks.append('x')
+            r.changed()
+        time.sleep(0.25)
+        assert box.value == ''.join(chunks)
+        # about 10 frames a second, not one per change
+        assert 2 <= box.sets <= 8
+
+    def test_flush(self):
+        box = Box()
+        r = TextRenderer(box, lambda: 'hello', fps=1)
+        r.flush()
+        assert box.value == 'hello'
+        # unchanged text is not sent again
+        r.flush()
+        assert box.sets == 1
+
+    def test_bad_fps(self):
+        with pytest.raises(ValueError):
+            TextRenderer(Box(), lambda: '', fps=0)
+
+    def test_run_command(self):
+        r = ui.RunCommand(start_func=lambda s: None, fps=5)
+        r.run('for i in $(seq 200); do echo $i; sleep 0.005; done')
+        r.proc.wait(30)
+        r.thread.join()
+        assert r.output.value.endswith('199\n200\n')
+        assert r.renderer.frames < 20
+
+    def test_slow_outcb(self):
+        # a slow outcb does not hold up other commands
+        def slow(c):
+            time.sleep(0.5)
+            return c
+        r = ui.RunCommand(start_func=lambda s: None, outcb=slow)
+        r.run('for i in $(seq 5); do echo $i; sleep 0.01; done')
+        t = time.time()
+        assert executeCommand(['echo', 'hi'])[:2] == (0, b'hi\n')
+        assert time.time() - t < 0.4
+        r.thread.join()
+        assert r.output.value.endswith('4\n5\n')
+
+    def test_queue_pauses(self):
+        # output waiting for a slow handler pauses the command
+        got = []
+        done = []
+
+        def handler(name, data):
+            time.sleep(0.2)
+            got.append(data)
+        q = OutputQueue(handler, done.append, limit=4096)
+        proc = get_supervisor().start('yes | head -c 200000', shell=True,
+                                      on_output=q.put, on_exit=q.close)
+        time.sleep(0.1)
+        assert proc.paused
+        q.handler = lambda name, data: got.append(data)
+        q.thread.join(10)
+        assert done == [proc]
+        assert sum(len(d) for d in got) == 200000
@@ -0,0 +1,128 @@
+from __future__ import print_function
+import os
+import pytest
+from hublib.ui.scrollback import Scrollback
+
+
+class TestScrollback:
+
+    def test_lines(self):
+        s = Scrollback(maxlines=3)
+        for i in range(10):
+            s.append('line %d\n' % i)
+        assert len(s) == 3
+        assert s.text() == 'line 7\nline 8\nline 9\n'
+        assert s.dropped == 7
+
+    def test_bytes(self):
+        s = Scrollback(maxbytes=20)
+        for i in range(10):
+            s.append('line %d\n' % i)
+        assert s.nbytes <= 20
+        assert s.text() == 'line 8\nline 9\n'
+
+    def test_bad_limits(self):
+        with pytest.raises(ValueError):
+            Scrollback(maxlines=0)
+
+    def test_partial(self):
+        s = Scrollback()
+        s.append('abc')
+        assert s.text() == 'abc'
+        assert len(s) == 0
+        s.append('def\nghi')
+        assert s.text() == 'abcdef\nghi'
+        assert len(s) == 1
+
+    def test_long_line(self):
+        s = Scrollback(maxbytes=10, spill=True)
+        s.append('x' * 100)
+        assert s.text() == 'x' * 10
+        s.append('\n')
+        assert s.text() == 'x' * 10 + '\n'
+        fname = s.logfile + '.save'
+        s.save(fname)
+        with open(fname) as f:
+            assert f.read() == 'x' * 100 + '\n'
+        os.remove(fname)
+        s.close()
+
+    def test_split_utf8(self):
+        s = Scrollback()
+        data = u'héllo wörld\n'.encode('utf-8')
+        for i in range(len(data)):
+            s.write(data[i:i + 1])
+        assert s.text() == u'héllo wörld\n'
+
+    def test_stderr(self):
+        s = Scrollback()
+        s.append('out ')
+        s.append('err', 'stderr')
+        s.append('put\n')
+        s.append('or\n', 'stderr')
+        assert s.text() == 'out put\n<STDERR> error </STDERR>\n'
+
+    def test_spill(self, tmpdir):
+        s = Scrollback(maxlines=2, spill=True)
+        logfile = s.logfile
+        assert os.path.isfile(logfile)
+        for i in range(5):
+            s.append('%d\n' % i)
+        s.append('end')
+        fname = str(tmpdir.join('out'))
+        s.save(fname)
+        with open(fname) as f:
+            assert f.read() == '0\n1\n2\n3\n4\nend'
+        s.clear()
+        assert not os.path.exists(logfile)
+        assert os.path.isfile(s.logfile)
+        s.load(fname)
+        # the unfinished last line of a loaded file counts as a line
+        assert s.text() == '4\nend'
+        s.close()
+        assert s.logfile is None
+
+    def test_save_no_spill(self, tmpdir):
+        s = Scrollback(maxlines=2)
+        s.append('a\nb\nc\n')
+        fname = str(tmpdir.join('out'))
+        s.save(fname)
+        with open(fname) as f:
+            assert f.read() == 'b\nc\n'
+
+    def test_load_tail(self, tmpdir):
+        fname = str(tmpdir.join('big'))
+        with open(fname, 'w') as f:
+            for i in range(10000):
+                f.write('line %d\n' % i)
+            f.write('end')
+        s = Scrollback(maxbytes=100, spill=True)
+        tmplog = s.logfile
+        s.load(fname)
+        # only the tail is read, and the file is used as the log
+        assert s.text().endswith('line 9999\nend')
+        assert s.text().startswith('line 99')
+        assert s.nbytes <= 100
+        assert s.logfile == fname
+        assert not os.path.exists(tmplog)
+        out = str(tmpdir.join('out'))
+        s.save(out)
+        with open(out) as f, open(fname) as g:
+            assert f.read() == g.read()
+        # saving to the loaded file leaves it alone
+        s.save(fname)
+        with open(out) as f, open(fname) as g:
+            assert f.read() == g.read()
+
+        # more output goes to a copy
+        s.append('more\n')
+        assert s.logfile != fname
+        s.save(out)
+        with open(out) as f:
+            assert f.read().endswith('line 9999\nendmore\n')
+        with open(fname) as f:
+            assert f.read().endswith('line 9999\nend')
+        copy = s.logfile
+        s.close()
+        assert os.path.exists(fname)
+        assert not os.path.exists(copy)
@@ -123,18 +123,24 @@ setup(
     url='https://github.com/hubzero/hublib',
     license='MIT Software License',
     author='Martin Hunt',
-    install_requires=['ipywidgets>=7.0', 'pint', 'joblib', 'filelock'],
+    install_requires=['ipywidgets>=7.0', 'pint', 'filelock>=3.10'],
     author_email='mmh@purdue.edu',
     description='Python library for HUBzero Jupyter Notebooks',
     long_description=long_description,
     packages=['hublib', 'hublib.uq', 'hublib.ui', 'hublib.cmd',
-              'hublib.tool', 'hublib.use', 'hublib.rappture', 'hublib.util'],
+              'hublib.tool', 'hublib.use', 'hublib.rappture', 'hublib.util',
+              'hublib.cache'],
     include_package_data=True,
+    python_requires='>=3.7',
+    entry_points={
+        'console_scripts': ['hublib-cache = hublib.cache.cli:main'],
+    },
     platforms='any',
     tests_require=['pytest-cov', 'pytest'],
     cmdclass=cmdclass,
     classifiers=[
         'Programming Language :: Python',
+        'Programming Language :: Python :: 3 :: Only',
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
         "License :: OSI Approved :: MIT License",